@@ -0,0 +1,160 @@
+"""
+Compare the embedding backends: throughput, memory and retrieval parity
+
+Each backend runs in its own subprocess (so resident memory is not mixed
+up between torch and ONNX Runtime), embeds the pattern library and the
+chunks of a document, and reports load time, encode throughput and peak
+RSS. The parent then ranks the library examples for every chunk with each
+backend's vectors and checks the rankings against the torch backend.
+
+Parity passes when every chunk has the same top-1 example and the top-k
+sets overlap by at least --min-overlap; the exit code is 1 otherwise, so
+this can gate switching EMBEDDER_BACKEND.
+
+Usage:
+    python benchmark_embedders.py [document.txt] [--backends torch,onnx] [--runs N] [--top-k K]
+"""
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+from chunker import chunk_document
+from embedders import EMBED_THREADS, create_embedder
+
+EXAMPLES_FILE = "annotated_examples.json"
+
+
+def load_texts(document: str):
+    """(library example texts, document chunk texts)"""
+    with open(EXAMPLES_FILE, 'r', encoding='utf-8') as f:
+        library = [example['problematic_section'] for example in json.load(f).get('examples', [])]
+    with open(document, 'r', encoding='utf-8') as f:
+        chunks = [chunk['text'] for chunk in chunk_document(f.read())]
+    return library, chunks
+
+
+def run_worker(kind: str, model: str, document: str, runs: int, batch_size: int, out_file: str):
+    """Benchmark one backend in this process and save its vectors to out_file"""
+    library, chunks = load_texts(document)
+
+    start = time.perf_counter()
+    embedder = create_embedder(model, kind)
+    embedder.encode(["warm-up"])
+    load_seconds = time.perf_counter() - start
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        chunk_vectors = embedder.encode(chunks, batch_size=batch_size)
+        timings.append(time.perf_counter() - start)
+    library_vectors = embedder.encode(library, batch_size=batch_size)
+    np.savez(out_file, library=library_vectors, chunks=chunk_vectors)
+
+    best = min(timings)
+    print(json.dumps({
+        'load_seconds': round(load_seconds, 2),
+        'texts_per_second': round(len(chunks) / best, 1),
+        'batch_ms_best': round(best * 1000, 1),
+        'batch_ms_median': round(sorted(timings)[len(timings) // 2] * 1000, 1),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'threads': EMBED_THREADS or "default"
+    }))
+
+
+def rankings(vectors: dict, top_k: int) -> np.ndarray:
+    """Top-k library example indices per chunk, best first"""
+    scores = vectors['chunks'] @ vectors['library'].T
+    return np.argsort(-scores, axis=1)[:, :top_k]
+
+
+def compare(reference_vectors: dict, candidate_vectors: dict, top_k: int) -> dict:
+    """
+    Retrieval parity of a candidate backend against the reference (torch)
+
+    Args:
+        reference_vectors, candidate_vectors: {'library': matrix, 'chunks': matrix}
+            of unit-length rows, from the same texts
+        top_k: Number of library examples ranked per chunk
+
+    Returns:
+        top1 (share of chunks with the same best example), overlap (mean
+        share of the top-k sets in common), mean_cosine and min_cosine
+        (between the two backends' vectors of the same chunk)
+    """
+    reference = rankings(reference_vectors, top_k)
+    candidate = rankings(candidate_vectors, top_k)
+    cosines = np.sum(reference_vectors['chunks'] * candidate_vectors['chunks'], axis=1)
+    return {
+        'top1': float(np.mean(reference[:, 0] == candidate[:, 0])),
+        'overlap': float(np.mean([len(set(ref) & set(cand)) / top_k for ref, cand in zip(reference, candidate)])),
+        'mean_cosine': float(np.mean(cosines)),
+        'min_cosine': float(np.min(cosines))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("document", nargs="?", default="sample_nyserda_sow.txt")
+    parser.add_argument("--backends", default="torch,onnx")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("EMBED_BATCH_SIZE", 64)))
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--min-overlap", type=float, default=0.9)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.model, args.document, args.runs, args.batch_size, args.out)
+        return
+
+    library, chunks = load_texts(args.document)
+    print(f"[OK] {len(library)} library examples, {len(chunks)} chunks from {args.document}")
+
+    vectors = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in args.backends.split(","):
+            out_file = os.path.join(tmp, f"{kind}.npz")
+            proc = subprocess.run(
+                [sys.executable, __file__, args.document, "--worker", kind, "--out", out_file,
+                 "--model", args.model, "--runs", str(args.runs), "--batch-size", str(args.batch_size)],
+                capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                print(f"[WARNING] {kind} backend failed:\n{proc.stderr.strip().splitlines()[-1] if proc.stderr else ''}")
+                continue
+            stats = json.loads(proc.stdout.strip().splitlines()[-1])
+            with np.load(out_file) as data:
+                vectors[kind] = {'library': data['library'], 'chunks': data['chunks']}
+            print(f"\n{kind}")
+            for key, value in stats.items():
+                print(f"   {key}: {value}")
+
+    if "torch" not in vectors or len(vectors) < 2:
+        print("\n[WARNING] Parity needs the torch backend and at least one other")
+        return
+
+    passed = True
+    for kind, candidate_vectors in vectors.items():
+        if kind == "torch":
+            continue
+        parity = compare(vectors["torch"], candidate_vectors, args.top_k)
+        ok = parity['top1'] == 1.0 and parity['overlap'] >= args.min_overlap
+        passed = passed and ok
+        print(f"\nParity {kind} vs torch: top-1 agreement {parity['top1']:.1%}, "
+              f"top-{args.top_k} overlap {parity['overlap']:.1%}, mean cosine {parity['mean_cosine']:.4f} "
+              f"(min {parity['min_cosine']:.4f}) [{'OK' if ok else 'FAILED'}]")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark the pattern library retrieval backends on the same queries
+
+Syncs annotated_examples.json into a fresh copy of both backends in a
+temporary directory (the CHROMA_PATH / NUMPY_INDEX_PATH stores the API
+serves from are never touched), embeds the chunks of a document once, then times backend.query() on identical embeddings so only
+the search itself is compared. Reports per-query latency (p50/p95), the
+Python memory allocated by each backend while querying, the process RSS,
+and how often the two backends agree on the top-k ids.
+
+Usage:
+    python benchmark_retrieval.py [document.txt] [--runs N] [--top-k K]
+"""
+import os
+import sys
+import time
+import resource
+import argparse
+import tempfile
+import tracemalloc
+
+import vector_db_setup
+from chunker import chunk_document
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def time_backend(backend, embeddings, runs, top_k):
+    """
+    Query latency and memory for one backend
+
+    Returns:
+        (results of the last run, stats dict)
+    """
+    # First query opens the collection / maps the matrix
+    backend.query(embeddings[:1], top_k)
+
+    tracemalloc.start()
+    timings = []
+    results = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        results = backend.query(embeddings, top_k)
+        timings.append((time.perf_counter() - start) * 1000)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    per_query = [t / len(embeddings) for t in timings]
+    return results, {
+        'batch_p50_ms': round(percentile(timings, 50), 3),
+        'batch_p95_ms': round(percentile(timings, 95), 3),
+        'per_query_p50_ms': round(percentile(per_query, 50), 4),
+        'per_query_p95_ms': round(percentile(per_query, 95), 4),
+        'peak_alloc_kb': round(peak / 1024, 1),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("document", nargs="?", default="sample_nyserda_sow.txt")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.document, 'r', encoding='utf-8') as f:
+        chunks = chunk_document(f.read())
+    if not chunks:
+        print(f"[ERROR] No chunks in {args.document}")
+        sys.exit(1)
+
+    embeddings = vector_db_setup.embed_texts([chunk['text'] for chunk in chunks]).tolist()
+    print(f"[OK] {len(chunks)} query chunks from {args.document}, {args.runs} runs, top-{args.top_k}")
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="benchmark_retrieval-") as tmp:
+        for kind in ("chroma", "numpy"):
+            try:
+                backend = vector_db_setup.create_backend(kind, os.path.join(tmp, kind))
+            except ImportError as e:
+                print(f"[WARNING] Skipping {kind}: {e}")
+                continue
+            vector_db_setup.initialize_vector_db(backend=backend)
+            results[kind], stats = time_backend(backend, embeddings, args.runs, args.top_k)
+            print(f"\n{kind} ({backend.count()} examples)")
+            for key, value in stats.items():
+                print(f"   {key}: {value}")
+
+    if len(results) == 2:
+        agree = sum(
+            [match[0] for match in chroma] == [match[0] for match in numpy]
+            for chroma, numpy in zip(results["chroma"], results["numpy"])
+        )
+        max_diff = max(
+            (abs(a[3] - b[3]) for chroma, numpy in zip(results["chroma"], results["numpy"])
+             for a, b in zip(chroma, numpy) if a[0] == b[0]),
+            default=0.0
+        )
+        print(f"\nTop-{args.top_k} agreement: {agree}/{len(chunks)} chunks, "
+              f"max similarity difference {max_diff:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Structure-aware chunking of SOW text for RAG analysis
+
+Chunks follow sentence and section boundaries instead of fixed word
+windows, overlap by a configurable number of words, and remember where
+they came from (character offsets, page and section), so findings can be
+located without asking Claude.
+"""
+import os
+import re
+import hashlib
+from typing import List, Dict
+
+# Words carried over from the end of one chunk into the next
+RAG_CHUNK_OVERLAP = max(0, int(os.getenv("RAG_CHUNK_OVERLAP", 30)))
+
+# Trailing chunks (and heading-only sections) shorter than this are merged
+RAG_MIN_CHUNK_WORDS = max(1, int(os.getenv("RAG_MIN_CHUNK_WORDS", 50)))
+
+# [Page N] markers written by sow_extractor.read_document_bytes for PDFs
+PAGE_MARKER_RE = re.compile(r'^\[Page (\d+)\]', re.MULTILINE)
+
+# Section headings: Section 3, PART IV, Task 2.1, 3.2 Deliverables, BACKGROUND.
+# Not headings: "Task 1 Deliverable:" / "Task 1 Schedule:" lines, schedule
+# rows ("Task 2 - Development: Months 4-15"), numbered list items
+# ("2. System Uptime: Achieve ..." - they have a colon or end in a period)
+# and street addresses ("123 Tech Street")
+HEADING_RE = re.compile(
+    r'^[ \t]*(?:'
+    r'(?:SECTION|Section|ARTICLE|Article|PART|Part)\s+[\dIVXLC]+\b[^\n]*'
+    r'|(?!Task\s+[\dA-Z]+(?:\.\d+)*\s+(?:Deliverables?|Schedule|Budget|Milestones?)\s*:)'
+    r'(?![^\n]*:\s*Months?\s+\d)'
+    r'Task\s+[\dA-Z]+(?:\.\d+)*\b[^\n]*'
+    r'|(?:\d+(?:\.\d+)+\.?|\d+\.|\d{1,2})[ \t]+'
+    r'(?![^\n]*\b(?:Street|St|Avenue|Ave|Road|Rd|Drive|Dr|Plaza|Boulevard|Blvd|Lane|Ln|Way|Suite|Court|Ct)\.?[ \t]*$)'
+    r'[A-Z][^\n:]{0,78}[^\n:.]$'
+    r'|[A-Z][A-Z0-9 ,&/()\-]{2,79}$'
+    r')',
+    re.MULTILINE
+)
+
+# A sentence ends at . ! ? or ; followed by whitespace, or at a blank line
+SENTENCE_END_RE = re.compile(r'(?<=[.!?;])\s+|\n\s*\n')
+
+# Changes whenever the heading or sentence rules change (part of result cache keys)
+CHUNKER_RULES_VERSION = hashlib.sha256(
+    (HEADING_RE.pattern + SENTENCE_END_RE.pattern).encode('utf-8')
+).hexdigest()[:8]
+
+
+def _spans_between(text: str, start: int, end: int, pattern: re.Pattern) -> List[tuple]:
+    """(start, end) spans of the non-empty pieces of text[start:end] split by pattern"""
+    spans = []
+    position = start
+    for match in pattern.finditer(text, start, end):
+        if text[position:match.start()].strip():
+            spans.append((position, match.start()))
+        position = match.end()
+    if text[position:end].strip():
+        spans.append((position, end))
+    return spans
+
+
+def _word_spans(text: str, start: int, end: int) -> List[tuple]:
+    """(start, end) span of every word in text[start:end]"""
+    return [(m.start(), m.end()) for m in re.compile(r'\S+').finditer(text, start, end)]
+
+
+def find_sections(text: str) -> List[tuple]:
+    """(offset, heading) for every section heading, in order"""
+    return [(m.start(), ' '.join(m.group(0).split())[:80]) for m in HEADING_RE.finditer(text)]
+
+
+def find_pages(text: str) -> List[tuple]:
+    """(offset, page number) for every [Page N] marker, in order"""
+    return [(m.start(), int(m.group(1))) for m in PAGE_MARKER_RE.finditer(text)]
+
+
+def label_at(markers: List[tuple], offset: int, end: int = None):
+    """
+    Label of the last marker at or before offset
+
+    If there is none and end is given, the first marker before end is used
+    (e.g. a heading just after a page marker at the start of the chunk).
+    """
+    label = None
+    for marker_offset, marker_label in markers:
+        if marker_offset > offset:
+            if label is None and end is not None and marker_offset < end:
+                label = marker_label
+            break
+        label = marker_label
+    return label
+
+
+def dominant_label(markers: List[tuple], start: int, end: int):
+    """
+    Label of the marker whose range covers most of text[start:end]
+
+    A chunk that starts with a short section merged into the next one is
+    labelled by the section most of it belongs to, not the first heading.
+    Falls back to label_at when no marker covers any of the span.
+    """
+    coverage = {}
+    bounds = markers + [(float('inf'), None)]
+    for (offset, label), (next_offset, _) in zip(bounds, bounds[1:]):
+        covered = min(end, next_offset) - max(start, offset)
+        if covered > 0:
+            coverage[label] = coverage.get(label, 0) + covered
+    if not coverage:
+        return label_at(markers, start, end)
+    return max(coverage, key=coverage.get)
+
+
+def _clean(text: str) -> str:
+    """Chunk text as sent to the embedder and Claude (no page markers, single spaces)"""
+    return ' '.join(PAGE_MARKER_RE.sub(' ', text).split())
+
+
+def format_location(chunk: Dict) -> str:
+    """Readable location of a chunk, e.g. 'Page 4, 3.2 Deliverables'"""
+    parts = []
+    if chunk.get('page') is not None:
+        if chunk.get('page_end') not in (None, chunk['page']):
+            parts.append(f"Pages {chunk['page']}-{chunk['page_end']}")
+        else:
+            parts.append(f"Page {chunk['page']}")
+    if chunk.get('section'):
+        parts.append(chunk['section'])
+    if parts:
+        return ', '.join(parts)
+    return f"Chunk {chunk['id']}" if chunk.get('id') is not None else "Unknown"
+
+
+def chunk_document(
+    text: str,
+    chunk_size: int = 200,
+    overlap: int = RAG_CHUNK_OVERLAP,
+    min_chunk_words: int = RAG_MIN_CHUNK_WORDS
+) -> List[Dict]:
+    """
+    Split a document into sentence-aligned chunks that never cross a section heading
+
+    Sentences are packed into chunks of up to chunk_size words (a sentence
+    longer than that is split by words). Each chunk starts with the last
+    sentences of the previous one, up to overlap words. A trailing chunk
+    shorter than min_chunk_words is merged into the one before it, and
+    sections too short to stand alone are merged into the next section (a
+    short final section is merged into the one before it). Each chunk is
+    labelled with the section covering most of its text.
+
+    Args:
+        text: Full document text (may contain [Page N] markers)
+        chunk_size: Maximum words per chunk
+        overlap: Words repeated from the end of the previous chunk
+        min_chunk_words: Minimum words for a trailing chunk or a section
+
+    Returns:
+        List of chunk dicts in document order, each with id (1-based), text,
+        start/end (character offsets into text), page, page_end and section
+    """
+    chunk_size = max(1, chunk_size)
+    overlap = min(overlap, chunk_size // 2)
+
+    sections = find_sections(text)
+    pages = find_pages(text)
+
+    # Section blocks; blocks too short to stand alone join the next one
+    starts = sorted({0} | {offset for offset, _ in sections})
+    blocks = []
+    pending_start = None
+    for start, end in zip(starts, starts[1:] + [len(text)]):
+        if pending_start is None:
+            pending_start = start
+        if len(text[pending_start:end].split()) >= min_chunk_words:
+            blocks.append((pending_start, end))
+            pending_start = None
+    if pending_start is not None:
+        if blocks:
+            blocks[-1] = (blocks[-1][0], len(text))
+        else:
+            blocks.append((pending_start, len(text)))
+
+    spans = []
+    for block_start, block_end in blocks:
+        # Sentences, with over-long ones broken into chunk_size word pieces
+        sentences = []
+        for start, end in _spans_between(text, block_start, block_end, SENTENCE_END_RE):
+            words = _word_spans(text, start, end)
+            for i in range(0, len(words), chunk_size):
+                piece = words[i:i + chunk_size]
+                sentences.append((piece[0][0], piece[-1][1], len(piece)))
+
+        block_chunks = []
+        current = []
+        current_words = 0
+        for sentence in sentences:
+            if current and current_words + sentence[2] > chunk_size:
+                block_chunks.append(current)
+
+                # Carry trailing sentences into the next chunk as overlap
+                carried = []
+                carried_words = 0
+                for previous in reversed(current):
+                    if carried_words + previous[2] > overlap:
+                        break
+                    carried.insert(0, previous)
+                    carried_words += previous[2]
+                if carried_words + sentence[2] > chunk_size:
+                    carried, carried_words = [], 0
+                current, current_words = carried, carried_words
+
+            current.append(sentence)
+            current_words += sentence[2]
+
+        if current:
+            # A short tail (beyond the overlap) is folded into the previous chunk
+            new_words = sum(s[2] for s in current if not block_chunks or s[0] >= block_chunks[-1][-1][1])
+            if block_chunks and new_words < min_chunk_words:
+                block_chunks[-1] = block_chunks[-1] + [s for s in current if s[0] >= block_chunks[-1][-1][1]]
+            else:
+                block_chunks.append(current)
+
+        spans.extend((chunk[0][0], chunk[-1][1]) for chunk in block_chunks)
+
+    chunks = []
+    for i, (start, end) in enumerate(spans, 1):
+        chunks.append({
+            "id": i,
+            "text": _clean(text[start:end]),
+            "start": start,
+            "end": end,
+            "page": label_at(pages, start),
+            "page_end": label_at(pages, end - 1),
+            "section": dominant_label(sections, start, end)
+        })
+
+    return [chunk for chunk in chunks if chunk['text']]
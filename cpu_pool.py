@@ -0,0 +1,36 @@
+"""
+Bounded worker pool for CPU-bound work (document parsing, embeddings)
+
+Keeps PyMuPDF parsing and embedder.encode off the event loop so a slow
+analysis never stalls other requests (including /health).
+"""
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads (not processes) so the embedding model and DB handles are shared;
+# PyMuPDF and torch release the GIL for most of their work
+CPU_POOL_WORKERS = max(1, int(os.getenv("CPU_POOL_WORKERS", min(4, os.cpu_count() or 1))))
+
+_executor = ThreadPoolExecutor(max_workers=CPU_POOL_WORKERS, thread_name_prefix="sow-cpu")
+
+
+async def run_in_pool(func, *args, **kwargs):
+    """
+    Run a blocking function on the bounded CPU pool and await its result
+
+    Args:
+        func: Blocking callable
+        *args, **kwargs: Arguments passed to func
+
+    Returns:
+        Whatever func returns
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+def shutdown_pool():
+    """Stop accepting work and wait for running tasks to finish"""
+    _executor.shutdown(wait=True)
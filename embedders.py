@@ -0,0 +1,206 @@
+"""
+Embedding backends for the pattern library and document chunks
+
+vector_db_setup talks to an embedder through encode(texts, batch_size),
+which returns a float32 array of L2-normalized rows. Two implementations
+of the same all-MiniLM-L6-v2 model, chosen by EMBEDDER_BACKEND:
+
+- TorchEmbedder ("torch"): sentence-transformers on torch (the original
+  setup)
+- OnnxEmbedder ("onnx"): ONNX Runtime on CPU with an int8 dynamically
+  quantized export of the model (see export_onnx_embedder.py) and the
+  standalone `tokenizers` package, so torch is never imported. Texts are
+  sorted by length and packed into batches under a token budget, so
+  short chunks are not padded to the length of the longest one.
+
+EMBED_THREADS sets the intra-op thread count for either backend (0 keeps
+the library default, usually one per core).
+"""
+import os
+from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+
+EMBEDDER_BACKEND = os.getenv("EMBEDDER_BACKEND", "torch").lower()
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", 0))
+
+# Exported model (export_onnx_embedder.py writes both files into this dir)
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "./onnx_model")
+ONNX_MODEL_FILE = os.getenv("ONNX_MODEL_FILE", "model_int8.onnx")
+
+# Dynamic batching for the ONNX backend: a batch holds at most batch_size
+# texts and at most this many (padded) tokens
+EMBED_MAX_BATCH_TOKENS = int(os.getenv("EMBED_MAX_BATCH_TOKENS", 8192))
+
+# all-MiniLM-L6-v2 was trained on (and sentence-transformers truncates to) 256 tokens
+EMBED_MAX_SEQ_LENGTH = int(os.getenv("EMBED_MAX_SEQ_LENGTH", 256))
+
+# Python packages each backend needs at runtime
+REQUIRED_MODULES = {
+    "torch": ["sentence_transformers"],
+    "onnx": ["onnxruntime", "tokenizers"]
+}
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length (zero rows are left as they are)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class Embedder(ABC):
+    """Interface shared by the embedding backends"""
+
+    name = "base"
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    @abstractmethod
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """Unit-length float32 embedding for each text, in order"""
+
+
+class TorchEmbedder(Embedder):
+    """sentence-transformers model on torch (CPU or GPU)"""
+
+    name = "torch"
+
+    def __init__(self, model_name: str, threads: int = EMBED_THREADS):
+        super().__init__(model_name)
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts, batch_size=32):
+        # sentence-transformers already sorts texts by length before batching
+        embeddings = self.model.encode(list(texts), batch_size=batch_size)
+        return normalize_rows(np.asarray(embeddings, dtype=np.float32))
+
+
+class OnnxEmbedder(Embedder):
+    """
+    Int8-quantized ONNX export of the model on ONNX Runtime (CPU)
+
+    Mean-pools the last hidden state over the attention mask and normalizes,
+    which is what the sentence-transformers pipeline for all-MiniLM-L6-v2
+    does.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_name: str, model_dir: str = ONNX_MODEL_DIR, model_file: str = ONNX_MODEL_FILE,
+                 threads: int = EMBED_THREADS, max_batch_tokens: int = EMBED_MAX_BATCH_TOKENS,
+                 max_seq_length: int = EMBED_MAX_SEQ_LENGTH):
+        super().__init__(model_name)
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(model_dir, model_file)
+        tokenizer_path = os.path.join(model_dir, "tokenizer.json")
+        for path in (model_path, tokenizer_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(
+                    f"{path} not found - run 'python export_onnx_embedder.py' to export {model_name}"
+                )
+
+        options = onnxruntime.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.no_padding()
+
+        self.max_batch_tokens = max_batch_tokens
+
+    def plan_batches(self, lengths: List[int], batch_size: int) -> List[List[int]]:
+        """
+        Group text indices into batches, shortest first
+
+        A batch closes when it has batch_size texts or when padding every
+        text to the longest one would exceed max_batch_tokens.
+        """
+        batches = []
+        current = []
+        for index in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+            # Sorted ascending, so the newest text is the longest in the batch
+            padded = lengths[index] * (len(current) + 1)
+            if current and (len(current) >= batch_size or padded > self.max_batch_tokens):
+                batches.append(current)
+                current = []
+            current.append(index)
+        if current:
+            batches.append(current)
+        return batches
+
+    def _run(self, encodings) -> np.ndarray:
+        """Pooled, normalized embeddings for one batch of tokenized texts"""
+        width = max(len(encoding.ids) for encoding in encodings)
+        input_ids = np.zeros((len(encodings), width), dtype=np.int64)
+        attention_mask = np.zeros((len(encodings), width), dtype=np.int64)
+        token_type_ids = np.zeros((len(encodings), width), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            length = len(encoding.ids)
+            input_ids[row, :length] = encoding.ids
+            attention_mask[row, :length] = encoding.attention_mask
+            token_type_ids[row, :length] = encoding.type_ids
+
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": token_type_ids}
+        hidden = self.session.run(None, {name: value for name, value in feed.items() if name in self.input_names})[0]
+
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return normalize_rows(pooled.astype(np.float32))
+
+    def encode(self, texts, batch_size=32):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        encodings = self.tokenizer.encode_batch(texts)
+        embeddings = None
+        for batch in self.plan_batches([len(encoding.ids) for encoding in encodings], batch_size):
+            vectors = self._run([encodings[i] for i in batch])
+            if embeddings is None:
+                embeddings = np.zeros((len(texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[batch] = vectors
+        return embeddings
+
+
+def embedder_id(model_name: str, kind: str = None) -> str:
+    """
+    Identifies model + backend in the embedding cache and content hashes
+
+    The backends produce slightly different vectors, so switching backends
+    re-embeds the pattern library instead of mixing the two. The torch id
+    is the plain model name, so data written before the ONNX backend
+    existed stays valid.
+    """
+    kind = (kind or EMBEDDER_BACKEND).lower()
+    if kind == "onnx":
+        return f"{model_name}@onnx:{ONNX_MODEL_FILE}"
+    return model_name
+
+
+def create_embedder(model_name: str, kind: str = None) -> Embedder:
+    """
+    New embedder of the given kind ("torch" or "onnx")
+
+    Raises:
+        ValueError: If the kind is unknown
+    """
+    kind = (kind or EMBEDDER_BACKEND).lower()
+    if kind == "torch":
+        return TorchEmbedder(model_name)
+    if kind == "onnx":
+        return OnnxEmbedder(model_name)
+    raise ValueError(f"Unknown EMBEDDER_BACKEND '{kind}' (use 'torch' or 'onnx')")
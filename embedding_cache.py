@@ -0,0 +1,336 @@
+"""
+Two-tier cache of text embeddings shared by retrieval and ingestion
+
+Chunks repeat across SOW revisions and across contracts from the same
+agency, so each (model, text) pair is embedded once and reused:
+
+- Memory tier: per-process LRU of the most recent vectors
+- Disk tier: per-model fixed-size float32 matrix memory-mapped from
+  vectors.npy, plus an SQLite index (key -> row, last access, checksum).
+  When the matrix is full the least-recently-used row is reused, so the
+  disk tier never grows past EMBEDDING_CACHE_MAX_BYTES.
+
+Rows are written before their index entry is committed, and every disk
+hit is checked against the stored CRC32, so a row being overwritten by
+another process reads as a miss rather than a wrong vector.
+"""
+import os
+import re
+import zlib
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", 4096))
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 100 * 1024 * 1024))
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key TEXT PRIMARY KEY,
+    slot INTEGER NOT NULL UNIQUE,
+    crc INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_embeddings_access ON embeddings (last_access);
+"""
+
+_lock = threading.Lock()
+_memory = OrderedDict()
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+_stores = {}
+
+
+def make_key(model: str, text: str) -> str:
+    """Cache key for one text embedded by one model"""
+    raw = f"{model}|{text}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _count(stat: str, amount: int = 1):
+    with _lock:
+        _stats[stat] += amount
+
+
+class _DiskStore:
+    """Memory-mapped vector file plus SQLite index for one model"""
+
+    def __init__(self, model: str):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model)
+        self.path = os.path.join(EMBEDDING_CACHE_DIR, slug)
+        self.vectors_file = os.path.join(self.path, "vectors.npy")
+        self.index_file = os.path.join(self.path, "index.db")
+        self._vectors = None
+        self._schema_ready = False
+        os.makedirs(self.path, exist_ok=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection (one per call, so it is safe from any thread)"""
+        conn = sqlite3.connect(self.index_file, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        if not self._schema_ready:
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def _open_vectors(self, dim: Optional[int] = None):
+        """
+        The mapped matrix, created with dim columns if it doesn't exist yet
+
+        Returns:
+            The memmap, or None if there is no file and no dim to create one
+        """
+        if self._vectors is not None and (dim is None or self._vectors.shape[1] == dim):
+            return self._vectors
+
+        if os.path.exists(self.vectors_file):
+            vectors = np.load(self.vectors_file, mmap_mode='r+')
+            if dim is None or vectors.shape[1] == dim:
+                self._vectors = vectors
+                return vectors
+        if dim is None:
+            return None
+
+        # New (or re-dimensioned) store: size the matrix to the byte budget
+        capacity = max(1, EMBEDDING_CACHE_MAX_BYTES // (dim * 4))
+        tmp_file = f"{self.vectors_file}.{os.getpid()}.tmp"
+        np.lib.format.open_memmap(tmp_file, mode='w+', dtype=np.float32, shape=(capacity, dim)).flush()
+        os.replace(tmp_file, self.vectors_file)
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM embeddings")
+        finally:
+            conn.close()
+        self._vectors = np.load(self.vectors_file, mmap_mode='r+')
+        return self._vectors
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Vectors found on disk, by key"""
+        vectors = self._open_vectors()
+        if vectors is None:
+            return {}
+
+        conn = self._connect()
+        try:
+            rows = []
+            for i in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[i:i + _LOOKUP_BATCH]
+                rows.extend(conn.execute(
+                    f"SELECT key, slot, crc FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall())
+
+            found = {}
+            for key, slot, crc in rows:
+                if slot >= len(vectors):
+                    continue
+                vector = np.array(vectors[slot])
+                if zlib.crc32(vector.tobytes()) == crc:
+                    found[key] = vector
+
+            if found:
+                hit_keys = list(found)
+                now = time.time()
+                for i in range(0, len(hit_keys), _LOOKUP_BATCH):
+                    batch = hit_keys[i:i + _LOOKUP_BATCH]
+                    conn.execute(
+                        f"UPDATE embeddings SET last_access = ? WHERE key IN ({','.join('?' * len(batch))})",
+                        [now] + batch
+                    )
+        finally:
+            conn.close()
+        return found
+
+    def put_many(self, entries: Dict[str, np.ndarray]) -> int:
+        """
+        Store vectors, reusing least-recently-used rows once the file is full
+
+        Returns:
+            Number of entries evicted
+        """
+        dim = len(next(iter(entries.values())))
+        vectors = self._open_vectors(dim)
+        capacity = len(vectors)
+        evicted = 0
+        now = time.time()
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            used = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+            for key, vector in entries.items():
+                row = conn.execute("SELECT slot FROM embeddings WHERE key = ?", (key,)).fetchone()
+                slot = row[0] if row else None
+                if slot is None:
+                    if used < capacity:
+                        slot = used
+                        used += 1
+                    else:
+                        slot = conn.execute(
+                            "SELECT slot FROM embeddings ORDER BY last_access LIMIT 1"
+                        ).fetchone()[0]
+                        conn.execute("DELETE FROM embeddings WHERE slot = ?", (slot,))
+                        evicted += 1
+
+                vector = np.asarray(vector, dtype=np.float32)
+                vectors[slot] = vector
+                conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, slot, crc, last_access) VALUES (?, ?, ?, ?)",
+                    (key, slot, zlib.crc32(vector.tobytes()), now)
+                )
+
+            # Rows must be on disk before other processes can see their index entries
+            vectors.flush()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return evicted
+
+    def stats(self) -> dict:
+        vectors = self._open_vectors()
+        conn = self._connect()
+        try:
+            entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        finally:
+            conn.close()
+        return {
+            "entries": entries,
+            "capacity": len(vectors) if vectors is not None else None,
+            "file_bytes": os.path.getsize(self.vectors_file) if vectors is not None else 0
+        }
+
+    def clear(self) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute("DELETE FROM embeddings").rowcount
+        finally:
+            conn.close()
+
+
+def _store(model: str) -> _DiskStore:
+    with _lock:
+        if model not in _stores:
+            _stores[model] = _DiskStore(model)
+        return _stores[model]
+
+
+def _model_slugs() -> List[str]:
+    """Model directories on disk (including ones this process hasn't used)"""
+    try:
+        names = os.listdir(EMBEDDING_CACHE_DIR)
+    except FileNotFoundError:
+        return []
+    return [name for name in names if os.path.exists(os.path.join(EMBEDDING_CACHE_DIR, name, "index.db"))]
+
+
+def _remember(key: str, vector: np.ndarray):
+    """Add to the memory tier, dropping the least recently used entry when full"""
+    with _lock:
+        _memory[key] = vector
+        _memory.move_to_end(key)
+        while len(_memory) > EMBEDDING_CACHE_MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def encode_with_cache(model: str, texts: List[str], encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+    """
+    Embed texts, only calling encode for the ones not cached yet
+
+    Args:
+        model: Name identifying the embedding model (part of the key)
+        texts: Texts to embed
+        encode: Function embedding a list of texts into a 2-D array
+
+    Returns:
+        float32 array with one row per text, in the same order
+    """
+    if not EMBEDDING_CACHE_ENABLED:
+        return np.asarray(encode(list(texts)), dtype=np.float32)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    keys = [make_key(model, text) for text in texts]
+    found = {}
+    with _lock:
+        for key in keys:
+            if key in _memory:
+                _memory.move_to_end(key)
+                found[key] = _memory[key]
+    memory_hits = len(found)
+
+    store = _store(model)
+    wanted = list(dict.fromkeys(key for key in keys if key not in found))
+    if wanted:
+        try:
+            on_disk = store.get_many(wanted)
+        except (sqlite3.Error, OSError, ValueError) as e:
+            print(f"[WARNING] Embedding cache read failed: {e}")
+            on_disk = {}
+        for key, vector in on_disk.items():
+            _remember(key, vector)
+        found.update(on_disk)
+    disk_hits = len(found) - memory_hits
+
+    # Encode each missing text once, even if it appears several times
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in missing:
+            missing[key] = text
+    if missing:
+        encoded = np.asarray(encode(list(missing.values())), dtype=np.float32)
+        new = dict(zip(missing, encoded))
+        for key, vector in new.items():
+            _remember(key, vector)
+        found.update(new)
+        try:
+            _count("evictions", store.put_many(new))
+            _count("writes", len(new))
+        except (sqlite3.Error, OSError, ValueError) as e:
+            print(f"[WARNING] Embedding cache write failed: {e}")
+
+    _count("memory_hits", memory_hits)
+    _count("disk_hits", disk_hits)
+    _count("misses", len(missing))
+    return np.stack([found[key] for key in keys])
+
+
+def clear_embedding_cache() -> int:
+    """Remove every cached embedding (both tiers, all models)"""
+    with _lock:
+        _memory.clear()
+    # Directory names are already slugs, so _DiskStore maps them to themselves
+    return sum(_store(slug).clear() for slug in _model_slugs())
+
+
+def get_embedding_cache_stats() -> dict:
+    """Hit/miss counters for this process plus memory and disk tier sizes"""
+    with _lock:
+        stats = dict(_stats)
+        stats["memory_entries"] = len(_memory)
+        stores = dict(_stores)
+
+    lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+    stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+    stats["memory_max_entries"] = EMBEDDING_CACHE_MEMORY_ENTRIES
+    stats["max_bytes"] = EMBEDDING_CACHE_MAX_BYTES
+    stats["models"] = {}
+    for model, store in stores.items():
+        try:
+            stats["models"][model] = store.stats()
+        except (sqlite3.Error, OSError, ValueError) as e:
+            stats["models"][model] = {"error": str(e)}
+    stats["enabled"] = EMBEDDING_CACHE_ENABLED
+    return stats
@@ -0,0 +1,72 @@
+"""
+Export the embedding model to ONNX and quantize it to int8 for EMBEDDER_BACKEND=onnx
+
+Writes into ONNX_MODEL_DIR:
+    model.onnx         fp32 export of the transformer (last hidden state)
+    model_int8.onnx    dynamically quantized copy (int8 weights)
+    tokenizer.json     fast tokenizer used by OnnxEmbedder
+
+Needs torch and transformers (already installed with sentence-transformers)
+plus onnxruntime, but only on the machine doing the export; the API nodes
+only need onnxruntime and tokenizers.
+
+Usage:
+    python export_onnx_embedder.py [--model all-MiniLM-L6-v2] [--out ./onnx_model]
+"""
+import os
+import argparse
+
+from embedders import ONNX_MODEL_DIR, ONNX_MODEL_FILE, EMBED_MAX_SEQ_LENGTH
+
+
+def export(model_name: str, out_dir: str, opset: int = 14):
+    """
+    Export, quantize and save the tokenizer
+
+    Args:
+        model_name: sentence-transformers model name or Hugging Face repo id
+        out_dir: Directory to write the files to
+        opset: ONNX opset version
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    os.makedirs(out_dir, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(repo_id)
+    tokenizer.save_pretrained(out_dir)
+    model = AutoModel.from_pretrained(repo_id)
+    model.eval()
+
+    sample = tokenizer(["export sample"], return_tensors="pt", truncation=True, max_length=EMBED_MAX_SEQ_LENGTH)
+    inputs = ("input_ids", "attention_mask", "token_type_ids")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in inputs}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in inputs),
+            fp32_path,
+            input_names=list(inputs),
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset
+        )
+    print(f"[OK] Exported {repo_id} to {fp32_path}")
+
+    int8_path = os.path.join(out_dir, ONNX_MODEL_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"[OK] Quantized to {int8_path} "
+          f"({os.path.getsize(fp32_path) // 1024 // 1024} MB -> {os.path.getsize(int8_path) // 1024 // 1024} MB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+    parser.add_argument("--out", default=ONNX_MODEL_DIR)
+    args = parser.parse_args()
+    export(args.model, args.out)
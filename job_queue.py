@@ -0,0 +1,332 @@
+"""
+SQLite-backed job queue for long-running SOW analyses
+
+Jobs (and their uploaded files) are stored on disk so that a restart does
+not lose work. Several processes (e.g. uvicorn workers) can share one
+database: a claimed job is leased to its owner for JOB_LEASE_SECONDS and
+the owner renews the lease while it runs. Only jobs whose lease has
+expired (their process died or hung) are put back in the queue, so a
+job another process is still running is never picked up twice.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "./jobs.db")
+
+# A job that keeps killing its worker is failed after this many attempts
+MAX_JOB_ATTEMPTS = 3
+
+# How long a claimed job stays with its owner without a renewal
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 60))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress_current INTEGER,
+    progress_total INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    lease_expires_at REAL,
+    result TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    content BLOB NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+"""
+
+# Columns added after the first release (added to existing databases on startup)
+LEASE_COLUMNS = {"owner": "TEXT", "lease_expires_at": "REAL"}
+
+
+def _connect() -> sqlite3.Connection:
+    """
+    Open a connection (one per call, so it is safe from any thread)
+
+    Uncommitted transactions are rolled back when the connection closes.
+    """
+    conn = sqlite3.connect(JOB_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def init_job_db():
+    """Create the job tables if they don't exist (and add the lease columns to older databases)"""
+    conn = _connect()
+    try:
+        conn.executescript(SCHEMA)
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for name, column_type in LEASE_COLUMNS.items():
+            if name not in columns:
+                try:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {column_type}")
+                except sqlite3.OperationalError:
+                    pass  # Another process added it first
+    finally:
+        conn.close()
+
+
+def create_job(files: List[Tuple[str, bytes]]) -> str:
+    """
+    Queue a new analysis job
+
+    Args:
+        files: List of (filename, file bytes) tuples, in upload order
+
+    Returns:
+        The new job id
+    """
+    job_id = uuid.uuid4().hex
+    now = _now()
+
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "INSERT INTO jobs (id, status, stage, created_at, updated_at) VALUES (?, 'queued', 'queued', ?, ?)",
+            (job_id, now, now)
+        )
+        conn.executemany(
+            "INSERT INTO job_files (job_id, idx, filename, content) VALUES (?, ?, ?, ?)",
+            [(job_id, idx, filename, content) for idx, (filename, content) in enumerate(files)]
+        )
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+    return job_id
+
+
+def _requeue_expired(conn: sqlite3.Connection) -> int:
+    """
+    Requeue running jobs whose lease has expired (inside the caller's transaction)
+
+    Jobs that already used MAX_JOB_ATTEMPTS are failed instead. Rows from
+    before leases existed have no lease and count as expired.
+
+    Returns:
+        Number of jobs requeued
+    """
+    now = time.time()
+    expired = "status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)"
+    conn.execute(
+        "UPDATE jobs SET status = 'failed', stage = 'failed', error = 'Interrupted too many times', "
+        f"owner = NULL, lease_expires_at = NULL, updated_at = ? WHERE {expired} AND attempts >= ?",
+        (_now(), now, MAX_JOB_ATTEMPTS)
+    )
+    cursor = conn.execute(
+        "UPDATE jobs SET status = 'queued', stage = 'queued', progress_current = NULL, "
+        f"progress_total = NULL, owner = NULL, lease_expires_at = NULL, updated_at = ? WHERE {expired}",
+        (_now(), now)
+    )
+    return cursor.rowcount
+
+
+def claim_next_job(owner: str) -> Optional[str]:
+    """
+    Atomically lease the oldest queued job to owner and move it to 'running'
+
+    Jobs whose lease expired are requeued first, so work from a process
+    that died is picked up by the ones still alive.
+
+    Args:
+        owner: Id of the claiming process (see renew_lease)
+
+    Returns:
+        The claimed job id, or None if the queue is empty
+    """
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        _requeue_expired(conn)
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+
+        conn.execute(
+            "UPDATE jobs SET status = 'running', stage = 'starting', attempts = attempts + 1, "
+            "owner = ?, lease_expires_at = ?, updated_at = ? WHERE id = ?",
+            (owner, time.time() + JOB_LEASE_SECONDS, _now(), row['id'])
+        )
+        conn.execute("COMMIT")
+        return row['id']
+    finally:
+        conn.close()
+
+
+def get_job_files(job_id: str) -> List[Tuple[str, bytes]]:
+    """Return the uploaded (filename, bytes) pairs for a job, in upload order"""
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT filename, content FROM job_files WHERE job_id = ? ORDER BY idx",
+            (job_id,)
+        ).fetchall()
+        return [(row['filename'], bytes(row['content'])) for row in rows]
+    finally:
+        conn.close()
+
+
+def renew_lease(job_id: str, owner: str) -> bool:
+    """
+    Extend owner's lease on a running job by JOB_LEASE_SECONDS
+
+    Returns:
+        False if the job is no longer running under this owner (its lease
+        expired and it was requeued, or it finished)
+    """
+    conn = _connect()
+    try:
+        cursor = conn.execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND owner = ? AND status = 'running'",
+            (time.time() + JOB_LEASE_SECONDS, job_id, owner)
+        )
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+def release_job(job_id: str, owner: str):
+    """Put a job owner is giving up on (e.g. at shutdown) straight back in the queue"""
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', stage = 'queued', progress_current = NULL, progress_total = NULL, "
+            "owner = NULL, lease_expires_at = NULL, updated_at = ? WHERE id = ? AND owner = ? AND status = 'running'",
+            (_now(), job_id, owner)
+        )
+    finally:
+        conn.close()
+
+
+def update_progress(job_id: str, stage: str, current: Optional[int] = None, total: Optional[int] = None):
+    """Record the current stage (and optional chunk progress) of a running job"""
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE jobs SET stage = ?, progress_current = ?, progress_total = ?, updated_at = ? "
+            "WHERE id = ? AND status = 'running'",
+            (stage, current, total, _now(), job_id)
+        )
+    finally:
+        conn.close()
+
+
+def _finish_job(job_id: str, owner: str, status: str, result: Optional[str], error: Optional[str]) -> bool:
+    """Record a job's outcome if owner still holds it, and drop its uploaded files"""
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.execute(
+            "UPDATE jobs SET status = ?, stage = ?, result = ?, error = ?, owner = NULL, lease_expires_at = NULL, "
+            "updated_at = ? WHERE id = ? AND owner = ? AND status = 'running'",
+            (status, status, result, error, _now(), job_id, owner)
+        )
+        if cursor.rowcount == 0:
+            conn.execute("ROLLBACK")
+            return False
+        conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+        conn.execute("COMMIT")
+        return True
+    finally:
+        conn.close()
+
+
+def complete_job(job_id: str, result: dict, owner: str) -> bool:
+    """
+    Store the final result and drop the job's uploaded files
+
+    Returns:
+        False if owner had lost the job (its lease expired) - nothing is written
+    """
+    return _finish_job(job_id, owner, 'completed', json.dumps(result), None)
+
+
+def fail_job(job_id: str, error: str, owner: str) -> bool:
+    """
+    Mark a job as failed and drop its uploaded files
+
+    Returns:
+        False if owner had lost the job (its lease expired) - nothing is written
+    """
+    return _finish_job(job_id, owner, 'failed', None, error)
+
+
+def requeue_interrupted_jobs() -> int:
+    """
+    Put jobs whose owner stopped renewing their lease back in the queue
+
+    Jobs still leased by a live process (another uvicorn worker sharing
+    the database) are left alone. Jobs that already used MAX_JOB_ATTEMPTS
+    are failed instead.
+
+    Returns:
+        Number of jobs requeued
+    """
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        requeued = _requeue_expired(conn)
+        conn.execute("COMMIT")
+        return requeued
+    finally:
+        conn.close()
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """
+    Look up a job's status, progress and (when finished) its result
+
+    Returns:
+        Job dictionary, or None if the id is unknown
+    """
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+
+    if row is None:
+        return None
+
+    progress = None
+    if row['progress_total']:
+        progress = {
+            "current": row['progress_current'],
+            "total": row['progress_total'],
+            "text": f"chunk {row['progress_current']}/{row['progress_total']}"
+        }
+
+    return {
+        "job_id": row['id'],
+        "status": row['status'],
+        "stage": row['stage'],
+        "progress": progress,
+        "attempts": row['attempts'],
+        "created_at": row['created_at'],
+        "updated_at": row['updated_at'],
+        "result": json.loads(row['result']) if row['result'] else None,
+        "error": row['error']
+    }
@@ -0,0 +1,163 @@
+"""
+Persistent cache of Claude responses shared by every analyzer module
+
+Every call uses temperature=0, so the same (model, max_tokens, temperature,
+prompt) always deserves the same answer. Responses are stored in SQLite and
+reused across runs: re-analyzing a revised SOW only pays for the prompts
+(e.g. RAG chunks) whose text actually changed.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./llm_cache.db")
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 30 * 24 * 3600))  # seconds
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 50000))
+
+# Check the size limit once every this many writes
+EVICTION_INTERVAL = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_responses_access ON llm_responses (last_access);
+"""
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+_schema_ready = False
+
+
+def _connect() -> sqlite3.Connection:
+    """Open a connection (one per call, so it is safe from any thread)"""
+    global _schema_ready
+    conn = sqlite3.connect(LLM_CACHE_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    if not _schema_ready:
+        conn.executescript(SCHEMA)
+        _schema_ready = True
+    return conn
+
+
+def _count(stat: str, amount: int = 1):
+    with _lock:
+        _stats[stat] += amount
+
+
+def make_key(model: str, max_tokens: int, temperature: float, prompt: str) -> str:
+    """Cache key for one Claude call"""
+    raw = f"{model}|{max_tokens}|{temperature}|{prompt}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def is_cacheable(temperature: float) -> bool:
+    """Only deterministic (temperature=0) calls are cached"""
+    return LLM_CACHE_ENABLED and temperature == 0
+
+
+def get_cached_response(model: str, max_tokens: int, temperature: float, prompt: str) -> Optional[str]:
+    """
+    Look up a cached Claude response
+
+    Returns:
+        Response text, or None on a miss (or an expired entry)
+    """
+    key = make_key(model, max_tokens, temperature, prompt)
+    now = time.time()
+
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None or now - row[1] > LLM_CACHE_TTL:
+            _count("misses")
+            return None
+
+        conn.execute("UPDATE llm_responses SET last_access = ? WHERE key = ?", (now, key))
+    finally:
+        conn.close()
+
+    _count("hits")
+    return row[0]
+
+
+def store_response(model: str, max_tokens: int, temperature: float, prompt: str, response: str):
+    """Save a Claude response (evicting old entries when over the limits)"""
+    key = make_key(model, max_tokens, temperature, prompt)
+    now = time.time()
+
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_responses (key, model, response, created_at, last_access) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, model, response, now, now)
+        )
+    finally:
+        conn.close()
+
+    _count("writes")
+    if _stats["writes"] % EVICTION_INTERVAL == 0:
+        evict()
+
+
+def evict() -> int:
+    """
+    Drop expired entries, then least-recently-used ones above LLM_CACHE_MAX_ENTRIES
+
+    Returns:
+        Number of entries removed
+    """
+    conn = _connect()
+    try:
+        expired = conn.execute(
+            "DELETE FROM llm_responses WHERE created_at < ?", (time.time() - LLM_CACHE_TTL,)
+        ).rowcount
+        overflow = conn.execute(
+            "DELETE FROM llm_responses WHERE key IN ("
+            "SELECT key FROM llm_responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (LLM_CACHE_MAX_ENTRIES,)
+        ).rowcount
+    finally:
+        conn.close()
+
+    _count("evictions", expired + overflow)
+    return expired + overflow
+
+
+def clear_llm_cache() -> int:
+    """Remove every cached response"""
+    conn = _connect()
+    try:
+        return conn.execute("DELETE FROM llm_responses").rowcount
+    finally:
+        conn.close()
+
+
+def get_llm_cache_stats() -> dict:
+    """Hit/miss counters for this process plus the number of stored entries"""
+    conn = _connect()
+    try:
+        entries = conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+    finally:
+        conn.close()
+
+    with _lock:
+        stats = dict(_stats)
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+    stats["entries"] = entries
+    stats["enabled"] = LLM_CACHE_ENABLED
+    return stats
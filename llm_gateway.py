@@ -0,0 +1,585 @@
+"""
+Shared gateway for every Claude call made by the analyzer modules
+
+One place that owns:
+- pooled keep-alive HTTP connections (one sync + one async client per event loop)
+- a process-wide concurrency cap shared by sync and async calls, and a
+  token-bucket rate limiter
+- jittered exponential backoff on 429 / 5xx / connection errors
+- per-call timeouts
+- per-call latency and token metrics (including prompt-cache reads/writes)
+- Anthropic prompt caching for static instruction prefixes long enough to qualify
+- schema-constrained (tool use) responses, validated and retried per call
+- the persistent response cache (llm_cache.py)
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import weakref
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from anthropic import (
+    Anthropic, AsyncAnthropic, DefaultHttpxClient, DefaultAsyncHttpxClient,
+    APIStatusError, APIConnectionError, APITimeoutError
+)
+from dotenv import load_dotenv
+
+from cpu_pool import run_in_pool
+from llm_cache import is_cacheable, get_cached_response, store_response
+from structured_output import check_schema
+
+load_dotenv()
+
+DEFAULT_MODEL = "claude-3-haiku-20240307"
+
+LLM_MAX_CONCURRENCY = max(1, int(os.getenv("LLM_MAX_CONCURRENCY", 8)))
+LLM_RATE_LIMIT_RPM = float(os.getenv("LLM_RATE_LIMIT_RPM", 50))
+LLM_RATE_LIMIT_BURST = max(1, int(os.getenv("LLM_RATE_LIMIT_BURST", 5)))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 120))  # seconds per call
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+
+# Send static instruction prefixes as cache-controlled system blocks
+LLM_PROMPT_CACHING = os.getenv("LLM_PROMPT_CACHING", "true").lower() == "true"
+
+# Shortest prefix (tools + system, in tokens) Anthropic will cache per model
+# family; shorter prefixes are never cached, so they are sent as plain calls
+PROMPT_CACHE_MIN_TOKENS = {"haiku": 2048}
+PROMPT_CACHE_DEFAULT_MIN_TOKENS = 1024
+
+# Force schema-constrained answers through tool use when a caller supplies a tool
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "true").lower() == "true"
+
+# Extra attempts for a response that can't be parsed or fails its schema
+LLM_PARSE_RETRIES = max(0, int(os.getenv("LLM_PARSE_RETRIES", 1)))
+
+# Backoff: full jitter over base * 2^attempt, capped
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+# Keep-alive pool shared by every call
+HTTP_LIMITS = httpx.Limits(
+    max_connections=LLM_MAX_CONCURRENCY * 2,
+    max_keepalive_connections=LLM_MAX_CONCURRENCY
+)
+
+# Number of recent latencies kept for percentile metrics
+LATENCY_WINDOW = 500
+
+
+class TokenBucket:
+    """Thread-safe token bucket; reserve() returns how long to wait for a token"""
+
+    def __init__(self, rate_per_minute: float, capacity: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token (possibly from the future) and return the seconds to wait"""
+        if self.rate <= 0:
+            return 0.0
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+_rate_limiter = TokenBucket(LLM_RATE_LIMIT_RPM, LLM_RATE_LIMIT_BURST)
+
+# One limiter for every call, whichever thread or event loop makes it, so
+# LLM_MAX_CONCURRENCY bounds the total number of requests in flight
+_call_limiter = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+# Async callers wait for a slot on these threads rather than on the event
+# loop (or the default executor, which asyncio also uses for DNS lookups)
+_limiter_waiters = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm-limiter")
+
+_sync_client = None
+_sync_client_lock = threading.Lock()
+
+# httpx async pools belong to one event loop
+_async_clients = weakref.WeakKeyDictionary()
+
+_metrics_lock = threading.Lock()
+_metrics = {}
+
+
+def get_client() -> Anthropic:
+    """Shared sync client (retries are handled by the gateway, not the SDK)"""
+    global _sync_client
+    with _sync_client_lock:
+        if _sync_client is None:
+            _sync_client = Anthropic(
+                api_key=os.getenv("ANTHROPIC_API_KEY"),
+                max_retries=0,
+                http_client=DefaultHttpxClient(limits=HTTP_LIMITS)
+            )
+        return _sync_client
+
+
+def get_async_client() -> AsyncAnthropic:
+    """Shared async client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"),
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(limits=HTTP_LIMITS)
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def _acquire_call_slot():
+    """Take a slot in the shared call limiter without blocking the event loop"""
+    if _call_limiter.acquire(blocking=False):
+        return
+
+    waiter = _limiter_waiters.submit(_call_limiter.acquire)
+    try:
+        await asyncio.wrap_future(waiter)
+    except asyncio.CancelledError:
+        # The waiting thread may still get the slot after we stop waiting - hand it back
+        if not waiter.cancel():
+            waiter.add_done_callback(lambda _: _call_limiter.release())
+        raise
+
+
+def _is_retryable(error: Exception) -> bool:
+    """429, 5xx (including 529 overloaded), timeouts and dropped connections"""
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def _backoff_delay(attempt: int, error: Exception) -> float:
+    """Seconds to wait before retry number attempt+1"""
+    # Respect the server's retry-after hint when it sends one
+    if isinstance(error, APIStatusError):
+        retry_after = error.response.headers.get("retry-after")
+        try:
+            if retry_after is not None:
+                return min(BACKOFF_CAP, float(retry_after))
+        except ValueError:
+            pass
+
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+
+def _purpose_metrics(purpose: str) -> dict:
+    """Metrics dict for one purpose (call with _metrics_lock held)"""
+    return _metrics.setdefault(purpose, {
+        "calls": 0,
+        "errors": 0,
+        "retries": 0,
+        "parse_failures": 0,
+        "parse_retries": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "prompt_cached_calls": 0,
+        "cache_write_tokens": 0,
+        "cache_read_tokens": 0,
+        "total_latency": 0.0,
+        "latencies": deque(maxlen=LATENCY_WINDOW)
+    })
+
+
+def _record(purpose: str, latency: float = None, message=None, retries: int = 0, error: bool = False,
+            prompt_cached: bool = False):
+    """Update per-purpose call metrics"""
+    with _metrics_lock:
+        m = _purpose_metrics(purpose)
+        m["retries"] += retries
+        if error:
+            m["errors"] += 1
+            return
+
+        m["calls"] += 1
+        m["prompt_cached_calls"] += prompt_cached
+        m["total_latency"] += latency
+        m["latencies"].append(latency)
+
+        usage = getattr(message, "usage", None)
+        if usage is not None:
+            m["input_tokens"] += getattr(usage, "input_tokens", 0) or 0
+            m["output_tokens"] += getattr(usage, "output_tokens", 0) or 0
+            m["cache_write_tokens"] += getattr(usage, "cache_creation_input_tokens", 0) or 0
+            m["cache_read_tokens"] += getattr(usage, "cache_read_input_tokens", 0) or 0
+
+
+def _record_parse_failure(purpose: str, retried: bool):
+    """Count a response that could not be parsed (and whether it was retried)"""
+    with _metrics_lock:
+        m = _purpose_metrics(purpose)
+        m["parse_failures"] += 1
+        if retried:
+            m["parse_retries"] += 1
+
+
+def get_gateway_metrics() -> dict:
+    """Per-purpose call counts, token totals and latency percentiles"""
+    def percentile(values, pct):
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(pct * len(ordered)))], 3)
+
+    with _metrics_lock:
+        report = {}
+        for purpose, m in _metrics.items():
+            latencies = list(m["latencies"])
+            report[purpose] = {
+                "calls": m["calls"],
+                "errors": m["errors"],
+                "retries": m["retries"],
+                "parse_failures": m["parse_failures"],
+                "parse_retries": m["parse_retries"],
+                "input_tokens": m["input_tokens"],
+                "output_tokens": m["output_tokens"],
+                "avg_latency": round(m["total_latency"] / m["calls"], 3) if m["calls"] else None,
+                "p50_latency": percentile(latencies, 0.50),
+                "p95_latency": percentile(latencies, 0.95)
+            }
+            # Only stages whose prefix is long enough to be cached can report cache traffic
+            if m["prompt_cached_calls"]:
+                report[purpose]["prompt_cached_calls"] = m["prompt_cached_calls"]
+                report[purpose]["cache_write_tokens"] = m["cache_write_tokens"]
+                report[purpose]["cache_read_tokens"] = m["cache_read_tokens"]
+
+    return {
+        "limits": {
+            "max_concurrency": LLM_MAX_CONCURRENCY,
+            "rate_limit_rpm": LLM_RATE_LIMIT_RPM,
+            "timeout": LLM_TIMEOUT,
+            "max_retries": LLM_MAX_RETRIES,
+            "prompt_caching": LLM_PROMPT_CACHING,
+            "prompt_cache_min_tokens": _prompt_cache_min_tokens(DEFAULT_MODEL),
+            "structured_output": LLM_STRUCTURED_OUTPUT,
+            "parse_retries": LLM_PARSE_RETRIES
+        },
+        "calls": report
+    }
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)"""
+    return len(text) // 4
+
+
+def _prompt_cache_min_tokens(model: str) -> int:
+    """Minimum cacheable prefix length for a model"""
+    for family, tokens in PROMPT_CACHE_MIN_TOKENS.items():
+        if family in model:
+            return tokens
+    return PROMPT_CACHE_DEFAULT_MIN_TOKENS
+
+
+def _use_prompt_cache(model: str, system: str = None, tool: dict = None) -> bool:
+    """
+    Whether a call's static prefix can actually be cached
+
+    The cached prefix is the tool definition plus the system block; below
+    the model's minimum the API silently skips caching, so such calls go
+    through the regular endpoint without cache_control.
+    """
+    if not (LLM_PROMPT_CACHING and system):
+        return False
+    prefix = system + (json.dumps(tool) if tool else "")
+    return estimate_tokens(prefix) >= _prompt_cache_min_tokens(model)
+
+
+def _request_kwargs(
+    prompt: str,
+    model: str,
+    max_tokens: int,
+    temperature: float,
+    system: str = None,
+    tool: dict = None
+) -> dict:
+    """Arguments for messages.create; a long enough system prefix is marked for prompt caching"""
+    kwargs = {
+        "model": model,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "messages": [
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        "timeout": LLM_TIMEOUT
+    }
+    if system:
+        block = {"type": "text", "text": system}
+        if _use_prompt_cache(model, system, tool):
+            block["cache_control"] = {"type": "ephemeral"}
+        kwargs["system"] = [block]
+    if tool:
+        kwargs["tools"] = [tool]
+        kwargs["tool_choice"] = {"type": "tool", "name": tool["name"]}
+    return kwargs
+
+
+def _messages_api(client, prompt_cached: bool):
+    """Prompt-cached calls go through the SDK's prompt caching endpoint"""
+    if prompt_cached:
+        return client.beta.prompt_caching.messages
+    return client.messages
+
+
+def create_message(
+    prompt: str,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 4096,
+    temperature: float = 0,
+    purpose: str = "default",
+    system: str = None,
+    tool: dict = None
+):
+    """
+    Call Claude with a single user prompt through the gateway (no cache)
+
+    Args:
+        prompt: User message text
+        model: Claude model to use
+        max_tokens: Response token limit
+        temperature: Sampling temperature
+        purpose: Metrics label (e.g. 'extraction', 'validation')
+        system: Optional static instruction prefix, sent as a system block
+            ahead of the variable prompt (prompt-cached if long enough)
+        tool: Optional tool definition Claude is forced to call (structured output)
+
+    Returns:
+        Anthropic Message
+    """
+    prompt_cached = _use_prompt_cache(model, system, tool)
+    retries = 0
+    while True:
+        time.sleep(_rate_limiter.reserve())
+        with _call_limiter:
+            start = time.perf_counter()
+            try:
+                client = get_client()
+                message = _messages_api(client, prompt_cached).create(
+                    **_request_kwargs(prompt, model, max_tokens, temperature, system, tool)
+                )
+            except Exception as e:
+                if not _is_retryable(e) or retries >= LLM_MAX_RETRIES:
+                    _record(purpose, retries=retries, error=True)
+                    raise
+                delay = _backoff_delay(retries, e)
+                print(f"[LLM] {purpose}: {type(e).__name__}, retrying in {delay:.1f}s...")
+            else:
+                _record(purpose, time.perf_counter() - start, message, retries, prompt_cached=prompt_cached)
+                return message
+
+        retries += 1
+        time.sleep(delay)
+
+
+async def create_message_async(
+    prompt: str,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 4096,
+    temperature: float = 0,
+    purpose: str = "default",
+    system: str = None,
+    tool: dict = None
+):
+    """
+    Async version of create_message
+
+    Returns:
+        Anthropic Message
+    """
+    prompt_cached = _use_prompt_cache(model, system, tool)
+    retries = 0
+    while True:
+        await asyncio.sleep(_rate_limiter.reserve())
+        await _acquire_call_slot()
+        try:
+            start = time.perf_counter()
+            try:
+                client = get_async_client()
+                message = await _messages_api(client, prompt_cached).create(
+                    **_request_kwargs(prompt, model, max_tokens, temperature, system, tool)
+                )
+            except Exception as e:
+                if not _is_retryable(e) or retries >= LLM_MAX_RETRIES:
+                    _record(purpose, retries=retries, error=True)
+                    raise
+                delay = _backoff_delay(retries, e)
+                print(f"[LLM] {purpose}: {type(e).__name__}, retrying in {delay:.1f}s...")
+            else:
+                _record(purpose, time.perf_counter() - start, message, retries, prompt_cached=prompt_cached)
+                return message
+        finally:
+            _call_limiter.release()
+
+        retries += 1
+        await asyncio.sleep(delay)
+
+
+def _cache_prompt(prompt: str, system: str = None, tool: dict = None) -> str:
+    """Text the response cache is keyed on (tool schema + system prefix + prompt)"""
+    if system:
+        prompt = f"{system}\n\n{prompt}"
+    if tool:
+        prompt = f"{json.dumps(tool, sort_keys=True)}\n\n{prompt}"
+    return prompt
+
+
+def _response_text(message, tool: dict = None) -> str:
+    """Response text, or the forced tool call's input serialized as JSON"""
+    if not tool:
+        return message.content[0].text
+    for block in message.content:
+        if getattr(block, "type", None) == "tool_use":
+            return json.dumps(block.input, ensure_ascii=False)
+    raise ValueError(f"Response has no {tool['name']} tool call")
+
+
+def _parse_response(response_text: str, parse, tool: dict = None):
+    """Validate a structured response against its schema, then parse it"""
+    if tool:
+        check_schema(json.loads(response_text), tool["input_schema"])
+    return parse(response_text)
+
+
+# Errors that mean "Claude answered, but not in the expected shape"
+PARSE_ERRORS = (ValueError, KeyError, TypeError, IndexError)
+
+
+def complete(
+    prompt: str,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 4096,
+    temperature: float = 0,
+    purpose: str = "default",
+    parse=None,
+    system: str = None,
+    tool: dict = None,
+    cache: bool = True
+):
+    """
+    Get Claude's answer to a prompt, using the response cache
+
+    A response that can't be parsed (or fails the tool's schema) is
+    retried up to LLM_PARSE_RETRIES times; only this call is repeated.
+
+    Args:
+        prompt: User message text
+        model, max_tokens, temperature: Passed through to Claude
+        purpose: Metrics label
+        parse: Optional callable applied to the response text; the response
+            is only cached if it parses without raising
+        system: Optional static instruction prefix (prompt-cached when long enough)
+        tool: Optional tool definition (see structured_output.make_tool);
+            Claude must answer by calling it, and parse receives the tool
+            input as JSON text. Ignored when LLM_STRUCTURED_OUTPUT is off
+        cache: Use the response cache (False for callers that cache the
+            parsed result at a finer grain themselves)
+
+    Returns:
+        Response text, or parse(response text) when parse is given
+    """
+    parse = parse or (lambda text: text)
+    tool = tool if LLM_STRUCTURED_OUTPUT else None
+
+    cache_prompt = _cache_prompt(prompt, system, tool)
+    cache = cache and is_cacheable(temperature)
+
+    if cache:
+        cached = get_cached_response(model, max_tokens, temperature, cache_prompt)
+        if cached is not None:
+            try:
+                return _parse_response(cached, parse, tool)
+            except PARSE_ERRORS:
+                pass  # Stale entry from an older schema - ask again
+
+    attempt = 0
+    while True:
+        message = create_message(prompt, model, max_tokens, temperature, purpose, system, tool)
+        try:
+            response_text = _response_text(message, tool)
+            result = _parse_response(response_text, parse, tool)
+            break
+        except PARSE_ERRORS as e:
+            retry = attempt < LLM_PARSE_RETRIES
+            _record_parse_failure(purpose, retry)
+            if not retry:
+                raise
+            attempt += 1
+            print(f"[LLM] {purpose}: unusable response ({e}), retrying...")
+
+    if cache:
+        store_response(model, max_tokens, temperature, cache_prompt, response_text)
+
+    return result
+
+
+async def complete_async(
+    prompt: str,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 4096,
+    temperature: float = 0,
+    purpose: str = "default",
+    parse=None,
+    system: str = None,
+    tool: dict = None,
+    cache: bool = True
+):
+    """
+    Async version of complete (cache I/O runs on the CPU pool)
+
+    Returns:
+        Response text, or parse(response text) when parse is given
+    """
+    parse = parse or (lambda text: text)
+    tool = tool if LLM_STRUCTURED_OUTPUT else None
+
+    cache_prompt = _cache_prompt(prompt, system, tool)
+    cache = cache and is_cacheable(temperature)
+
+    if cache:
+        cached = await run_in_pool(get_cached_response, model, max_tokens, temperature, cache_prompt)
+        if cached is not None:
+            try:
+                return _parse_response(cached, parse, tool)
+            except PARSE_ERRORS:
+                pass  # Stale entry from an older schema - ask again
+
+    attempt = 0
+    while True:
+        message = await create_message_async(prompt, model, max_tokens, temperature, purpose, system, tool)
+        try:
+            response_text = _response_text(message, tool)
+            result = _parse_response(response_text, parse, tool)
+            break
+        except PARSE_ERRORS as e:
+            retry = attempt < LLM_PARSE_RETRIES
+            _record_parse_failure(purpose, retry)
+            if not retry:
+                raise
+            attempt += 1
+            print(f"[LLM] {purpose}: unusable response ({e}), retrying...")
+
+    if cache:
+        await run_in_pool(store_response, model, max_tokens, temperature, cache_prompt, response_text)
+
+    return result
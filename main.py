@@ -3,20 +3,45 @@ FastAPI Backend for SOW Analyzer
 """
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import os
 import json
-from typing import List
-import tempfile
+import asyncio
+import hashlib
+import re
+import uuid
+import socket
+from typing import List, Optional, Callable
 from datetime import datetime
 
 # Import our analysis modules
-from sow_extractor import extract_from_file
-from risk_analyzer import analyze_sow
+from sow_extractor import (
+    extract_from_bytes_async, read_document_bytes, EXTRACTION_PROMPT, EXTRACTION_INPUT, EXTRACTION_TOOL
+)
+from risk_analyzer import analyze_sow_async, ANALYSIS_PROMPT, ANALYSIS_INPUT, ANALYSIS_TOOL
+from cpu_pool import run_in_pool, shutdown_pool
+from red_flag_scanner import scan_red_flags
+from result_cache import (
+    hash_content, make_pipeline_version, get_cached_result, store_result,
+    invalidate, get_cache_stats
+)
+from llm_cache import get_llm_cache_stats, clear_llm_cache
+from embedding_cache import get_embedding_cache_stats, clear_embedding_cache
+from llm_gateway import DEFAULT_MODEL, LLM_STRUCTURED_OUTPUT, get_gateway_metrics
+from job_queue import (
+    init_job_db, create_job, claim_next_job, get_job_files, update_progress,
+    complete_job, fail_job, requeue_interrupted_jobs, get_job,
+    renew_lease, release_job, JOB_LEASE_SECONDS
+)
 
 # Try to import RAG analyzer (may fail if dependencies not installed)
 try:
-    from rag_analyzer import analyze_sow_with_rag
+    from rag_analyzer import (
+        analyze_sow_with_rag_async, iter_rag_findings_async, get_gate_stats,
+        VALIDATION_PROMPT, VALIDATION_INPUT, VALIDATION_BATCH_PROMPT, RAG_BATCH_VALIDATION,
+        VALIDATION_TOOL, VALIDATION_BATCH_TOOL, get_rag_settings_version
+    )
+    from vector_db_setup import get_library_version, warm_up, get_readiness, EMBEDDER_ID
     RAG_AVAILABLE = True
     print("[OK] RAG analysis available")
 except ImportError as e:
@@ -27,13 +52,63 @@ except ImportError as e:
 
 # Try to import overlap analyzer
 try:
-    from overlap_analyzer import analyze_overlap
+    from overlap_analyzer import analyze_overlap_async
     OVERLAP_AVAILABLE = True
     print("[OK] Overlap analysis available")
 except ImportError as e:
     OVERLAP_AVAILABLE = False
     print(f"[WARNING] Overlap analysis not available: {e}")
 
+ALLOWED_EXTENSIONS = ['.pdf', '.docx', '.txt']
+MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+UPLOAD_CHUNK_SIZE = 64 * 1024  # Uploads are read in bounded chunks
+
+# Maximum number of uploaded files analyzed at the same time
+MAX_PARALLEL_FILES = max(1, int(os.getenv("MAX_PARALLEL_FILES", 3)))
+
+# Background workers for the /api/jobs queue
+JOB_WORKERS = max(1, int(os.getenv("JOB_WORKERS", 1)))
+JOB_POLL_INTERVAL = 1.0  # seconds between polls of an empty queue
+JOB_ERROR_BACKOFF_MAX = 30.0  # longest wait after repeated job queue errors
+job_worker_tasks = []
+
+# Owner of the jobs this process claims (processes sharing jobs.db only
+# requeue each other's jobs once the lease has expired)
+JOB_OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Background warm-up of the embedding model and pattern collection
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "true").lower() == "true"
+warm_up_task = None
+
+# Finding categories shared by the RAG and basic analyzers
+FINDING_CATEGORIES = ['weak_kpis', 'scope_creep', 'missing_elements',
+                      'inconsistencies', 'deliverable_issues', 'red_flags']
+
+# /api/analyze modes: "full" runs the Claude pipeline, "fast" only the
+# local red-flag scanner (no API calls)
+ANALYSIS_MODES = ("full", "fast")
+
+# Default model used by every analyzer module
+ANALYSIS_MODEL = DEFAULT_MODEL
+
+# Result cache: keyed by file SHA-256 + everything else that shapes a result
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RAG_PROMPTS = ""
+RESPONSE_SCHEMAS = [EXTRACTION_TOOL, ANALYSIS_TOOL] if LLM_STRUCTURED_OUTPUT else []
+if RAG_AVAILABLE:
+    RAG_PROMPTS = VALIDATION_PROMPT + VALIDATION_INPUT + (VALIDATION_BATCH_PROMPT if RAG_BATCH_VALIDATION else "")
+    if LLM_STRUCTURED_OUTPUT:
+        RESPONSE_SCHEMAS += [VALIDATION_TOOL, VALIDATION_BATCH_TOOL]
+PROMPT_VERSION = hashlib.sha256(
+    (EXTRACTION_PROMPT + EXTRACTION_INPUT + ANALYSIS_PROMPT + ANALYSIS_INPUT + RAG_PROMPTS +
+     json.dumps(RESPONSE_SCHEMAS, sort_keys=True)).encode('utf-8')
+).hexdigest()[:12]
+# Chunking, gate/dedup settings and the embedder change which findings come back, so they version results too
+VECTOR_DB_VERSION = (
+    f"{get_library_version()}-{EMBEDDER_ID}-{get_rag_settings_version()}" if RAG_AVAILABLE else "none"
+)
+PIPELINE_VERSION = make_pipeline_version(ANALYSIS_MODEL, PROMPT_VERSION, VECTOR_DB_VERSION)
+
 app = FastAPI(
     title="SOW Analyzer API",
     description="AI-powered analysis of government contract Statements of Work",
@@ -50,6 +125,46 @@ app.add_middleware(
 )
 
 
+async def warm_up_rag():
+    """Load the embedding model and vector DB without blocking startup"""
+    print("[Startup] Warming up embedding model and vector DB in the background...")
+    # Own thread, so the bounded CPU pool stays free for requests meanwhile
+    if await asyncio.to_thread(warm_up):
+        print("[Startup] [OK] RAG warm-up complete")
+    else:
+        print("[Startup] [WARNING] RAG warm-up failed - RAG analysis will fall back to basic analysis")
+
+
+@app.on_event("startup")
+async def on_startup():
+    """Prepare the job queue, requeue jobs whose lease expired, start workers and RAG warm-up"""
+    global warm_up_task
+    await run_in_pool(init_job_db)
+    requeued = await run_in_pool(requeue_interrupted_jobs)
+    if requeued:
+        print(f"[Jobs] Requeued {requeued} interrupted job(s)")
+
+    for worker_id in range(JOB_WORKERS):
+        job_worker_tasks.append(asyncio.create_task(job_worker(worker_id + 1)))
+
+    if RAG_AVAILABLE and WARM_UP_ON_STARTUP:
+        warm_up_task = asyncio.create_task(warm_up_rag())
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Stop job workers and wait for in-flight parsing/embedding work"""
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+
+    for task in job_worker_tasks:
+        task.cancel()
+    await asyncio.gather(*job_worker_tasks, return_exceptions=True)
+    job_worker_tasks.clear()
+
+    shutdown_pool()
+
+
 @app.get("/")
 def read_root():
     """Health check endpoint"""
@@ -59,7 +174,12 @@ def read_root():
         "version": "1.0.0",
         "endpoints": {
             "analyze": "/api/analyze",
-            "health": "/health"
+            "analyze_stream": "/api/analyze/stream",
+            "cache": "/api/cache",
+            "metrics": "/api/metrics",
+            "jobs": "/api/jobs",
+            "health": "/health",
+            "ready": "/ready"
         }
     }
 
@@ -74,161 +194,340 @@ def health_check():
     }
 
 
+@app.get("/ready")
+def readiness_check():
+    """
+    Readiness probe: 503 until the embedding model is loaded and the
+    pattern collection has examples (always ready when RAG is unavailable,
+    since requests then use basic analysis)
+    """
+    if not RAG_AVAILABLE:
+        return {"ready": True, "rag_available": False}
+
+    readiness = get_readiness()
+    readiness["rag_available"] = True
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
+
+
+def build_summary(extracted_data: dict, analysis: dict) -> dict:
+    """Calculate summary statistics for one analyzed file"""
+    all_findings = []
+    for category in FINDING_CATEGORIES:
+        findings = analysis.get(category, [])
+        all_findings.extend(findings)
+
+    high_count = sum(1 for f in all_findings if f.get('severity') == 'HIGH')
+    medium_count = sum(1 for f in all_findings if f.get('severity') == 'MEDIUM')
+    low_count = sum(1 for f in all_findings if f.get('severity') == 'LOW')
+
+    return {
+        "total_findings": len(all_findings),
+        "high_severity": high_count,
+        "medium_severity": medium_count,
+        "low_severity": low_count,
+        "tasks_found": len(extracted_data.get("tasks", [])),
+        "kpis_found": len(extracted_data.get("kpis", [])),
+        "deliverables_found": len(extracted_data.get("deliverables", []))
+    }
+
+
+def degraded_reasons(extracted_data: dict, analysis: dict, analysis_mode: str) -> List[str]:
+    """
+    Why a per-file result is incomplete (empty if it is not)
+
+    A degraded result comes from a one-off failure, so it must not be
+    served from the result cache until PIPELINE_VERSION changes.
+    """
+    reasons = []
+    if analysis_mode == "fallback":
+        reasons.append("rag_fallback")
+    if analysis.get("validation_errors"):
+        reasons.append("validation_errors")
+    if extracted_data.get("extraction_segments", {}).get("failed"):
+        reasons.append("extraction_segments_failed")
+    return reasons
+
+
+async def process_single_file(
+    filename: str,
+    content: bytes,
+    label: str = "1/1",
+    progress_callback: Optional[Callable] = None,
+    pending_stores: Optional[list] = None
+) -> dict:
+    """
+    Run the extraction -> risk analysis chain for one uploaded file
+
+    Args:
+        filename: Original name of the uploaded file
+        content: Uploaded file bytes
+        label: Progress label used in log output (e.g. "2/5")
+        progress_callback: Optional callable(stage, current, total, filename)
+            used to report this file's current stage and chunk progress
+        pending_stores: Optional list; when given, (content hash, result) is
+            appended to it instead of being stored in the result cache, so
+            the caller can decide once the whole run has finished
+
+    Returns:
+        Per-file result dictionary (summary, extracted data, analysis, raw
+        text, degraded reasons)
+    """
+    def report(stage, current=None, total=None):
+        if progress_callback:
+            progress_callback(stage, current, total, filename)
+
+    # Re-uploads of the same file are served from the result cache
+    if RESULT_CACHE_ENABLED:
+        content_hash = await run_in_pool(hash_content, content)
+        cached = await run_in_pool(get_cached_result, content_hash, PIPELINE_VERSION)
+        if cached is not None:
+            print(f"[{label}] [OK] Result cache hit for {filename}")
+            cached["filename"] = filename
+            return cached
+
+    # Step 1: Extract structured data
+    print(f"[{label}] Extracting data from {filename}...")
+    report("extracting")
+    extracted_data = await extract_from_bytes_async(content, filename)
+
+    # Raw text for overlap analysis
+    raw_text = extracted_data.get('raw_text', '')
+
+    # Step 2: Analyze for risks using RAG (with fallback to basic analysis)
+    if RAG_AVAILABLE:
+        print(f"   [{label}] Analyzing with RAG (searching vector database)...")
+        try:
+            analysis = await analyze_sow_with_rag_async(extracted_data, progress_callback=report)
+            print(f"   [{label}] [OK] RAG analysis complete")
+            analysis_mode = "rag"
+        except Exception as e:
+            print(f"   [{label}] [WARNING] RAG analysis error: {str(e)}")
+            print(f"   [{label}] Falling back to basic analysis...")
+            report("risk_analysis")
+            analysis = await analyze_sow_async(extracted_data)
+            print(f"   [{label}] [OK] Basic analysis complete")
+            analysis_mode = "fallback"
+    else:
+        print(f"   [{label}] Analyzing with basic analyzer...")
+        report("risk_analysis")
+        analysis = await analyze_sow_async(extracted_data)
+        print(f"   [{label}] [OK] Basic analysis complete")
+        analysis_mode = "basic"
+
+    result = {
+        "filename": filename,
+        "contract_id": extracted_data.get("metadata", {}).get("contract_id"),
+        "contractor": extracted_data.get("metadata", {}).get("contractor"),
+        "summary": build_summary(extracted_data, analysis),
+        "extracted_data": extracted_data,
+        "analysis": analysis,
+        "raw_text": raw_text,  # Store for overlap analysis
+        "degraded": degraded_reasons(extracted_data, analysis, analysis_mode)
+    }
+
+    # Don't cache degraded results (failed RAG run, chunks or segments that errored)
+    if result["degraded"]:
+        print(f"   [{label}] [WARNING] Result degraded ({', '.join(result['degraded'])}), not caching")
+    elif RESULT_CACHE_ENABLED:
+        if pending_stores is not None:
+            pending_stores.append((content_hash, result))
+        else:
+            await run_in_pool(store_result, content_hash, PIPELINE_VERSION, result)
+
+    return result
+
+
+async def scan_single_file(filename: str, content: bytes, label: str = "1/1") -> dict:
+    """
+    Fast mode: parse one uploaded file and run the local red-flag scanner
+
+    Args:
+        filename: Original name of the uploaded file
+        content: Uploaded file bytes
+        label: Progress label used in log output (e.g. "2/5")
+
+    Returns:
+        Per-file result dictionary in the same shape as process_single_file
+        (scope_creep findings only, no extracted data)
+    """
+    print(f"[{label}] Scanning {filename} for red-flag phrases...")
+    file_ext = os.path.splitext(filename)[1].lower()
+    raw_text = await run_in_pool(read_document_bytes, content, file_ext)
+
+    analysis = {category: [] for category in FINDING_CATEGORIES}
+    analysis['scope_creep'] = await run_in_pool(scan_red_flags, raw_text)
+    print(f"   [{label}] [OK] {len(analysis['scope_creep'])} red-flag phrases found")
+
+    return {
+        "filename": filename,
+        "contract_id": None,
+        "contractor": None,
+        "summary": build_summary({}, analysis),
+        "extracted_data": {},
+        "analysis": analysis,
+        "raw_text": raw_text
+    }
+
+
+async def read_upload(file: UploadFile) -> bytes:
+    """
+    Validate an uploaded file's type and read it in bounded chunks
+
+    The size limit is enforced while bytes arrive, so an oversized upload
+    is rejected without reading the rest of it.
+
+    Raises:
+        HTTPException: 400 if the file type is unsupported or too large
+    """
+    # Validate file type
+    file_ext = os.path.splitext(file.filename)[1].lower()
+
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type '{file.filename}'. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+
+    # Validate file size (10MB limit)
+    content = bytearray()
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        if len(content) + len(chunk) > MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File '{file.filename}' too large. Maximum size: 10MB"
+            )
+        content.extend(chunk)
+
+    return bytes(content)
+
+
+async def run_analysis(
+    uploads: List[tuple],
+    progress_callback: Optional[Callable] = None,
+    mode: str = "full"
+) -> dict:
+    """
+    Analyze uploaded files concurrently, then run overlap analysis
+
+    Args:
+        uploads: (filename, file bytes) tuples, in upload order
+        progress_callback: Optional callable(stage, current, total, filename);
+            filename is None for stages covering every file (overlap analysis)
+        mode: "full" (Claude pipeline) or "fast" (local scanner only, no
+            overlap analysis)
+
+    Returns:
+        API response dictionary (single-file or multi-file shape)
+    """
+    # Run each file's extraction -> analysis chain concurrently
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_FILES)
+    run_overlap = len(uploads) >= 2 and OVERLAP_AVAILABLE and mode == "full"
+
+    # With overlap analysis, results are only cached once it has succeeded
+    pending_stores = [] if run_overlap else None
+
+    async def run_file(idx, filename, content):
+        async with semaphore:
+            label = f"{idx+1}/{len(uploads)}"
+            if mode == "fast":
+                return await scan_single_file(filename, content, label)
+            return await process_single_file(filename, content, label, progress_callback, pending_stores)
+
+    # gather() keeps results in upload order
+    results = await asyncio.gather(*[
+        run_file(idx, filename, content)
+        for idx, (filename, content) in enumerate(uploads)
+    ])
+
+    # Step 3: Overlap analysis if multiple files
+    overlap_analysis = None
+    if run_overlap:
+        print(f"\n[Overlap] Analyzing overlap between {len(uploads)} SOWs...")
+        if progress_callback:
+            progress_callback("overlap_analysis", None, None)
+
+        sow_data_list = [
+            {
+                "filename": result["filename"],
+                "raw_text": result["raw_text"],
+                "extracted_data": result["extracted_data"]
+            }
+            for result in results
+        ]
+
+        overlap_analysis = await analyze_overlap_async(sow_data_list)
+        if overlap_analysis and overlap_analysis.get("error"):
+            print(f"[Overlap] [WARNING] Overlap analysis failed, not caching this run's results")
+        else:
+            print(f"[Overlap] [OK] Overlap analysis complete")
+            for content_hash, result in pending_stores:
+                await run_in_pool(store_result, content_hash, PIPELINE_VERSION, result)
+
+    # Return results based on number of files
+    if len(uploads) == 1:
+        # Single file - return as before (backward compatible)
+        result = results[0]
+        return {
+            "success": True,
+            "filename": result["filename"],
+            "contract_id": result["contract_id"],
+            "contractor": result["contractor"],
+            "summary": result["summary"],
+            "extracted_data": result["extracted_data"],
+            "analysis": result["analysis"],
+            "degraded": result.get("degraded", [])
+        }
+    else:
+        # Multiple files - return array with overlap analysis
+        # For frontend, we'll return the first file's analysis + overlap
+        # (Frontend will display first file's results + overlap tile/section)
+        return {
+            "success": True,
+            "multiple_files": True,
+            "file_count": len(uploads),
+            "filename": results[0]["filename"],  # Primary file
+            "contract_id": results[0]["contract_id"],
+            "contractor": results[0]["contractor"],
+            "summary": results[0]["summary"],
+            "extracted_data": results[0]["extracted_data"],
+            "analysis": results[0]["analysis"],
+            "overlap_analysis": overlap_analysis,
+            "all_results": results  # Include all results for future use
+        }
+
+
 @app.post("/api/analyze")
-async def analyze_sow_file(files: List[UploadFile] = File(...)):
+async def analyze_sow_file(files: List[UploadFile] = File(...), mode: str = "full"):
     """
     Analyze one or more SOW files
 
     Accepts: PDF, DOCX, or TXT files
+    Query: mode=full (default) or mode=fast (local red-flag scan, no API calls)
     Returns: Extraction data + Risk analysis + Overlap analysis (if multiple files)
     """
+    if mode not in ANALYSIS_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown mode '{mode}'. Allowed: {', '.join(ANALYSIS_MODES)}"
+        )
+
     # Handle both single and multiple files
     if not isinstance(files, list):
         files = [files]
 
-    allowed_extensions = ['.pdf', '.docx', '.txt']
-    temp_files = []
-    results = []
-
     try:
-        # Process each file
-        for idx, file in enumerate(files):
-            # Validate file type
-            file_ext = os.path.splitext(file.filename)[1].lower()
-
-            if file_ext not in allowed_extensions:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Unsupported file type '{file.filename}'. Allowed: {', '.join(allowed_extensions)}"
-                )
-
-            # Validate file size (10MB limit)
-            content = await file.read()
-            if len(content) > 10 * 1024 * 1024:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File '{file.filename}' too large. Maximum size: 10MB"
-                )
-
-            # Save uploaded file temporarily
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-                tmp.write(content)
-                tmp_path = tmp.name
-                temp_files.append(tmp_path)
-
-            # Step 1: Extract structured data
-            print(f"[{idx+1}/{len(files)}] Extracting data from {file.filename}...")
-            extracted_data = extract_from_file(tmp_path)
-
-            # Read raw text for overlap analysis
-            with open(tmp_path, 'r', encoding='utf-8', errors='ignore') as f:
-                raw_text = f.read() if file_ext == '.txt' else extracted_data.get('raw_text', '')
-
-            # Step 2: Analyze for risks using RAG (with fallback to basic analysis)
-            if RAG_AVAILABLE:
-                print(f"   Analyzing with RAG (searching vector database)...")
-                try:
-                    analysis = analyze_sow_with_rag(extracted_data)
-                    print(f"   [OK] RAG analysis complete")
-                except Exception as e:
-                    print(f"   [WARNING] RAG analysis error: {str(e)}")
-                    print(f"   Falling back to basic analysis...")
-                    analysis = analyze_sow(extracted_data)
-                    print(f"   [OK] Basic analysis complete")
-            else:
-                print(f"   Analyzing with basic analyzer...")
-                analysis = analyze_sow(extracted_data)
-                print(f"   [OK] Basic analysis complete")
-
-            # Calculate summary statistics
-            all_findings = []
-            for category in ['weak_kpis', 'scope_creep', 'missing_elements',
-                             'inconsistencies', 'deliverable_issues', 'red_flags']:
-                findings = analysis.get(category, [])
-                all_findings.extend(findings)
-
-            high_count = sum(1 for f in all_findings if f.get('severity') == 'HIGH')
-            medium_count = sum(1 for f in all_findings if f.get('severity') == 'MEDIUM')
-            low_count = sum(1 for f in all_findings if f.get('severity') == 'LOW')
-
-            # Store result for this file
-            results.append({
-                "filename": file.filename,
-                "contract_id": extracted_data.get("metadata", {}).get("contract_id"),
-                "contractor": extracted_data.get("metadata", {}).get("contractor"),
-                "summary": {
-                    "total_findings": len(all_findings),
-                    "high_severity": high_count,
-                    "medium_severity": medium_count,
-                    "low_severity": low_count,
-                    "tasks_found": len(extracted_data.get("tasks", [])),
-                    "kpis_found": len(extracted_data.get("kpis", [])),
-                    "deliverables_found": len(extracted_data.get("deliverables", []))
-                },
-                "extracted_data": extracted_data,
-                "analysis": analysis,
-                "raw_text": raw_text  # Store for overlap analysis
-            })
+        # Validate and read every upload before starting any analysis
+        uploads = []
+        for file in files:
+            content = await read_upload(file)
+            uploads.append((file.filename, content))
 
-        # Step 3: Overlap analysis if multiple files
-        overlap_analysis = None
-        if len(files) >= 2 and OVERLAP_AVAILABLE:
-            print(f"\n[Overlap] Analyzing overlap between {len(files)} SOWs...")
-
-            sow_data_list = [
-                {
-                    "filename": result["filename"],
-                    "raw_text": result["raw_text"],
-                    "extracted_data": result["extracted_data"]
-                }
-                for result in results
-            ]
-
-            overlap_analysis = analyze_overlap(sow_data_list)
-            print(f"[Overlap] [OK] Overlap analysis complete")
-
-        # Clean up temp files
-        for tmp_path in temp_files:
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
-
-        # Return results based on number of files
-        if len(files) == 1:
-            # Single file - return as before (backward compatible)
-            result = results[0]
-            return {
-                "success": True,
-                "filename": result["filename"],
-                "contract_id": result["contract_id"],
-                "contractor": result["contractor"],
-                "summary": result["summary"],
-                "extracted_data": result["extracted_data"],
-                "analysis": result["analysis"]
-            }
-        else:
-            # Multiple files - return array with overlap analysis
-            # For frontend, we'll return the first file's analysis + overlap
-            # (Frontend will display first file's results + overlap tile/section)
-            return {
-                "success": True,
-                "multiple_files": True,
-                "file_count": len(files),
-                "filename": results[0]["filename"],  # Primary file
-                "contract_id": results[0]["contract_id"],
-                "contractor": results[0]["contractor"],
-                "summary": results[0]["summary"],
-                "extracted_data": results[0]["extracted_data"],
-                "analysis": results[0]["analysis"],
-                "overlap_analysis": overlap_analysis,
-                "all_results": results  # Include all results for future use
-            }
+        return await run_analysis(uploads, mode=mode)
 
     except Exception as e:
-        # Clean up temp files if they exist
-        for tmp_path in temp_files:
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
-
         # Print full error traceback for debugging
         import traceback
         print(f"\n{'='*70}")
@@ -243,6 +542,362 @@ async def analyze_sow_file(files: List[UploadFile] = File(...)):
         )
 
 
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def finding_event(category: str, finding: dict) -> str:
+    """
+    SSE 'finding' event
+
+    RAG findings stream in as validation requests finish, not in document
+    order; chunk_id (None for basic-analysis findings) lets the client
+    put them back in order.
+    """
+    chunk_id = finding.get("source", {}).get("chunk_id")
+    return sse_event("finding", {"category": category, "finding": finding, "chunk_id": chunk_id})
+
+
+def stream_metadata(filename: str, extracted_data: dict) -> dict:
+    """Payload of the SSE 'metadata' event"""
+    metadata = extracted_data.get("metadata", {})
+    return {
+        "filename": filename,
+        "contract_id": metadata.get("contract_id"),
+        "contractor": metadata.get("contractor"),
+        "metadata": metadata,
+        "tasks_found": len(extracted_data.get("tasks", [])),
+        "kpis_found": len(extracted_data.get("kpis", [])),
+        "deliverables_found": len(extracted_data.get("deliverables", []))
+    }
+
+
+@app.post("/api/analyze/stream")
+async def analyze_sow_file_stream(file: UploadFile = File(...)):
+    """
+    Analyze a single SOW file and stream results as Server-Sent Events
+
+    Events, in order:
+        metadata - extraction metadata and counts (sent once extraction is done)
+        finding  - {"category", "finding", "chunk_id"} for each finding as it
+                   is confirmed (RAG findings arrive out of document order)
+        fallback - RAG failed; findings sent so far should be discarded and
+                   basic-analysis findings follow
+        summary  - same counts as the "summary" field of /api/analyze
+        error    - the analysis failed
+    """
+    content = await read_upload(file)
+    filename = file.filename
+
+    async def event_stream():
+        try:
+            # Replay a cached result without calling the pipeline
+            if RESULT_CACHE_ENABLED:
+                content_hash = await run_in_pool(hash_content, content)
+                cached = await run_in_pool(get_cached_result, content_hash, PIPELINE_VERSION)
+                if cached is not None:
+                    print(f"[Stream] [OK] Result cache hit for {filename}")
+                    yield sse_event("metadata", stream_metadata(filename, cached["extracted_data"]))
+                    for category in FINDING_CATEGORIES:
+                        for finding in cached["analysis"].get(category, []):
+                            yield finding_event(category, finding)
+                    yield sse_event("summary", cached["summary"])
+                    return
+
+            print(f"[Stream] Extracting data from {filename}...")
+            extracted_data = await extract_from_bytes_async(content, filename)
+            yield sse_event("metadata", stream_metadata(filename, extracted_data))
+
+            analysis = {category: [] for category in FINDING_CATEGORIES}
+            use_basic = not RAG_AVAILABLE
+            fell_back = False
+            rag_stats = {}
+
+            if RAG_AVAILABLE:
+                try:
+                    async for category, finding in iter_rag_findings_async(extracted_data, stats=rag_stats):
+                        analysis[category].append(finding)
+                        yield finding_event(category, finding)
+                except Exception as e:
+                    print(f"[Stream] [WARNING] RAG analysis error: {str(e)}")
+                    yield sse_event("fallback", {"reason": str(e)})
+                    use_basic = True
+                    fell_back = True
+
+            if use_basic:
+                analysis = await analyze_sow_async(extracted_data)
+                for category in FINDING_CATEGORIES:
+                    for finding in analysis.get(category, []):
+                        yield finding_event(category, finding)
+
+            if not use_basic:
+                # Cache (and replay) the findings in document order
+                for category in FINDING_CATEGORIES:
+                    analysis[category].sort(key=lambda finding: finding['source']['chunk_id'])
+                if rag_stats.get("validation_errors"):
+                    analysis["validation_errors"] = rag_stats["validation_errors"]
+
+            summary = build_summary(extracted_data, analysis)
+            yield sse_event("summary", summary)
+
+            # Same rule as /api/analyze: don't cache degraded results
+            analysis_mode = "fallback" if fell_back else ("basic" if use_basic else "rag")
+            degraded = degraded_reasons(extracted_data, analysis, analysis_mode)
+            if degraded:
+                print(f"[Stream] [WARNING] Result degraded ({', '.join(degraded)}), not caching")
+            elif RESULT_CACHE_ENABLED:
+                metadata = extracted_data.get("metadata", {})
+                await run_in_pool(store_result, content_hash, PIPELINE_VERSION, {
+                    "filename": filename,
+                    "contract_id": metadata.get("contract_id"),
+                    "contractor": metadata.get("contractor"),
+                    "summary": summary,
+                    "extracted_data": extracted_data,
+                    "analysis": analysis,
+                    "raw_text": extracted_data.get("raw_text", ""),
+                    "degraded": degraded
+                })
+
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield sse_event("error", {"detail": f"Analysis failed: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/metrics")
+async def llm_metrics():
+    """Claude call counts, token usage, latency percentiles, cache hit rates and gate savings"""
+    metrics = get_gateway_metrics()
+    metrics["llm_cache"] = await run_in_pool(get_llm_cache_stats)
+    if RAG_AVAILABLE:
+        metrics["rag_gate"] = get_gate_stats()
+        metrics["embedding_cache"] = await run_in_pool(get_embedding_cache_stats)
+    return metrics
+
+
+@app.get("/api/cache")
+async def result_cache_stats():
+    """Report result cache size and the current pipeline version"""
+    stats = await run_in_pool(get_cache_stats)
+    stats["enabled"] = RESULT_CACHE_ENABLED
+    stats["pipeline_version"] = PIPELINE_VERSION
+    stats["llm_cache"] = await run_in_pool(get_llm_cache_stats)
+    if RAG_AVAILABLE:
+        stats["embedding_cache"] = await run_in_pool(get_embedding_cache_stats)
+    return stats
+
+
+@app.delete("/api/cache")
+async def clear_result_cache(include_llm: bool = False, include_embeddings: bool = False):
+    """
+    Remove every cached analysis result
+
+    Cached Claude responses are also removed if include_llm, and cached
+    chunk embeddings if include_embeddings.
+    """
+    removed = await run_in_pool(invalidate)
+    response = {"success": True, "removed": removed}
+    if include_llm:
+        response["llm_removed"] = await run_in_pool(clear_llm_cache)
+    if include_embeddings:
+        response["embeddings_removed"] = await run_in_pool(clear_embedding_cache)
+    return response
+
+
+@app.delete("/api/cache/{content_hash}")
+async def invalidate_cached_file(content_hash: str):
+    """Remove cached results for one file (SHA-256 of its bytes, e.g. from sha256sum)"""
+    content_hash = content_hash.lower()
+    if not re.fullmatch(r"[0-9a-f]{64}", content_hash):
+        raise HTTPException(status_code=400, detail="content_hash must be a SHA-256 hex digest")
+
+    removed = await run_in_pool(invalidate, content_hash)
+    return {"success": True, "removed": removed}
+
+
+@app.post("/api/jobs", status_code=202)
+async def create_analysis_job(files: List[UploadFile] = File(...)):
+    """
+    Queue one or more SOW files for background analysis
+
+    Returns immediately with a job id; poll GET /api/jobs/{job_id} for
+    progress and the final result (same shape as /api/analyze).
+    """
+    if not isinstance(files, list):
+        files = [files]
+
+    uploads = []
+    for file in files:
+        content = await read_upload(file)
+        uploads.append((file.filename, content))
+
+    job_id = await run_in_pool(create_job, uploads)
+    print(f"[Jobs] Queued job {job_id} ({len(uploads)} file(s))")
+
+    return {
+        "success": True,
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/jobs/{job_id}"
+    }
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    """
+    Report a job's status, current stage and chunk progress
+
+    The analysis result is included once status is 'completed'.
+    """
+    job = await run_in_pool(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+
+class JobProgress:
+    """
+    Progress callback for a background job
+
+    Keeps the latest stage and chunk counts of every file and combines
+    them into one stage string and one chunk total, so concurrent files
+    don't overwrite each other's progress. Database writes run on the CPU
+    pool, one at a time; ticks that arrive while a write is in flight are
+    coalesced into the next write, so the event loop never waits on SQLite.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.files = {}
+        self.stage = None
+        self._dirty = False
+        self._task = None
+
+    def __call__(self, stage, current=None, total=None, filename=None):
+        if filename is None:
+            self.stage = stage
+        else:
+            self.stage = None
+            self.files[filename] = (stage, current, total)
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush())
+
+    def snapshot(self) -> tuple:
+        """(stage, current, total) covering every file"""
+        if self.stage is not None:
+            stage = self.stage
+        elif len(self.files) == 1:
+            file_stage, _, _ = next(iter(self.files.values()))
+            stage = f"{file_stage} ({next(iter(self.files))})"
+        else:
+            stage = "; ".join(f"{file_stage} ({filename})" for filename, (file_stage, _, _) in self.files.items())
+
+        counted = [(current, total) for _, current, total in self.files.values() if total]
+        if not counted:
+            return stage, None, None
+        return stage, sum(current or 0 for current, _ in counted), sum(total for _, total in counted)
+
+    async def _flush(self):
+        while self._dirty:
+            self._dirty = False
+            try:
+                await run_in_pool(update_progress, self.job_id, *self.snapshot())
+            except Exception as e:
+                print(f"[Jobs] [WARNING] Progress update failed for {self.job_id}: {e}")
+
+    async def drain(self):
+        """Wait for the last progress write"""
+        if self._task is not None:
+            await self._task
+
+    def cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+async def keep_job_lease(job_id: str):
+    """Renew this process's lease on a running job until cancelled"""
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            if not await run_in_pool(renew_lease, job_id, JOB_OWNER_ID):
+                print(f"[Jobs] [WARNING] Lost the lease on job {job_id}; its result will not be saved")
+                return
+        except Exception as e:
+            print(f"[Jobs] [WARNING] Lease renewal failed for {job_id}: {e}")
+
+
+async def run_job(job_id: str):
+    """Run one claimed job through the analysis pipeline and store the outcome"""
+    progress = JobProgress(job_id)
+    lease = asyncio.create_task(keep_job_lease(job_id))
+    try:
+        uploads = await run_in_pool(get_job_files, job_id)
+
+        response = await run_analysis(uploads, progress_callback=progress)
+        await progress.drain()
+        if await run_in_pool(complete_job, job_id, response, JOB_OWNER_ID):
+            print(f"[Jobs] [OK] Job {job_id} completed")
+        else:
+            print(f"[Jobs] [WARNING] Job {job_id} finished after its lease expired; result discarded")
+
+    except asyncio.CancelledError:
+        # Shutting down - hand the job back so another process (or the restart) picks it up
+        progress.cancel()
+        try:
+            await run_in_pool(release_job, job_id, JOB_OWNER_ID)
+        except Exception as e:
+            print(f"[Jobs] [WARNING] Could not release job {job_id} ({e}); it is requeued once its lease expires")
+        raise
+
+    except Exception as e:
+        import traceback
+        print(f"[Jobs] [ERROR] Job {job_id} failed")
+        traceback.print_exc()
+        await progress.drain()
+        await run_in_pool(fail_job, job_id, str(e), JOB_OWNER_ID)
+
+    finally:
+        lease.cancel()
+
+
+async def job_worker(worker_id: int):
+    """
+    Poll the job queue and run jobs one at a time
+
+    Queue errors (e.g. "database is locked") are logged and retried with
+    exponential backoff, so one failure never stops the worker.
+    """
+    print(f"[Jobs] Worker {worker_id} started")
+    failures = 0
+    while True:
+        try:
+            job_id = await run_in_pool(claim_next_job, JOB_OWNER_ID)
+            if job_id is None:
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+            else:
+                print(f"[Jobs] Worker {worker_id} picked up job {job_id}")
+                await run_job(job_id)
+            failures = 0
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as e:
+            failures += 1
+            delay = min(JOB_ERROR_BACKOFF_MAX, JOB_POLL_INTERVAL * 2 ** failures)
+            print(f"[Jobs] [ERROR] Worker {worker_id}: {type(e).__name__}: {e} - retrying in {delay:.0f}s")
+            await asyncio.sleep(delay)
+
+
 @app.post("/api/analyze-batch")
 async def analyze_multiple_sows(files: List[UploadFile] = File(...)):
     """
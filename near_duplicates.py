@@ -0,0 +1,101 @@
+"""
+Near-duplicate detection for SOW chunks (MinHash + LSH)
+
+SOWs repeat boilerplate: standard clauses, the same reporting requirement
+under every task, text copied between task sections. Chunks whose word
+shingles overlap by at least a Jaccard threshold are clustered, so only
+one representative per cluster needs retrieval and validation.
+"""
+import os
+import re
+import hashlib
+from typing import List
+
+import numpy as np
+
+RAG_DEDUP_ENABLED = os.getenv("RAG_DEDUP_ENABLED", "true").lower() == "true"
+RAG_DEDUP_THRESHOLD = float(os.getenv("RAG_DEDUP_THRESHOLD", 0.8))  # Jaccard similarity
+
+# Words per shingle
+SHINGLE_SIZE = 5
+
+# 64 hash functions split into 16 LSH bands of 4 rows: pairs with Jaccard
+# above ~0.5 almost always share a band; candidates are then checked
+# against the threshold using the full signature
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+
+# Universal hashing (a * x + b) mod p over 32-bit shingle hashes, which
+# stays inside uint64 because a < 2^31
+_PRIME = (1 << 32) - 5
+_rng = np.random.RandomState(20240501)
+_A = _rng.randint(1, 1 << 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+_B = _rng.randint(0, _PRIME, size=NUM_PERMUTATIONS).astype(np.uint64)
+
+
+def shingles(text: str) -> set:
+    """Set of SHINGLE_SIZE-word shingles of the normalized text"""
+    words = re.findall(r'\w+', text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {' '.join(words)}
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERMUTATIONS values) of a text's shingles"""
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little') % _PRIME
+         for s in shingles(text)],
+        dtype=np.uint64
+    )
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0)
+
+
+def find_near_duplicates(texts: List[str], threshold: float = RAG_DEDUP_THRESHOLD) -> List[int]:
+    """
+    Cluster near-identical texts
+
+    Texts are visited in document order. Each one joins the cluster of the
+    earlier representative it is most similar to (at least threshold), or
+    starts a new cluster. Members are only ever compared with the
+    representative, never chained through each other, so every member is
+    near-identical to the chunk whose verdict it reuses.
+
+    Args:
+        texts: Chunk texts in document order
+        threshold: Minimum estimated Jaccard similarity of word shingles
+
+    Returns:
+        For each text, the index of its cluster representative (the first
+        member in document order; a text that has no duplicates maps to itself)
+    """
+    if len(texts) < 2:
+        return list(range(len(texts)))
+
+    signatures = np.vstack([minhash_signature(text) for text in texts])
+    rows = NUM_PERMUTATIONS // LSH_BANDS
+
+    # Earlier texts sharing at least one LSH band with each text
+    candidates = [set() for _ in texts]
+    for band in range(LSH_BANDS):
+        buckets = {}
+        for i, band_values in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+            buckets.setdefault(band_values.tobytes(), []).append(i)
+
+        for members in buckets.values():
+            for x, i in enumerate(members):
+                candidates[i].update(members[:x])
+
+    representative = list(range(len(texts)))
+    for i in range(len(texts)):
+        best, best_similarity = i, threshold
+        # Earliest representative wins ties
+        for j in sorted(candidates[i]):
+            if representative[j] != j:
+                continue
+            similarity = np.mean(signatures[i] == signatures[j])
+            if similarity > best_similarity or (best == i and similarity >= threshold):
+                best, best_similarity = j, similarity
+        representative[i] = best
+
+    return representative
@@ -5,14 +5,12 @@ import os
 import json
 import re
 from typing import List, Dict, Optional
-from anthropic import Anthropic
 from dotenv import load_dotenv
+from llm_gateway import complete, complete_async, DEFAULT_MODEL
+from structured_output import make_tool
 
 load_dotenv()
 
-# Initialize Anthropic client
-client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-
 OVERLAP_PROMPT = """You are analyzing multiple government contract Statements of Work (SOWs) for overlapping/redundant work.
 
 <SOW_1_METADATA>
@@ -52,6 +50,23 @@ If there is minimal or no overlap (< 15%), set overlap_percentage to the actual
 """
 
 
+# Schema of the overlap answer (structured output via tool use)
+OVERLAP_TOOL = make_tool(
+    "record_overlap",
+    "Record the overlap between the two SOWs.",
+    {
+        "type": "object",
+        "properties": {
+            "overlap_percentage": {"type": "number"},
+            "explanation": {"type": "string"},
+            "overlapping_areas": {"type": "array", "items": {"type": "string"}},
+            "confidence": {"type": "string", "enum": ["HIGH", "MEDIUM", "LOW"]}
+        },
+        "required": ["overlap_percentage", "explanation", "overlapping_areas", "confidence"]
+    }
+)
+
+
 def extract_budget_from_text(text: str) -> Optional[float]:
     """
     Extract budget/contract value from SOW text using regex patterns
@@ -108,79 +123,133 @@ def analyze_overlap(sow_data_list: List[Dict]) -> Dict:
 
     print(f"\n[Overlap] Analyzing overlap between {sow1['filename']} and {sow2['filename']}...")
 
-    # Prepare prompt
-    prompt = OVERLAP_PROMPT.format(
-        filename_1=sow1['filename'],
-        sow_text_1=sow1['raw_text'][:15000],  # Limit to avoid token limits
-        filename_2=sow2['filename'],
-        sow_text_2=sow2['raw_text'][:15000]
-    )
+    prompt = build_overlap_prompt(sow1, sow2)
 
     try:
         # Call Claude for overlap analysis
-        message = client.messages.create(
-            model="claude-3-haiku-20240307",
+        return complete(
+            prompt,
+            model=DEFAULT_MODEL,
             max_tokens=2048,
             temperature=0,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
+            purpose="overlap",
+            parse=lambda response_text: build_overlap_result(response_text, sow1, sow2),
+            tool=OVERLAP_TOOL
         )
 
-        response_text = message.content[0].text
+    except Exception as e:
+        print(f"[WARNING] Overlap analysis error: {e}")
+        return overlap_error_result(e)
 
-        # Extract JSON
-        json_start = response_text.find('{')
-        json_end = response_text.rfind('}') + 1
-        if json_start != -1 and json_end > json_start:
-            json_text = response_text[json_start:json_end]
-        else:
-            json_text = response_text
 
-        overlap_result = json.loads(json_text)
+async def analyze_overlap_async(sow_data_list: List[Dict]) -> Dict:
+    """
+    Async version of analyze_overlap (does not block the event loop)
 
-        # Extract budgets from both SOWs
-        budget_1 = extract_budget_from_text(sow1['raw_text'])
-        budget_2 = extract_budget_from_text(sow2['raw_text'])
+    Args:
+        sow_data_list: Same as analyze_overlap
 
-        # Calculate redundant spend (use higher budget)
-        max_budget = None
-        if budget_1 and budget_2:
-            max_budget = max(budget_1, budget_2)
-        elif budget_1:
-            max_budget = budget_1
-        elif budget_2:
-            max_budget = budget_2
+    Returns:
+        Dictionary with overlap analysis results
+    """
+    if len(sow_data_list) < 2:
+        return None
 
-        redundant_spend = None
-        if max_budget:
-            overlap_pct = overlap_result.get('overlap_percentage', 0) / 100
-            redundant_spend = max_budget * overlap_pct
+    sow1 = sow_data_list[0]
+    sow2 = sow_data_list[1]
 
-        # Add calculated fields
-        overlap_result['sow_1_filename'] = sow1['filename']
-        overlap_result['sow_2_filename'] = sow2['filename']
-        overlap_result['budget_1'] = budget_1
-        overlap_result['budget_2'] = budget_2
-        overlap_result['max_budget'] = max_budget
-        overlap_result['redundant_spend'] = redundant_spend
+    print(f"\n[Overlap] Analyzing overlap between {sow1['filename']} and {sow2['filename']}...")
 
-        print(f"[OK] Overlap analysis complete: {overlap_result['overlap_percentage']}% overlap")
+    prompt = build_overlap_prompt(sow1, sow2)
 
-        return overlap_result
+    try:
+        return await complete_async(
+            prompt,
+            model=DEFAULT_MODEL,
+            max_tokens=2048,
+            temperature=0,
+            purpose="overlap",
+            parse=lambda response_text: build_overlap_result(response_text, sow1, sow2),
+            tool=OVERLAP_TOOL
+        )
 
     except Exception as e:
         print(f"[WARNING] Overlap analysis error: {e}")
-        return {
-            "overlap_percentage": 0,
-            "explanation": f"Error during overlap analysis: {str(e)}",
-            "overlapping_areas": [],
-            "confidence": "LOW",
-            "error": str(e)
-        }
+        return overlap_error_result(e)
+
+
+def build_overlap_prompt(sow1: Dict, sow2: Dict) -> str:
+    """Fill OVERLAP_PROMPT with the two SOWs being compared"""
+    return OVERLAP_PROMPT.format(
+        filename_1=sow1['filename'],
+        sow_text_1=sow1['raw_text'][:15000],  # Limit to avoid token limits
+        filename_2=sow2['filename'],
+        sow_text_2=sow2['raw_text'][:15000]
+    )
+
+
+def build_overlap_result(response_text: str, sow1: Dict, sow2: Dict) -> Dict:
+    """
+    Parse Claude's overlap response and add budget/redundant spend fields
+
+    Args:
+        response_text: Raw text returned by Claude
+        sow1: First SOW (filename + raw_text)
+        sow2: Second SOW (filename + raw_text)
+
+    Returns:
+        Dictionary with overlap analysis results
+    """
+    # Extract JSON
+    json_start = response_text.find('{')
+    json_end = response_text.rfind('}') + 1
+    if json_start != -1 and json_end > json_start:
+        json_text = response_text[json_start:json_end]
+    else:
+        json_text = response_text
+
+    overlap_result = json.loads(json_text)
+
+    # Extract budgets from both SOWs
+    budget_1 = extract_budget_from_text(sow1['raw_text'])
+    budget_2 = extract_budget_from_text(sow2['raw_text'])
+
+    # Calculate redundant spend (use higher budget)
+    max_budget = None
+    if budget_1 and budget_2:
+        max_budget = max(budget_1, budget_2)
+    elif budget_1:
+        max_budget = budget_1
+    elif budget_2:
+        max_budget = budget_2
+
+    redundant_spend = None
+    if max_budget:
+        overlap_pct = overlap_result.get('overlap_percentage', 0) / 100
+        redundant_spend = max_budget * overlap_pct
+
+    # Add calculated fields
+    overlap_result['sow_1_filename'] = sow1['filename']
+    overlap_result['sow_2_filename'] = sow2['filename']
+    overlap_result['budget_1'] = budget_1
+    overlap_result['budget_2'] = budget_2
+    overlap_result['max_budget'] = max_budget
+    overlap_result['redundant_spend'] = redundant_spend
+
+    print(f"[OK] Overlap analysis complete: {overlap_result['overlap_percentage']}% overlap")
+
+    return overlap_result
+
+
+def overlap_error_result(error: Exception) -> Dict:
+    """Fallback overlap result returned when the analysis fails"""
+    return {
+        "overlap_percentage": 0,
+        "explanation": f"Error during overlap analysis: {str(error)}",
+        "overlapping_areas": [],
+        "confidence": "LOW",
+        "error": str(error)
+    }
 
 
 if __name__ == "__main__":
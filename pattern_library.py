@@ -0,0 +1,64 @@
+"""
+The annotated pattern library as reference text for Claude prompts
+
+annotated_examples.json is embedded into the vector DB for retrieval
+(vector_db_setup.py), and the same examples are also rendered once into a
+compact reference block that the validation and risk analysis prompts
+carry in their system prefix. It shows Claude what the problematic
+language looked like in real contracts next to its corrected version,
+and since it only changes when the library does, it makes those prefixes
+long enough to be prompt-cached.
+
+Only the standard library is used, so this works without the RAG
+dependencies.
+"""
+import os
+import json
+from typing import List, Dict
+
+PATTERN_LIBRARY_FILE = "annotated_examples.json"
+
+
+def load_pattern_library(path: str = PATTERN_LIBRARY_FILE) -> List[Dict]:
+    """Annotated examples ([] if the file is missing or invalid)"""
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('examples', [])
+    except (json.JSONDecodeError, AttributeError) as e:
+        print(f"[WARNING] Could not read {path}: {e}")
+        return []
+
+
+def format_library_guidance(examples: List[Dict]) -> str:
+    """
+    Reference block listing each example's problem and corrected version
+
+    Args:
+        examples: Annotated examples from load_pattern_library
+
+    Returns:
+        Text for a system prompt ("" if there are no examples)
+    """
+    if not examples:
+        return ""
+
+    lines = [
+        "REFERENCE - ANNOTATED PATTERN LIBRARY",
+        "Language from real government contracts that caused overruns, with how it should have been written.",
+        "Use it to calibrate what counts as unbounded versus properly qualified language.",
+        ""
+    ]
+    for i, example in enumerate(examples, 1):
+        lines.append(f"{i}. [{example.get('issue_type', 'unknown')}, {example.get('severity', 'UNKNOWN')}] "
+                     f"{example.get('contract_source', '')}")
+        lines.append(f"   Problematic: {example.get('problematic_section', '')}")
+        lines.append(f"   Why: {example.get('explanation', '')}")
+        lines.append(f"   Corrected: {example.get('correct_version', '')}")
+    return "\n".join(lines) + "\n\n"
+
+
+# Rendered once at import; prompt versions (main.PROMPT_VERSION) hash the
+# prompts that include it, so editing the library invalidates cached results
+LIBRARY_GUIDANCE = format_library_guidance(load_pattern_library())
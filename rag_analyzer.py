@@ -4,46 +4,140 @@ Combines vector database retrieval with Claude validation
 """
 import os
 import json
-from typing import List, Dict
-from anthropic import Anthropic
+import asyncio
+import weakref
+import threading
+from typing import List, Dict, Optional, Callable, AsyncIterator, Tuple
 from dotenv import load_dotenv
-from vector_db_setup import search_similar_patterns, initialize_vector_db
+from llm_gateway import complete, complete_async, estimate_tokens, DEFAULT_MODEL, LLM_STRUCTURED_OUTPUT
+from llm_cache import is_cacheable, get_cached_response, store_response
+from vector_db_setup import search_similar_patterns_batch, warm_up
+from cpu_pool import run_in_pool
+from chunker import (
+    chunk_document, format_location, RAG_CHUNK_OVERLAP, RAG_MIN_CHUNK_WORDS, CHUNKER_RULES_VERSION
+)
+from near_duplicates import find_near_duplicates, RAG_DEDUP_ENABLED, RAG_DEDUP_THRESHOLD
+from red_flag_scanner import find_phrases
+from structured_output import make_tool
+from pattern_library import LIBRARY_GUIDANCE
 
 load_dotenv()
 
-# Initialize Anthropic client
-client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# Validation requests in flight at once (the gateway still enforces the global rate limit)
+RAG_CHUNK_CONCURRENCY = max(1, int(os.getenv("RAG_CHUNK_CONCURRENCY", 5)))
+
+# Retrieval requests arriving within this window (e.g. from the other files
+# of a multi-file upload) are merged into one batched embed + query
+RETRIEVAL_BATCH_WINDOW = float(os.getenv("RETRIEVAL_BATCH_WINDOW_MS", 20)) / 1000
+
+# Similarity gate: chunks whose best match scores below the floor never reach
+# Claude, and patterns scoring below best * cutoff are left out of the prompt
+RAG_MIN_SIMILARITY = float(os.getenv("RAG_MIN_SIMILARITY", 0.3))
+RAG_RELATIVE_CUTOFF = float(os.getenv("RAG_RELATIVE_CUTOFF", 0.85))
+
+# Scanner pre-pass: chunks containing known scope-creep phrases are always
+# validated, even when no stored pattern clears the similarity floor
+RAG_PREPASS_ENABLED = os.getenv("RAG_PREPASS_ENABLED", "true").lower() == "true"
+
+# Batched validation: several chunks (each with its own patterns) share one
+# request, packed until the estimated prompt size reaches the token budget
+RAG_BATCH_VALIDATION = os.getenv("RAG_BATCH_VALIDATION", "true").lower() == "true"
+RAG_BATCH_TOKEN_BUDGET = int(os.getenv("RAG_BATCH_TOKEN_BUDGET", 6000))
+RAG_BATCH_MAX_CHUNKS = max(1, int(os.getenv("RAG_BATCH_MAX_CHUNKS", 8)))
+
+# Output tokens reserved per verdict in a batched response
+BATCH_VERDICT_TOKENS = 400
+
+_gate_lock = threading.Lock()
+_gate_stats = {
+    "chunks_checked": 0,
+    "calls_saved": 0,
+    "patterns_dropped": 0,
+    "tokens_saved": 0,
+    "duplicate_chunks": 0,
+    "duplicate_validations_avoided": 0,
+    "prepass_forced": 0,
+    "cached_verdicts": 0
+}
+
+
+class RetrievalBatcher:
+    """
+    Coalesces concurrent retrieval requests into one batched vector search
+
+    Each analysis submits all of its chunks at once; requests that arrive
+    within RETRIEVAL_BATCH_WINDOW of each other share a single encode call
+    and a single multi-vector collection query.
+    """
 
-# Initialize vector DB on module load
-print("Initializing vector database...")
-try:
-    initialize_vector_db()  # No parameters needed
-    print("[OK] Vector database ready")
-except Exception as e:
-    print(f"[WARNING] Warning: Vector DB initialization failed: {e}")
-    print(f"   Run 'python vector_db_setup.py' to create the database")
-    print(f"   RAG analysis will fall back to basic analysis")
+    def __init__(self, window: float):
+        self.window = window
+        self.pending = []
+        self.flush_task = None
+
+    async def search(self, texts: List[str], n_results: int) -> List[List[Dict]]:
+        """Return one list of matches per text, in order"""
+        if not texts:
+            return []
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((texts, n_results, future))
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self._flush_after_window())
+        return await future
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.window)
+        pending, self.pending, self.flush_task = self.pending, [], None
+
+        # One search per distinct n_results (normally just one)
+        by_n_results = {}
+        for texts, n_results, future in pending:
+            by_n_results.setdefault(n_results, []).append((texts, future))
+
+        for n_results, requests in by_n_results.items():
+            all_texts = [text for texts, _ in requests for text in texts]
+            try:
+                results = await run_in_pool(search_similar_patterns_batch, all_texts, n_results)
+            except Exception as e:
+                for _, future in requests:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            offset = 0
+            for texts, future in requests:
+                if not future.done():
+                    future.set_result(results[offset:offset + len(texts)])
+                offset += len(texts)
+
+
+# One batcher per event loop (futures belong to a loop)
+_retrieval_batchers = weakref.WeakKeyDictionary()
+
+
+async def retrieve_similar_patterns(texts: List[str], n_results: int) -> List[List[Dict]]:
+    """Batched retrieval for a list of chunks, shared with concurrent analyses"""
+    loop = asyncio.get_running_loop()
+    batcher = _retrieval_batchers.get(loop)
+    if batcher is None:
+        batcher = RetrievalBatcher(RETRIEVAL_BATCH_WINDOW)
+        _retrieval_batchers[loop] = batcher
+    return await batcher.search(texts, n_results)
 
 
 def chunk_text(text: str, chunk_size: int = 500) -> List[str]:
     """
-    Split text into chunks of approximately chunk_size words
+    Split text into sentence-aligned chunks of at most chunk_size words
 
     Args:
         text: Full text to chunk
-        chunk_size: Approximate number of words per chunk
+        chunk_size: Maximum number of words per chunk
 
     Returns:
-        List of text chunks
+        List of text chunks (see chunker.chunk_document for offsets and pages)
     """
-    words = text.split()
-    chunks = []
-
-    for i in range(0, len(words), chunk_size):
-        chunk = ' '.join(words[i:i + chunk_size])
-        chunks.append(chunk)
-
-    return chunks
+    return [chunk['text'] for chunk in chunk_document(text, chunk_size=chunk_size)]
 
 
 def extract_full_text_from_sow(extracted_data: dict) -> str:
@@ -88,21 +182,10 @@ def extract_full_text_from_sow(extracted_data: dict) -> str:
     return '\n\n'.join(text_parts)
 
 
-VALIDATION_PROMPT = """You are an experienced government contract auditor analyzing an uploaded SOW for problematic language patterns.
-
-You have been provided with similar problematic patterns from REAL government contracts that caused significant cost overruns.
-
-<uploaded_sow_section>
-{sow_section}
-</uploaded_sow_section>
-
-<similar_patterns_from_real_contracts>
-{similar_patterns}
-</similar_patterns_from_real_contracts>
-
-Your task is to determine if the uploaded SOW section contains the SAME TYPE of issue as the real examples.
-
-IMPORTANT - Only flag as an issue if BOTH conditions are true:
+# Judging criteria shared by the single-chunk and batched validation prompts
+# (both also carry the pattern library reference, which keeps their system
+# prefix above the prompt caching minimum)
+VALIDATION_RULES = """IMPORTANT - Only flag as an issue if BOTH conditions are true:
 1. The uploaded SOW uses similar language to the problematic examples (e.g., "full range", "all resources", "ample time", "best efforts", "periodically")
 2. AND the language is unbounded/vague WITHOUT proper qualification
 
@@ -118,32 +201,115 @@ Examples:
 - "ample time" ← FLAG (no minimum time specified)
 - "minimum 10 business days notice" ← DO NOT FLAG (specific)
 
-Return ONLY valid JSON (no additional text):
+"""
 
-{{
+VALIDATION_PROMPT = """You are an experienced government contract auditor analyzing an uploaded SOW for problematic language patterns.
+
+The user message contains a section of the uploaded SOW and similar problematic patterns from REAL government contracts that caused significant cost overruns.
+
+Your task is to determine if the uploaded SOW section contains the SAME TYPE of issue as the real examples.
+
+""" + VALIDATION_RULES + LIBRARY_GUIDANCE + """Return ONLY valid JSON (no additional text):
+
+{
   "has_issue": true or false,
   "issue_type": "weak_kpi|scope_creep|missing_element|red_flag|etc",
   "severity": "HIGH|MEDIUM|LOW",
   "explanation": "1-2 sentence explanation of how this mirrors the real example",
   "problematic_text": "exact quote from uploaded SOW",
   "location": "section reference if available",
-  "matched_example": {{
+  "matched_example": {
     "contract_source": "string",
     "similarity_score": 0.0-1.0,
     "actual_outcome": "string",
     "estimated_cost": "string"
-  }},
+  },
   "remediation": "Specific suggestion for how to fix this (1-2 sentences)"
-}}
+}
+
+If the uploaded SOW section does NOT have the same issue, return: {"has_issue": false}
+"""
+
+# Variable part of a validation request (VALIDATION_PROMPT is sent as a
+# prompt-cached system prefix)
+VALIDATION_INPUT = """<uploaded_sow_section>
+{sow_section}
+</uploaded_sow_section>
+
+<similar_patterns_from_real_contracts>
+{similar_patterns}
+</similar_patterns_from_real_contracts>"""
+
+VALIDATION_BATCH_PROMPT = """You are an experienced government contract auditor analyzing an uploaded SOW for problematic language patterns.
+
+The user message contains several sections of the uploaded SOW. Each section comes with similar problematic patterns from REAL government contracts that caused significant cost overruns.
+
+For EACH section, determine if it contains the SAME TYPE of issue as its own real examples. Judge every section independently.
 
-If the uploaded SOW section does NOT have the same issue, return: {{"has_issue": false}}
+""" + VALIDATION_RULES + LIBRARY_GUIDANCE + """Return ONLY a valid JSON array (no additional text) with exactly one verdict per section, using the section's id as chunk_id:
+
+[
+  {
+    "chunk_id": 1,
+    "has_issue": true or false,
+    "issue_type": "weak_kpi|scope_creep|missing_element|red_flag|etc",
+    "severity": "HIGH|MEDIUM|LOW",
+    "explanation": "1-2 sentence explanation of how this mirrors the real example",
+    "problematic_text": "exact quote from that SOW section",
+    "location": "section reference if available",
+    "remediation": "Specific suggestion for how to fix this (1-2 sentences)"
+  }
+]
+
+For a section that does NOT have the same issue, return only: {"chunk_id": <id>, "has_issue": false}
 """
 
 
+_VERDICT_PROPERTIES = {
+    "has_issue": {"type": "boolean"},
+    "issue_type": {"type": ["string", "null"]},
+    "severity": {"type": ["string", "null"], "enum": ["HIGH", "MEDIUM", "LOW", None]},
+    "explanation": {"type": ["string", "null"]},
+    "problematic_text": {"type": ["string", "null"]},
+    "location": {"type": ["string", "null"]},
+    "remediation": {"type": ["string", "null"]}
+}
+
+# Schemas of the validation answers (structured output via tool use)
+VALIDATION_TOOL = make_tool(
+    "record_verdict",
+    "Record whether the uploaded SOW section has the same issue as the real examples.",
+    {
+        "type": "object",
+        "properties": dict(_VERDICT_PROPERTIES, matched_example={"type": ["object", "null"]}),
+        "required": ["has_issue"]
+    }
+)
+
+VALIDATION_BATCH_TOOL = make_tool(
+    "record_verdicts",
+    "Record one verdict per uploaded SOW section, using the section's id as chunk_id.",
+    {
+        "type": "object",
+        "properties": {
+            "verdicts": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": dict(_VERDICT_PROPERTIES, chunk_id={"type": "integer"}),
+                    "required": ["chunk_id", "has_issue"]
+                }
+            }
+        },
+        "required": ["verdicts"]
+    }
+)
+
+
 def validate_with_claude(
     sow_section: str,
     similar_patterns: List[Dict],
-    model: str = "claude-3-haiku-20240307"
+    model: str = DEFAULT_MODEL
 ) -> Dict:
     """
     Use Claude to validate if similar issues exist in uploaded SOW section
@@ -156,7 +322,68 @@ def validate_with_claude(
     Returns:
         Validation result dictionary
     """
-    # Format similar patterns for prompt
+    prompt = build_validation_prompt(sow_section, similar_patterns)
+
+    try:
+        return complete(
+            prompt,
+            model=model,
+            max_tokens=2048,
+            temperature=0,
+            purpose="validation",
+            parse=parse_validation_response,
+            system=VALIDATION_PROMPT,
+            tool=VALIDATION_TOOL
+        )
+
+    except Exception as e:
+        print(f"[WARNING] Claude validation error: {e}")
+        return {"has_issue": False, "error": str(e)}
+
+
+async def validate_with_claude_async(
+    sow_section: str,
+    similar_patterns: List[Dict],
+    model: str = DEFAULT_MODEL
+) -> Dict:
+    """
+    Async version of validate_with_claude (does not block the event loop)
+
+    Args:
+        sow_section: Chunk of uploaded SOW
+        similar_patterns: Top matches from vector DB
+        model: Claude model to use
+
+    Returns:
+        Validation result dictionary
+    """
+    prompt = build_validation_prompt(sow_section, similar_patterns)
+
+    try:
+        return await complete_async(
+            prompt,
+            model=model,
+            max_tokens=2048,
+            temperature=0,
+            purpose="validation",
+            parse=parse_validation_response,
+            system=VALIDATION_PROMPT,
+            tool=VALIDATION_TOOL
+        )
+
+    except Exception as e:
+        print(f"[WARNING] Claude validation error: {e}")
+        return {"has_issue": False, "error": str(e)}
+
+
+def build_validation_prompt(sow_section: str, similar_patterns: List[Dict]) -> str:
+    """Fill VALIDATION_INPUT with a SOW chunk and its retrieved patterns"""
+    prompt = VALIDATION_INPUT.replace("{sow_section}", sow_section)
+    return prompt.replace("{similar_patterns}", format_patterns(similar_patterns))
+
+
+def format_patterns(similar_patterns: List[Dict]) -> str:
+    """Format retrieved patterns for a validation prompt"""
     patterns_text = ""
     for i, pattern in enumerate(similar_patterns, 1):
         patterns_text += f"\n--- Example {i} (Similarity: {pattern['similarity_score']:.2f}) ---\n"
@@ -166,146 +393,701 @@ def validate_with_claude(
         patterns_text += f"What Happened: {pattern['actual_outcome']}\n"
         patterns_text += f"Cost Impact: {pattern['estimated_cost']}\n"
         patterns_text += f"Source: {pattern['contract_source']}\n"
+    return patterns_text
+
 
-    prompt = VALIDATION_PROMPT.replace("{sow_section}", sow_section)
-    prompt = prompt.replace("{similar_patterns}", patterns_text)
+def format_batch_section(chunk_id: int, sow_section: str, similar_patterns: List[Dict]) -> str:
+    """One section block of a batched validation request"""
+    return (
+        f'<section id="{chunk_id}">\n'
+        f"<uploaded_sow_section>\n{sow_section}\n</uploaded_sow_section>\n"
+        f"<similar_patterns_from_real_contracts>\n{format_patterns(similar_patterns)}\n"
+        f"</similar_patterns_from_real_contracts>\n"
+        f"</section>"
+    )
+
+
+def build_batch_validation_prompt(batch: List[Tuple[int, str, List[Dict]]]) -> str:
+    """User message for a batched validation request of (chunk_id, chunk, patterns) entries"""
+    return "\n\n".join(
+        format_batch_section(chunk_id, sow_section, similar_patterns)
+        for chunk_id, sow_section, similar_patterns in batch
+    )
+
+
+def plan_validation_batches(
+    items: List[Tuple[int, str, List[Dict]]],
+    token_budget: int = RAG_BATCH_TOKEN_BUDGET,
+    max_chunks: int = RAG_BATCH_MAX_CHUNKS
+) -> List[List[Tuple[int, str, List[Dict]]]]:
+    """
+    Pack (chunk_id, chunk, patterns) entries into validation batches
+
+    Entries stay in document order. A batch is closed when adding the next
+    section would push its estimated size past token_budget, or when it
+    holds max_chunks sections; so chunks with many long patterns get
+    smaller batches.
+
+    Returns:
+        List of batches (each a list of entries)
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+
+    for item in items:
+        section_tokens = estimate_tokens(format_batch_section(*item))
+        if current and (current_tokens + section_tokens > token_budget or len(current) >= max_chunks):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(item)
+        current_tokens += section_tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _verdict_cache_prompt(sow_section: str, similar_patterns: List[Dict]) -> str:
+    """
+    Response-cache key text for one chunk's batched verdict
+
+    Depends only on the chunk and its patterns (not its id or batch), so an
+    edit that shifts batch boundaries doesn't invalidate other chunks.
+    """
+    tool = json.dumps(VALIDATION_BATCH_TOOL, sort_keys=True) if LLM_STRUCTURED_OUTPUT else ""
+    return "\n\n".join([
+        "validation_batch_verdict", VALIDATION_BATCH_PROMPT, tool,
+        format_batch_section(0, sow_section, similar_patterns)
+    ])
+
+
+def get_cached_verdicts(items: List[Tuple[int, str, List[Dict]]], model: str = DEFAULT_MODEL) -> List[Optional[Dict]]:
+    """
+    Per-chunk verdicts saved from earlier batched validations
+
+    Returns:
+        One verdict per (chunk_id, chunk, patterns) entry (None on a miss)
+    """
+    if not is_cacheable(0):
+        return [None] * len(items)
+
+    verdicts = []
+    for _, sow_section, similar_patterns in items:
+        cached = get_cached_response(model, BATCH_VERDICT_TOKENS, 0, _verdict_cache_prompt(sow_section, similar_patterns))
+        try:
+            verdict = json.loads(cached) if cached is not None else None
+        except json.JSONDecodeError:
+            verdict = None
+        verdicts.append(verdict if isinstance(verdict, dict) else None)
+    return verdicts
+
+
+def store_verdicts(items: List[Tuple[int, str, List[Dict]]], verdicts: List[Optional[Dict]], model: str = DEFAULT_MODEL):
+    """Save each chunk's verdict from a batched validation on its own (failed validations are skipped)"""
+    if not is_cacheable(0):
+        return
+    for (_, sow_section, similar_patterns), verdict in zip(items, verdicts):
+        if verdict is not None and not verdict.get('error'):
+            store_response(model, BATCH_VERDICT_TOKENS, 0,
+                           _verdict_cache_prompt(sow_section, similar_patterns), json.dumps(verdict))
+
+
+def parse_batch_validation_response(response_text: str, chunk_ids: List[int]) -> List[Optional[Dict]]:
+    """
+    Extract per-chunk verdicts from Claude's batched validation response
+
+    Args:
+        response_text: Raw response text
+        chunk_ids: Ids of the sections in the batch, in order
+
+    Returns:
+        One verdict per chunk id (None where Claude returned no verdict)
+
+    Raises:
+        ValueError: If the response has no JSON array of verdicts
+    """
+    stripped = response_text.strip()
+    if stripped.startswith('{'):
+        # Structured output: {"verdicts": [...]}
+        verdicts = json.loads(stripped).get('verdicts')
+    else:
+        json_start = response_text.find('[')
+        json_end = response_text.rfind(']') + 1
+        if json_start == -1 or json_end <= json_start:
+            raise ValueError("No JSON array in batched validation response")
+        verdicts = json.loads(response_text[json_start:json_end])
+
+    if not isinstance(verdicts, list):
+        raise ValueError("Batched validation response is not a list")
+
+    by_id = {}
+    for verdict in verdicts:
+        if not isinstance(verdict, dict):
+            continue
+        try:
+            chunk_id = int(verdict.pop('chunk_id'))
+        except (KeyError, TypeError, ValueError):
+            continue
+        by_id.setdefault(chunk_id, verdict)
+
+    if not any(chunk_id in by_id for chunk_id in chunk_ids):
+        raise ValueError("Batched validation response matched no chunk ids")
+
+    return [by_id.get(chunk_id) for chunk_id in chunk_ids]
+
+
+async def validate_batch_with_claude_async(
+    batch: List[Tuple[int, str, List[Dict]]],
+    model: str = DEFAULT_MODEL
+) -> List[Dict]:
+    """
+    Validate several chunks in one Claude request
+
+    Chunks Claude skips in its answer (or the whole batch, if the response
+    can't be parsed) are validated one at a time instead. Verdicts are
+    cached per chunk (see get_cached_verdicts), not per packed prompt.
+
+    Args:
+        batch: (chunk_id, chunk, patterns) entries from plan_validation_batches
+        model: Claude model to use
+
+    Returns:
+        One validation result per entry, in order
+    """
+    if len(batch) == 1:
+        _, sow_section, similar_patterns = batch[0]
+        return [await validate_with_claude_async(sow_section, similar_patterns, model)]
+
+    chunk_ids = [chunk_id for chunk_id, _, _ in batch]
+    prompt = build_batch_validation_prompt(batch)
 
     try:
-        message = client.messages.create(
+        verdicts = await complete_async(
+            prompt,
             model=model,
-            max_tokens=2048,
+            max_tokens=min(4096, BATCH_VERDICT_TOKENS * len(batch) + 256),
             temperature=0,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
+            purpose="validation_batch",
+            parse=lambda response_text: parse_batch_validation_response(response_text, chunk_ids),
+            system=VALIDATION_BATCH_PROMPT,
+            tool=VALIDATION_BATCH_TOOL,
+            cache=False
         )
+        await run_in_pool(store_verdicts, batch, verdicts, model)
+    except Exception as e:
+        print(f"[WARNING] Batched validation failed ({e}), validating {len(batch)} chunks individually")
+        verdicts = [None] * len(batch)
 
-        response_text = message.content[0].text
+    missing = [i for i, verdict in enumerate(verdicts) if verdict is None]
+    if missing:
+        retried = await asyncio.gather(*(
+            validate_with_claude_async(batch[i][1], batch[i][2], model) for i in missing
+        ))
+        for i, verdict in zip(missing, retried):
+            verdicts[i] = verdict
 
-        # Extract JSON
-        json_start = response_text.find('{')
-        json_end = response_text.rfind('}') + 1
-        if json_start != -1 and json_end > json_start:
-            json_text = response_text[json_start:json_end]
-        else:
-            json_text = response_text
+    return verdicts
 
-        return json.loads(json_text)
 
-    except Exception as e:
-        print(f"[WARNING] Claude validation error: {e}")
-        return {"has_issue": False, "error": str(e)}
+def parse_validation_response(response_text: str) -> Dict:
+    """Extract the JSON verdict from Claude's validation response"""
+    json_start = response_text.find('{')
+    json_end = response_text.rfind('}') + 1
+    if json_start != -1 and json_end > json_start:
+        json_text = response_text[json_start:json_end]
+    else:
+        json_text = response_text
+
+    return json.loads(json_text)
+
+
+def gate_patterns(
+    sow_section: str,
+    similar_patterns: List[Dict],
+    min_similarity: float = RAG_MIN_SIMILARITY,
+    relative_cutoff: float = RAG_RELATIVE_CUTOFF
+) -> Tuple[List[Dict], int]:
+    """
+    Decide whether a chunk is worth validating and trim its prompt context
+
+    Args:
+        sow_section: Chunk of uploaded SOW
+        similar_patterns: Matches from vector DB, best first
+        min_similarity: Chunks whose best match is below this skip Claude
+        relative_cutoff: Patterns scoring below best * relative_cutoff are dropped
+
+    Returns:
+        (patterns to send, estimated prompt tokens saved) - an empty pattern
+        list means the chunk should not be sent to Claude at all
+    """
+    if not similar_patterns:
+        return [], 0
+
+    full_tokens = estimate_tokens(VALIDATION_PROMPT + build_validation_prompt(sow_section, similar_patterns))
+
+    best_score = similar_patterns[0]['similarity_score']
+    if best_score < min_similarity:
+        return [], full_tokens
+
+    threshold = best_score * relative_cutoff if best_score > 0 else best_score
+    kept = [p for p in similar_patterns if p['similarity_score'] >= threshold]
+
+    saved = full_tokens - estimate_tokens(VALIDATION_PROMPT + build_validation_prompt(sow_section, kept))
+    return kept, saved
+
+
+def _record_gate(chunks_checked: int, chunks_skipped: int, patterns_dropped: int, tokens_saved: int,
+                 prepass_forced: int = 0):
+    with _gate_lock:
+        _gate_stats["chunks_checked"] += chunks_checked
+        _gate_stats["calls_saved"] += chunks_skipped
+        _gate_stats["patterns_dropped"] += patterns_dropped
+        _gate_stats["tokens_saved"] += tokens_saved
+        _gate_stats["prepass_forced"] += prepass_forced
+
+
+def get_rag_settings_version() -> str:
+    """Chunking, gate and dedup settings that change which findings come back (for result cache keys)"""
+    dedup = RAG_DEDUP_THRESHOLD if RAG_DEDUP_ENABLED else "off"
+    prepass = "prepass" if RAG_PREPASS_ENABLED else "no-prepass"
+    return (f"chunk{RAG_CHUNK_OVERLAP}-{RAG_MIN_CHUNK_WORDS}-{CHUNKER_RULES_VERSION}-"
+            f"{RAG_MIN_SIMILARITY}-{RAG_RELATIVE_CUTOFF}-{dedup}-{prepass}")
+
+
+def _record_duplicates(duplicate_chunks: int, validations_avoided: int):
+    with _gate_lock:
+        _gate_stats["duplicate_chunks"] += duplicate_chunks
+        _gate_stats["duplicate_validations_avoided"] += validations_avoided
+
+
+def get_gate_stats() -> dict:
+    """Validation calls and prompt tokens saved by near-duplicate removal and the similarity gate"""
+    with _gate_lock:
+        stats = dict(_gate_stats)
+    stats["min_similarity"] = RAG_MIN_SIMILARITY
+    stats["relative_cutoff"] = RAG_RELATIVE_CUTOFF
+    stats["dedup_threshold"] = RAG_DEDUP_THRESHOLD if RAG_DEDUP_ENABLED else None
+    stats["prepass"] = RAG_PREPASS_ENABLED
+    return stats
+
+
+def attach_matched_example(validation: Dict, similar_patterns: List[Dict]) -> Dict:
+    """Replace Claude's matched_example with the best vector DB match"""
+    if similar_patterns:
+        validation['matched_example'] = {
+            "contract_source": similar_patterns[0]['contract_source'],
+            "similarity_score": similar_patterns[0]['similarity_score'],
+            "actual_outcome": similar_patterns[0]['actual_outcome'],
+            "estimated_cost": similar_patterns[0]['estimated_cost'],
+            "correct_version": similar_patterns[0]['correct_version']
+        }
+    return validation
+
+
+def locate_finding(validation: Dict, chunk: Dict, own_location: bool = False) -> Dict:
+    """
+    Record which chunk a finding came from
+
+    Args:
+        validation: Validation result where has_issue is true
+        chunk: Chunk dict from chunker.chunk_document
+        own_location: Always use the chunk's page/section (for verdicts
+            copied from a near-duplicate chunk); otherwise it is only used
+            when Claude gave no location
+
+    Returns:
+        The validation result with location and source filled in
+    """
+    if own_location or validation.get('location') in (None, '', 'Unknown', 'N/A'):
+        validation['location'] = format_location(chunk)
+    validation['source'] = {
+        "chunk_id": chunk['id'],
+        "start": chunk['start'],
+        "end": chunk['end'],
+        "page": chunk['page'],
+        "section": chunk['section']
+    }
+    return validation
+
+
+FINDING_CATEGORIES = [
+    "weak_kpis",
+    "scope_creep",
+    "missing_elements",
+    "red_flags",
+    "deliverable_issues",
+    "inconsistencies"
+]
+
+
+def normalize_finding(finding: Dict) -> tuple:
+    """
+    Convert a validation result into the frontend finding shape
+
+    Args:
+        finding: Validation result where has_issue is true
+
+    Returns:
+        (category, normalized_finding) tuple, e.g. ('scope_creep', {...})
+    """
+    issue_type = finding.get('issue_type', 'inconsistencies')
+
+    # Normalize field names to match frontend expectations
+    normalized_finding = {
+        'severity': finding.get('severity', 'MEDIUM'),
+        'issue': finding.get('explanation', ''),
+        'text': finding.get('problematic_text', ''),
+        'location': finding.get('location', 'Unknown'),
+        'matched_example': finding.get('matched_example'),
+        'remediation': finding.get('remediation', '')
+    }
+
+    # Where the chunk came from in the document (offsets, page, section)
+    if finding.get('source'):
+        normalized_finding['source'] = finding['source']
+
+    # Add type-specific fields
+    if issue_type == 'missing_element':
+        normalized_finding['element'] = finding.get('problematic_text', 'Missing element')
+
+    # Map issue types to categories
+    if issue_type == 'weak_kpi':
+        category = 'weak_kpis'
+    elif issue_type == 'scope_creep':
+        category = 'scope_creep'
+    elif issue_type == 'missing_element':
+        category = 'missing_elements'
+    elif issue_type == 'red_flag':
+        category = 'red_flags'
+    elif issue_type == 'deliverable_issue':
+        category = 'deliverable_issues'
+    else:
+        category = 'inconsistencies'
+
+    return category, normalized_finding
+
+
+def group_findings(all_findings: List[Dict]) -> dict:
+    """
+    Group validated findings by issue type, using frontend field names
+
+    Args:
+        all_findings: Validation results where has_issue is true
+
+    Returns:
+        Dictionary keyed by category (weak_kpis, scope_creep, ...)
+    """
+    grouped_findings = {category: [] for category in FINDING_CATEGORIES}
+
+    for finding in all_findings:
+        category, normalized_finding = normalize_finding(finding)
+        grouped_findings[category].append(normalized_finding)
+
+    return grouped_findings
 
 
 def analyze_sow_with_rag(
     extracted_data: dict,
     top_k_matches: int = 5,
-    chunk_size: int = 200
+    chunk_size: int = 200,
+    max_concurrency: int = RAG_CHUNK_CONCURRENCY,
+    min_similarity: float = RAG_MIN_SIMILARITY,
+    relative_cutoff: float = RAG_RELATIVE_CUTOFF,
+    batch_validation: bool = RAG_BATCH_VALIDATION,
+    dedup: bool = RAG_DEDUP_ENABLED,
+    dedup_threshold: float = RAG_DEDUP_THRESHOLD,
+    prepass: bool = RAG_PREPASS_ENABLED
 ) -> dict:
     """
     Analyze SOW using RAG approach:
     1. Chunk the SOW
-    2. For each chunk, find similar patterns in vector DB
-    3. Use Claude to validate if issue exists
-    4. Aggregate results
+    2. Drop near-duplicate chunks, then find similar patterns in vector DB
+    3. Skip chunks with no close match; trim weak patterns from the rest
+    4. Use Claude to validate if issue exists (several chunks per request,
+       requests sent concurrently)
+    5. Aggregate results
+
+    Synchronous entry point for CLI use; runs analyze_sow_with_rag_async.
 
     Args:
         extracted_data: Dictionary from Pass 1 (sow_extractor.py)
         top_k_matches: Number of similar patterns to retrieve per chunk
-        chunk_size: Words per chunk
+        chunk_size: Maximum words per chunk
+        max_concurrency: Maximum validation requests in flight
+        min_similarity: Chunks whose best match scores below this skip Claude
+        relative_cutoff: Patterns below best score * relative_cutoff are
+            left out of the validation prompt
+        batch_validation: Pack several chunks into each validation request
+        dedup: Validate one representative per cluster of near-identical chunks
+        dedup_threshold: Jaccard similarity at which chunks count as duplicates
+        prepass: Always validate chunks the local red-flag scanner flags
 
     Returns:
         Enhanced analysis with matched examples
     """
+    return asyncio.run(analyze_sow_with_rag_async(
+        extracted_data,
+        top_k_matches=top_k_matches,
+        chunk_size=chunk_size,
+        max_concurrency=max_concurrency,
+        min_similarity=min_similarity,
+        relative_cutoff=relative_cutoff,
+        batch_validation=batch_validation,
+        dedup=dedup,
+        dedup_threshold=dedup_threshold,
+        prepass=prepass
+    ))
+
+
+async def iter_rag_findings_async(
+    extracted_data: dict,
+    top_k_matches: int = 5,
+    chunk_size: int = 200,
+    progress_callback: Optional[Callable] = None,
+    max_concurrency: int = RAG_CHUNK_CONCURRENCY,
+    min_similarity: float = RAG_MIN_SIMILARITY,
+    relative_cutoff: float = RAG_RELATIVE_CUTOFF,
+    batch_validation: bool = RAG_BATCH_VALIDATION,
+    dedup: bool = RAG_DEDUP_ENABLED,
+    dedup_threshold: float = RAG_DEDUP_THRESHOLD,
+    prepass: bool = RAG_PREPASS_ENABLED,
+    stats: Optional[Dict] = None
+) -> AsyncIterator[tuple]:
+    """
+    Run the RAG pipeline and yield each finding as soon as Claude confirms it
+
+    The document is split into sentence-aligned, overlapping chunks that
+    keep their page/section, so findings are located without asking Claude.
+    Chunks are packed into validation requests that run concurrently (at
+    most max_concurrency at a time, on top of the gateway's global rate
+    limit), and each request's findings are yielded as soon as it finishes,
+    so one slow request doesn't hold back the others. Findings therefore
+    arrive out of document order; source['chunk_id'] gives each one's
+    position. All chunks are embedded and searched in one batch on the
+    bounded CPU pool, so the event loop stays free.
+
+    Args:
+        extracted_data: Dictionary from Pass 1 (sow_extractor.py)
+        top_k_matches: Number of similar patterns to retrieve per chunk
+        chunk_size: Maximum words per chunk
+        progress_callback: Optional callable(stage, current, total) invoked
+            as chunks finish
+        max_concurrency: Maximum validation requests in flight
+        min_similarity: Chunks whose best match scores below this skip Claude
+        relative_cutoff: Patterns below best score * relative_cutoff are
+            left out of the validation prompt
+        batch_validation: Pack several chunks into each validation request
+        dedup: Validate one representative per cluster of near-identical chunks
+        dedup_threshold: Jaccard similarity at which chunks count as duplicates
+        prepass: Always validate chunks the local red-flag scanner flags
+        stats: Optional dict; its validation_errors entry counts the chunks
+            whose validation failed (they yield no finding, so the result
+            is incomplete and should not be cached)
+
+    Yields:
+        (category, normalized_finding) tuples, in the order their
+        validation requests finish
+    """
     print(f"\n[RAG] Starting RAG-enhanced analysis...")
+    if stats is None:
+        stats = {}
+    stats["validation_errors"] = 0
 
-    # Extract full text
     full_text = extract_full_text_from_sow(extracted_data)
     print(f"   Extracted {len(full_text)} characters")
 
-    # Chunk text
-    chunks = chunk_text(full_text, chunk_size=chunk_size)
+    chunks = await run_in_pool(chunk_document, full_text, chunk_size)
     print(f"   Split into {len(chunks)} chunks")
 
-    # Analyze each chunk
-    all_findings = []
-    chunks_analyzed = 0
-
-    for i, chunk in enumerate(chunks):
-        if len(chunk.strip()) < 50:  # Skip very short chunks
-            continue
-
-        chunks_analyzed += 1
-        print(f"   Analyzing chunk {chunks_analyzed}/{len(chunks)}...")
-
-        # Search vector DB for similar patterns
-        similar_patterns = search_similar_patterns(chunk, n_results=top_k_matches)
-
-        if not similar_patterns:
-            continue
-
-        # Use Claude to validate
-        validation = validate_with_claude(chunk, similar_patterns)
-
-        if validation.get('has_issue', False):
-            # Add the best matched example details
-            if similar_patterns:
-                validation['matched_example'] = {
-                    "contract_source": similar_patterns[0]['contract_source'],
-                    "similarity_score": similar_patterns[0]['similarity_score'],
-                    "actual_outcome": similar_patterns[0]['actual_outcome'],
-                    "estimated_cost": similar_patterns[0]['estimated_cost'],
-                    "correct_version": similar_patterns[0]['correct_version']
-                }
-
-            all_findings.append(validation)
-
-    print(f"[OK] Found {len(all_findings)} validated issues")
-
-    # Group findings by issue type
-    grouped_findings = {
-        "weak_kpis": [],
-        "scope_creep": [],
-        "missing_elements": [],
-        "red_flags": [],
-        "deliverable_issues": [],
-        "inconsistencies": []
-    }
+    # Skip very short chunks
+    numbered = [chunk for chunk in chunks if len(chunk['text']) >= 50]
+    chunks_by_id = {chunk['id']: chunk for chunk in numbered}
+
+    # Near-identical chunks (repeated boilerplate) share one representative's
+    # retrieval and verdict
+    duplicates_of = {}
+    unique = numbered
+    if dedup:
+        representatives = await run_in_pool(
+            find_near_duplicates, [chunk['text'] for chunk in numbered], dedup_threshold
+        )
+        unique = []
+        for i, (chunk, rep) in enumerate(zip(numbered, representatives)):
+            if rep == i:
+                unique.append(chunk)
+            else:
+                duplicates_of.setdefault(numbered[rep]['id'], []).append(chunk)
+
+    to_analyze = [chunk['text'] for chunk in unique]
+    completed = len(chunks) - len(to_analyze)
+
+    # Embed and search every chunk in one batch
+    retrieved = await retrieve_similar_patterns(to_analyze, top_k_matches)
+
+    # Gate: boilerplate chunks with no close match never cost an API call,
+    # unless the local scanner found scope-creep language in them
+    to_validate = []
+    skipped = dropped = tokens_saved = forced = 0
+    for chunk, similar_patterns in zip(unique, retrieved):
+        flagged = prepass and bool(find_phrases(chunk['text']))
+        floor = float('-inf') if flagged else min_similarity
+        kept, saved = gate_patterns(chunk['text'], similar_patterns, floor, relative_cutoff)
+        tokens_saved += saved
+        if kept:
+            to_validate.append((chunk['id'], chunk['text'], kept))
+            dropped += len(similar_patterns) - len(kept)
+            if flagged and similar_patterns[0]['similarity_score'] < min_similarity:
+                forced += 1
+        elif similar_patterns:
+            skipped += 1
+
+    _record_gate(len(to_analyze), skipped, dropped, tokens_saved, forced)
+    print(f"   Similarity gate skipped {skipped}/{len(to_analyze)} chunks, "
+          f"dropped {dropped} weak patterns (~{tokens_saved} prompt tokens saved)")
+    if forced:
+        print(f"   Red-flag pre-pass kept {forced} low-similarity chunks for validation")
+
+    duplicate_count = len(numbered) - len(unique)
+    validations_avoided = sum(len(duplicates_of.get(chunk_id, [])) for chunk_id, _, _ in to_validate)
+    _record_duplicates(duplicate_count, validations_avoided)
+    if duplicate_count:
+        print(f"   Near-duplicate removal: {duplicate_count} chunks reuse another chunk's verdict "
+              f"({validations_avoided} chunk validations avoided)")
+
+    completed += len(to_analyze) - len(to_validate)
+    if progress_callback:
+        progress_callback("rag_validation", completed, len(chunks))
+
+    # (batch, verdicts) units; verdicts is None until Claude is asked
+    if batch_validation:
+        # Chunks validated before keep their verdict; only the rest are packed,
+        # so an edit elsewhere in the document doesn't re-validate them
+        cached = await run_in_pool(get_cached_verdicts, to_validate)
+        misses = [item for item, verdict in zip(to_validate, cached) if verdict is None]
+        units = [([item], [verdict]) for item, verdict in zip(to_validate, cached) if verdict is not None]
+        units += [(batch, None) for batch in plan_validation_batches(misses)]
+        units.sort(key=lambda unit: unit[0][0][0])
+        with _gate_lock:
+            _gate_stats["cached_verdicts"] += len(to_validate) - len(misses)
+        if len(misses) < len(to_validate):
+            print(f"   Reusing cached verdicts for {len(to_validate) - len(misses)} chunks")
+    else:
+        units = [([item], None) for item in to_validate]
+    requests = sum(1 for _, verdicts in units if verdicts is None)
+    print(f"   Validating {len(to_validate)} chunks in {requests} requests ({max_concurrency} at a time)...")
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def analyze_batch(batch, validations=None):
+        nonlocal completed
+        if validations is None:
+            async with semaphore:
+                validations = await validate_batch_with_claude_async(batch)
+
+        completed += len(batch)
+        if progress_callback:
+            progress_callback("rag_validation", completed, len(chunks))
+
+        findings = []
+        for (chunk_id, _, similar_patterns), validation in zip(batch, validations):
+            if validation and validation.get('error'):
+                stats["validation_errors"] += 1
+            elif validation and validation.get('has_issue', False):
+                validation = attach_matched_example(validation, similar_patterns)
+                findings.append(locate_finding(validation, chunks_by_id[chunk_id]))
+
+                # Fan the verdict out to this chunk's near-duplicates
+                for duplicate in duplicates_of.get(chunk_id, []):
+                    findings.append(locate_finding(dict(validation), duplicate, own_location=True))
+
+        findings.sort(key=lambda finding: finding['source']['chunk_id'])
+        return findings
+
+    tasks = [asyncio.create_task(analyze_batch(batch, verdicts)) for batch, verdicts in units]
+    order = {task: i for i, task in enumerate(tasks)}
+    pending = set(tasks)
+    findings_count = 0
 
-    for finding in all_findings:
-        issue_type = finding.get('issue_type', 'inconsistencies')
-
-        # Normalize field names to match frontend expectations
-        normalized_finding = {
-            'severity': finding.get('severity', 'MEDIUM'),
-            'issue': finding.get('explanation', ''),
-            'text': finding.get('problematic_text', ''),
-            'location': finding.get('location', 'Unknown'),
-            'matched_example': finding.get('matched_example'),
-            'remediation': finding.get('remediation', '')
-        }
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Batches that finish together come out in document order
+            for task in sorted(done, key=order.get):
+                for finding in task.result():
+                    findings_count += 1
+                    yield normalize_finding(finding)
+    finally:
+        # Consumer stopped early (or a chunk failed) - don't leave work running
+        for task in tasks:
+            task.cancel()
+
+    print(f"[OK] Found {findings_count} validated issues")
+    if stats["validation_errors"]:
+        print(f"[WARNING] Validation failed for {stats['validation_errors']} chunks")
+
+
+async def analyze_sow_with_rag_async(
+    extracted_data: dict,
+    top_k_matches: int = 5,
+    chunk_size: int = 200,
+    progress_callback: Optional[Callable] = None,
+    max_concurrency: int = RAG_CHUNK_CONCURRENCY,
+    min_similarity: float = RAG_MIN_SIMILARITY,
+    relative_cutoff: float = RAG_RELATIVE_CUTOFF,
+    batch_validation: bool = RAG_BATCH_VALIDATION,
+    dedup: bool = RAG_DEDUP_ENABLED,
+    dedup_threshold: float = RAG_DEDUP_THRESHOLD,
+    prepass: bool = RAG_PREPASS_ENABLED
+) -> dict:
+    """
+    Async version of analyze_sow_with_rag
 
-        # Add type-specific fields
-        if issue_type == 'missing_element':
-            normalized_finding['element'] = finding.get('problematic_text', 'Missing element')
-
-        # Map issue types to categories
-        if issue_type == 'weak_kpi':
-            grouped_findings['weak_kpis'].append(normalized_finding)
-        elif issue_type == 'scope_creep':
-            grouped_findings['scope_creep'].append(normalized_finding)
-        elif issue_type == 'missing_element':
-            grouped_findings['missing_elements'].append(normalized_finding)
-        elif issue_type == 'red_flag':
-            grouped_findings['red_flags'].append(normalized_finding)
-        elif issue_type == 'deliverable_issue':
-            grouped_findings['deliverable_issues'].append(normalized_finding)
-        else:
-            grouped_findings['inconsistencies'].append(normalized_finding)
+    Args:
+        extracted_data: Dictionary from Pass 1 (sow_extractor.py)
+        top_k_matches: Number of similar patterns to retrieve per chunk
+        chunk_size: Maximum words per chunk
+        progress_callback: Optional callable(stage, current, total) invoked
+            as chunks finish
+        max_concurrency: Maximum validation requests in flight
+        min_similarity: Chunks whose best match scores below this skip Claude
+        relative_cutoff: Patterns below best score * relative_cutoff are
+            left out of the validation prompt
+        batch_validation: Pack several chunks into each validation request
+        dedup: Validate one representative per cluster of near-identical chunks
+        dedup_threshold: Jaccard similarity at which chunks count as duplicates
+        prepass: Always validate chunks the local red-flag scanner flags
 
+    Returns:
+        Enhanced analysis with matched examples, plus validation_errors
+        when some chunks could not be validated
+    """
+    grouped_findings = {category: [] for category in FINDING_CATEGORIES}
+    stats = {}
+
+    async for category, finding in iter_rag_findings_async(
+        extracted_data,
+        top_k_matches=top_k_matches,
+        chunk_size=chunk_size,
+        progress_callback=progress_callback,
+        max_concurrency=max_concurrency,
+        min_similarity=min_similarity,
+        relative_cutoff=relative_cutoff,
+        batch_validation=batch_validation,
+        dedup=dedup,
+        dedup_threshold=dedup_threshold,
+        prepass=prepass,
+        stats=stats
+    ):
+        grouped_findings[category].append(finding)
+
+    # Findings arrive as requests finish; keep the result in document order
+    for category in FINDING_CATEGORIES:
+        grouped_findings[category].sort(key=lambda finding: finding['source']['chunk_id'])
+
+    if stats["validation_errors"]:
+        grouped_findings['validation_errors'] = stats["validation_errors"]
     return grouped_findings
 
 
@@ -327,6 +1109,10 @@ if __name__ == "__main__":
     with open(input_file, 'r', encoding='utf-8') as f:
         extracted = json.load(f)
 
+    # Load the embedding model and pattern collection up front
+    if not warm_up():
+        print(f"[WARNING] Vector DB not ready - run 'python vector_db_setup.py' to create it")
+
     # Analyze with RAG
     analysis = analyze_sow_with_rag(extracted)
 
@@ -338,8 +1124,8 @@ if __name__ == "__main__":
     print(f"\n[OK] RAG analysis saved to: {output_file}")
 
     # Print summary
-    total = sum(len(findings) for findings in analysis.values())
+    total = sum(len(analysis[category]) for category in FINDING_CATEGORIES)
     print(f"\n[SUMMARY] Found {total} issues with matched real-world examples:")
-    for category, findings in analysis.items():
-        if findings:
-            print(f"   - {category}: {len(findings)}")
+    for category in FINDING_CATEGORIES:
+        if analysis[category]:
+            print(f"   - {category}: {len(analysis[category])}")
@@ -0,0 +1,147 @@
+"""
+Local red-flag scanner - finds open-ended scope language without any API call
+
+The phrases ANALYSIS_PROMPT asks Claude to look for ("as needed", "best
+effort", "including but not limited to", ...) are compiled into one
+regular expression and matched over the raw document text. Used on its
+own as /api/analyze?mode=fast, and as a pre-pass that tells the RAG
+pipeline which chunks need a closer look.
+"""
+import re
+from typing import List, Dict, Tuple
+
+from chunker import find_pages, find_sections, label_at, format_location
+
+# (pattern, severity, why it's a problem, suggested fix)
+SCOPE_CREEP_PHRASES = [
+    (r"as needed", "HIGH",
+     "Open-ended obligation with no limit on quantity or frequency.",
+     "State the maximum quantity, frequency or hours, or tie the work to approved task orders."),
+    (r"as required", "HIGH",
+     "Leaves the amount of work undefined and open to later expansion.",
+     "Specify the requirement or reference the section that defines it."),
+    (r"as directed", "HIGH",
+     "Lets the government add work without a scope change.",
+     "Limit direction to work already defined in the SOW, with changes via modification."),
+    (r"including,? but not limited to", "HIGH",
+     "Non-exhaustive list makes the scope unbounded.",
+     "Replace with an exhaustive list of the included items."),
+    (r"and (?:all )?related (?:tasks|work|activities|services)", "HIGH",
+     "Catch-all phrase that extends scope beyond the listed tasks.",
+     "List the related tasks explicitly or remove the phrase."),
+    (r"other duties(?: as assigned)?", "HIGH",
+     "Catch-all duties clause with no scope limit.",
+     "Remove, or define the duties and a cap on effort."),
+    (r"ongoing support", "HIGH",
+     "Support with no end date or service level.",
+     "Define the support period, hours and service levels."),
+    (r"full range of", "HIGH",
+     "Unbounded description of services.",
+     "Enumerate the services or reference the section that defines them."),
+    (r"from time to time", "MEDIUM",
+     "Undefined frequency.",
+     "State how often the work is required."),
+    (r"(?:best|reasonable) efforts?", "MEDIUM",
+     "Effort standard rather than a measurable outcome.",
+     "Replace with a measurable deliverable or performance standard."),
+    (r"(?:appropriate|adequate) support", "MEDIUM",
+     "Support level is left to interpretation.",
+     "Define the support level (hours, response times, staff)."),
+    (r"reasonable assistance", "MEDIUM",
+     "Assistance level is left to interpretation.",
+     "Define the assistance (hours, tasks, limits)."),
+    (r"all (?:necessary|required) (?:resources|support|services|work)", "MEDIUM",
+     "Makes the contractor responsible for an unbounded set of resources.",
+     "List the resources the contractor must provide."),
+    (r"ample time", "MEDIUM",
+     "No minimum notice or duration specified.",
+     "Give a specific number of days."),
+    (r"as appropriate", "MEDIUM",
+     "Leaves the decision and extent of work undefined.",
+     "State who decides and the criteria used."),
+    (r"periodic(?:ally)?", "LOW",
+     "Frequency not specified.",
+     "State the exact frequency (e.g. monthly)."),
+    (r"etc\.", "LOW",
+     "Open-ended list.",
+     "Replace 'etc.' with the complete list."),
+]
+
+
+def _compile_phrases() -> re.Pattern:
+    """One case-insensitive pattern; group p<i> matches SCOPE_CREEP_PHRASES[i]"""
+    alternatives = []
+    for i, (pattern, _, _, _) in enumerate(SCOPE_CREEP_PHRASES):
+        # Phrases may be split across lines by PDF extraction
+        pattern = pattern.replace(' ', r'\s+')
+        boundary = '' if pattern.endswith(r'\.') else r'\b'
+        alternatives.append(rf'(?P<p{i}>\b{pattern}{boundary})')
+    return re.compile('|'.join(alternatives), re.IGNORECASE)
+
+
+_PATTERN = _compile_phrases()
+
+# Characters of context kept on each side of a match
+CONTEXT_CHARS = 100
+
+
+def find_phrases(text: str) -> List[Tuple[int, int, int]]:
+    """
+    Find every scope-creep phrase in text
+
+    Returns:
+        (start, end, index into SCOPE_CREEP_PHRASES) for each match, in order
+    """
+    return [(m.start(), m.end(), int(m.lastgroup[1:])) for m in _PATTERN.finditer(text)]
+
+
+def _context(text: str, start: int, end: int) -> str:
+    """The sentence around a match, trimmed to CONTEXT_CHARS on each side"""
+    left = max(0, start - CONTEXT_CHARS)
+    right = min(len(text), end + CONTEXT_CHARS)
+    sentence_start = max(text.rfind('.', left, start), text.rfind('\n', left, start))
+    if sentence_start != -1:
+        left = sentence_start + 1
+    sentence_end = text.find('.', end - 1, right)
+    if sentence_end != -1:
+        right = sentence_end + 1
+    return ' '.join(text[left:right].split())
+
+
+def scan_red_flags(text: str) -> List[Dict]:
+    """
+    Scan document text for scope-creep language
+
+    Args:
+        text: Raw document text (may contain [Page N] markers)
+
+    Returns:
+        List of scope_creep findings in document order, each with severity,
+        issue, text, location, remediation, the matched phrase and a source
+        block with character offsets, page and section
+    """
+    pages = find_pages(text)
+    sections = find_sections(text)
+
+    findings = []
+    for start, end, index in find_phrases(text):
+        _, severity, issue, remediation = SCOPE_CREEP_PHRASES[index]
+        page = label_at(pages, start)
+        section = label_at(sections, start)
+        findings.append({
+            'severity': severity,
+            'issue': issue,
+            'text': _context(text, start, end),
+            'location': format_location({'page': page, 'section': section}),
+            'matched_example': None,
+            'remediation': remediation,
+            'phrase': ' '.join(text[start:end].split()),
+            'source': {
+                "start": start,
+                "end": end,
+                "page": page,
+                "section": section
+            }
+        })
+
+    return findings
@@ -0,0 +1,147 @@
+"""
+Content-addressed, disk-backed cache of per-file analysis results
+
+Entries are keyed by the SHA-256 of the uploaded bytes plus a pipeline
+version (model, prompt version, vector DB version), so re-uploading the
+same SOW skips extraction, risk and RAG analysis entirely. Every LLM call
+uses temperature=0, so a cached result is what a re-run would produce.
+"""
+import os
+import json
+import glob
+import hashlib
+import threading
+from typing import Optional
+
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "./result_cache")
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+
+# Serializes eviction so concurrent writers don't race over the same files
+_lock = threading.Lock()
+
+
+def hash_content(content: bytes) -> str:
+    """SHA-256 hex digest of an uploaded file"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def make_pipeline_version(model: str, prompt_version: str, vector_db_version: str) -> str:
+    """Short hash identifying everything (besides the file) that shapes a result"""
+    raw = f"{model}|{prompt_version}|{vector_db_version}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def _entry_path(content_hash: str, pipeline_version: str) -> str:
+    return os.path.join(RESULT_CACHE_DIR, f"{content_hash}-{pipeline_version}.json")
+
+
+def get_cached_result(content_hash: str, pipeline_version: str) -> Optional[dict]:
+    """
+    Look up a cached result
+
+    Args:
+        content_hash: SHA-256 of the file bytes
+        pipeline_version: Value from make_pipeline_version
+
+    Returns:
+        Cached per-file result, or None on a miss
+    """
+    path = _entry_path(content_hash, pipeline_version)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            result = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    # Touch the entry so eviction is least-recently-used
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+    return result
+
+
+def store_result(content_hash: str, pipeline_version: str, result: dict):
+    """
+    Save a per-file result and evict old entries if the cache is too big
+
+    Args:
+        content_hash: SHA-256 of the file bytes
+        pipeline_version: Value from make_pipeline_version
+        result: Per-file result to cache
+    """
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+    path = _entry_path(content_hash, pipeline_version)
+
+    # Write to a temp file first so readers never see a partial entry
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+
+    _evict()
+
+
+def _evict():
+    """Delete least-recently-used entries until the cache fits RESULT_CACHE_MAX_BYTES"""
+    with _lock:
+        entries = []
+        for path in glob.glob(os.path.join(RESULT_CACHE_DIR, "*.json")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= RESULT_CACHE_MAX_BYTES:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def invalidate(content_hash: Optional[str] = None) -> int:
+    """
+    Remove cached results
+
+    Args:
+        content_hash: SHA-256 of a file to forget (all pipeline versions),
+            or None to clear the whole cache
+
+    Returns:
+        Number of entries removed
+    """
+    pattern = f"{content_hash}-*.json" if content_hash else "*.json"
+
+    removed = 0
+    with _lock:
+        for path in glob.glob(os.path.join(RESULT_CACHE_DIR, pattern)):
+            try:
+                os.unlink(path)
+                removed += 1
+            except OSError:
+                pass
+
+    return removed
+
+
+def get_cache_stats() -> dict:
+    """Entry count and total size of the result cache"""
+    paths = glob.glob(os.path.join(RESULT_CACHE_DIR, "*.json"))
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+
+    return {
+        "entries": len(paths),
+        "total_bytes": total,
+        "max_bytes": RESULT_CACHE_MAX_BYTES
+    }
@@ -0,0 +1,303 @@
+"""
+Storage/search backends for the pattern library
+
+vector_db_setup talks to a backend through five methods: get_hashes,
+upsert, delete, count and query. Two implementations:
+
+- ChromaBackend: persistent ChromaDB collection (SQLite + HNSW)
+- NumpyBackend: exact search over a float32 matrix memory-mapped from a
+  .npy file, with metadata kept as columns in a JSON file. The library is
+  small and read-mostly, so one matrix product over every query chunk is
+  faster than an approximate index and needs no database.
+
+query() returns, per query embedding, a list of (id, document, metadata,
+similarity) tuples, best first. Similarity is on Chroma's scale
+(1 - squared L2 distance), so RAG_MIN_SIMILARITY means the same thing for
+both backends.
+"""
+import os
+import json
+import uuid
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+Match = Tuple[str, str, Dict, float]
+
+
+class RetrievalBackend(ABC):
+    """Interface shared by the pattern library backends"""
+
+    name = "base"
+
+    @abstractmethod
+    def get_hashes(self) -> Dict[str, str]:
+        """Stored content hash per example id"""
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[Dict]):
+        """Insert or replace examples by id"""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """Remove examples by id"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored examples"""
+
+    @abstractmethod
+    def query(self, query_embeddings: List[List[float]], n_results: int) -> List[List[Match]]:
+        """Top n_results matches for each query embedding, best first"""
+
+
+class ChromaBackend(RetrievalBackend):
+    """Pattern library in a persistent ChromaDB collection"""
+
+    name = "chroma"
+
+    def __init__(self, path: str, collection_name: str):
+        import chromadb
+        self.client = chromadb.PersistentClient(path=path)
+        self.collection_name = collection_name
+        self._query_collection = None
+
+    def collection(self):
+        """The collection (created empty if it doesn't exist yet)"""
+        return self.client.get_or_create_collection(name=self.collection_name)
+
+    def get_hashes(self) -> Dict[str, str]:
+        stored = self.collection().get(include=["metadatas"])
+        return {
+            id_: (metadata or {}).get('content_hash')
+            for id_, metadata in zip(stored['ids'], stored['metadatas'])
+        }
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.collection().upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def delete(self, ids):
+        self.collection().delete(ids=ids)
+
+    def count(self) -> int:
+        return self.collection().count()
+
+    def _get_query_collection(self):
+        """Cached handle so searches don't look the collection up every time"""
+        if self._query_collection is None:
+            try:
+                self._query_collection = self.client.get_collection(name=self.collection_name)
+            except Exception as e:
+                print(f"[WARNING] Collection not found: {e}")
+                print(f"   Run 'python vector_db_setup.py' first to initialize")
+                return None
+        return self._query_collection
+
+    def query(self, query_embeddings, n_results):
+        coll = self._get_query_collection()
+        if coll is None:
+            return [[] for _ in query_embeddings]
+
+        try:
+            results = coll.query(query_embeddings=query_embeddings, n_results=n_results)
+        except Exception:
+            # Handle went stale (collection recreated) - look it up again once
+            self._query_collection = None
+            coll = self._get_query_collection()
+            if coll is None:
+                return [[] for _ in query_embeddings]
+            results = coll.query(query_embeddings=query_embeddings, n_results=n_results)
+
+        matches = []
+        for i in range(len(query_embeddings)):
+            if not results or not results['ids']:
+                matches.append([])
+                continue
+            matches.append([
+                (id_, document, metadata, 1 - distance)  # Convert distance to similarity
+                for id_, document, metadata, distance in zip(
+                    results['ids'][i], results['documents'][i],
+                    results['metadatas'][i], results['distances'][i]
+                )
+            ])
+        return matches
+
+
+class NumpyBackend(RetrievalBackend):
+    """
+    Exact search over normalized embeddings in a memory-mapped .npy matrix
+
+    Files in path:
+        index.json            ids, documents, metadata columns and the
+                              name of the current matrix file
+        embeddings-<v>.npy    float32 matrix, one unit-length row per id
+
+    Writes build a new matrix file and then atomically replace index.json,
+    so readers (threads or other worker processes) always see a complete
+    version; each query checks whether index.json changed and reloads if so.
+    The previous matrix is kept until the next write, so a reader that has
+    just read the old index.json can still open the file it points at.
+    """
+
+    name = "numpy"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index_file = os.path.join(path, "index.json")
+        self._write_lock = threading.Lock()
+        self._snapshot = None
+        self._version = None
+        os.makedirs(path, exist_ok=True)
+
+    def _load(self):
+        """Current (ids, documents, metadata columns, matrix), reloaded when index.json changes"""
+        try:
+            stat = os.stat(self.index_file)
+        except FileNotFoundError:
+            return [], [], {}, np.zeros((0, 0), dtype=np.float32)
+
+        # os.replace() gives index.json a new inode, so this catches writes
+        # even on filesystems with coarse mtimes
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if self._snapshot is None or version != self._version:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index['ids']:
+                matrix = np.load(os.path.join(self.path, index['matrix']), mmap_mode='r')
+            else:
+                matrix = np.zeros((0, 0), dtype=np.float32)
+            # One tuple, swapped in a single assignment, so readers never mix versions
+            self._snapshot = (index['ids'], index['documents'], index['columns'], matrix)
+            self._version = version
+        return self._snapshot
+
+    def _metadata(self, columns: Dict[str, list], row: int) -> Dict:
+        return {field: values[row] for field, values in columns.items()}
+
+    def _write(self, ids: List[str], documents: List[str], metadatas: List[Dict], matrix: np.ndarray):
+        """
+        Persist a new version: matrix file first, then the index that points at it
+
+        Matrix files older than the one being replaced are removed afterwards.
+        """
+        previous = None
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                previous = json.load(f).get('matrix')
+
+        matrix_name = f"embeddings-{uuid.uuid4().hex[:12]}.npy"
+        np.save(os.path.join(self.path, matrix_name), np.ascontiguousarray(matrix, dtype=np.float32))
+
+        fields = sorted({field for metadata in metadatas for field in metadata})
+        index = {
+            "matrix": matrix_name,
+            "ids": ids,
+            "documents": documents,
+            "columns": {field: [metadata.get(field) for metadata in metadatas] for field in fields}
+        }
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_file, self.index_file)
+
+        # Keep the previous matrix: another process may have read the old
+        # index.json and not opened its matrix yet. Anything older than that
+        # is two versions behind and no longer referenced. (Readers that
+        # already mapped a removed file keep its data until they reload.)
+        if previous:
+            try:
+                cutoff = os.stat(os.path.join(self.path, previous)).st_mtime_ns
+            except OSError:
+                return
+            for name in os.listdir(self.path):
+                if not (name.startswith("embeddings-") and name.endswith(".npy")):
+                    continue
+                if name in (previous, matrix_name):
+                    continue
+                file_path = os.path.join(self.path, name)
+                try:
+                    if os.stat(file_path).st_mtime_ns < cutoff:
+                        os.remove(file_path)
+                except OSError:
+                    pass
+
+    def _rows(self):
+        """Stored examples as parallel lists plus an in-memory copy of the matrix"""
+        ids, documents, columns, matrix = self._load()
+        metadatas = [self._metadata(columns, row) for row in range(len(ids))]
+        return list(ids), list(documents), metadatas, np.array(matrix, dtype=np.float32)
+
+    def get_hashes(self) -> Dict[str, str]:
+        ids, _, columns, _ = self._load()
+        hashes = columns.get('content_hash', [None] * len(ids))
+        return dict(zip(ids, hashes))
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        new = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(new, axis=1, keepdims=True)
+        new = new / np.where(norms == 0, 1, norms)
+
+        with self._write_lock:
+            stored_ids, stored_documents, stored_metadatas, matrix = self._rows()
+            if matrix.size == 0:
+                matrix = np.zeros((0, new.shape[1]), dtype=np.float32)
+            position = {id_: row for row, id_ in enumerate(stored_ids)}
+
+            appended = []
+            for i, id_ in enumerate(ids):
+                if id_ in position:
+                    row = position[id_]
+                    matrix[row] = new[i]
+                    stored_documents[row] = documents[i]
+                    stored_metadatas[row] = metadatas[i]
+                else:
+                    position[id_] = len(stored_ids)
+                    stored_ids.append(id_)
+                    stored_documents.append(documents[i])
+                    stored_metadatas.append(metadatas[i])
+                    appended.append(new[i])
+
+            if appended:
+                matrix = np.vstack([matrix, np.stack(appended)])
+            self._write(stored_ids, stored_documents, stored_metadatas, matrix)
+
+    def delete(self, ids):
+        removed = set(ids)
+        with self._write_lock:
+            stored_ids, stored_documents, stored_metadatas, matrix = self._rows()
+            keep = [row for row, id_ in enumerate(stored_ids) if id_ not in removed]
+            self._write(
+                [stored_ids[row] for row in keep],
+                [stored_documents[row] for row in keep],
+                [stored_metadatas[row] for row in keep],
+                matrix[keep]
+            )
+
+    def count(self) -> int:
+        return len(self._load()[0])
+
+    def query(self, query_embeddings, n_results):
+        ids, documents, columns, matrix = self._load()
+        if not ids:
+            return [[] for _ in query_embeddings]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        # Every query against every example in one product
+        cosine = queries @ matrix.T
+        k = min(n_results, len(ids))
+        top = np.argpartition(-cosine, k - 1, axis=1)[:, :k]
+
+        matches = []
+        for q in range(len(queries)):
+            order = top[q][np.argsort(-cosine[q, top[q]])]
+            matches.append([
+                # Unit vectors: 1 - squared L2 distance = 2 * cosine - 1 (Chroma's scale)
+                (ids[row], documents[row], self._metadata(columns, row), float(2 * cosine[q, row] - 1))
+                for row in order
+            ])
+        return matches
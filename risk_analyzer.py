@@ -3,38 +3,39 @@ Pass 2: Risk Analysis - Identify issues within a single SOW
 """
 import os
 import json
-from anthropic import Anthropic
+from typing import Tuple
 from dotenv import load_dotenv
+from llm_gateway import complete, complete_async, estimate_tokens, DEFAULT_MODEL
+from sow_rules import run_rule_checks
+from structured_output import make_tool
+from pattern_library import LIBRARY_GUIDANCE
 
 load_dotenv()
 
-# Initialize Anthropic client
-client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# Token budget for the extracted SOW data sent to risk analysis
+ANALYSIS_DATA_TOKEN_BUDGET = int(os.getenv("ANALYSIS_DATA_TOKEN_BUDGET", 6000))
 
-ANALYSIS_PROMPT = """You are a government procurement analyst reviewing a contract SOW for risks and weaknesses.
+# Never sent to Claude (raw_text is the whole document again; the rest is bookkeeping)
+EXCLUDED_FIELDS = {"raw_text", "extraction_segments"}
 
-Review the extracted SOW data below:
+# Values that tell Claude nothing
+EMPTY_VALUES = (None, "", "NOT_FOUND", "null", [], {})
 
-<sow_data>
-{sow_data}
-</sow_data>
+# Per-item fields dropped first when the data is over budget (lowest value first)
+LOW_VALUE_FIELDS = ["confidence", "reference", "distribution", "format", "measures"]
 
-Analyze for the following issues:
+# Then long strings are cut to these lengths, one step at a time
+STRING_LIMITS = [600, 300, 150]
+
+ANALYSIS_PROMPT = """You are a government procurement analyst reviewing a contract SOW for risks and weaknesses.
 
-1. WEAK OR UNMEASURABLE KPIs
-Check each KPI/performance metric for:
-- [X] Missing baseline (e.g., "improve satisfaction" but no current score)
-- [X] Missing target (e.g., "increase uptime" but no percentage goal)
-- [X] Missing timeframe (e.g., "reduce wait times" but no deadline)
-- [X] Missing measurement method (e.g., "improve satisfaction" but no survey/tool specified)
-- [X] Vague language (e.g., "enhance", "improve", "optimize", "target levels", "acceptable", "reasonable" without specifics)
+The extracted SOW data is provided in the user message inside <sow_data> tags.
 
-For each weak KPI:
-- Severity: HIGH (completely unmeasurable) / MEDIUM (partially measurable) / LOW (minor gaps)
-- What's missing (baseline, target, timeframe, method)
-- Risk to contract oversight
+Weak KPIs, missing sections and structural red flags (Task 0, final report,
+kick-off meeting, key personnel, progress reporting) are checked separately.
+Analyze the data for the following issues only:
 
-2. SCOPE CREEP LANGUAGE
+1. SCOPE CREEP LANGUAGE
 Flag phrases in task descriptions that create open-ended obligations:
 - "ongoing support", "as needed", "as required", "as directed"
 - "reasonable effort", "best effort", "appropriate support", "reasonable assistance"
@@ -47,17 +48,12 @@ For each instance:
 - Why it's problematic
 - Estimated financial risk (e.g., could lead to unbounded billing)
 
-3. MISSING CRITICAL ELEMENTS
-Check if SOW is missing:
-- Acceptance criteria (how will deliverables be approved/rejected?)
+2. MISSING CRITICAL ELEMENTS
+Check only whether the SOW is missing:
 - Assumptions (what conditions must be true for success?)
 - Roles and responsibilities (who does what - contractor vs government)
-- Government furnished resources (is it clear what gov provides?)
-- Out-of-scope statement (what contractor is NOT responsible for)
-- Progress reporting requirements
-- Contractor project manager designation
 
-4. INTERNAL INCONSISTENCIES
+3. INTERNAL INCONSISTENCIES
 Cross-check within the same document:
 - Do all objectives have corresponding tasks/deliverables?
 - Do all deliverables tie back to an objective or task?
@@ -65,41 +61,24 @@ Cross-check within the same document:
 - Are due dates realistic based on dependencies?
 - Do reporting requirements specify frequency and format?
 
-5. DELIVERABLE QUALITY ISSUES
+4. DELIVERABLE QUALITY ISSUES
 Flag deliverables that are:
 - Too vague (e.g., "provide support" vs "submit monthly status report")
 - Missing format/content requirements
 - Missing due dates or milestones
 - Missing acceptance criteria
 
-6. COMMON RED FLAGS IN GOVERNMENT CONTRACTS
-- Task 0 (Project Management) missing or weak
-- No final report requirement
-- No kick-off meeting requirement
-- Progress reports not specified (should be quarterly minimum)
-- No key personnel identified
-- Security/clearance requirements unclear
-
-For each finding, BE CONCISE. Keep descriptions to 1-2 sentences maximum.
+""" + LIBRARY_GUIDANCE + """For each finding, BE CONCISE. Keep descriptions to 1-2 sentences maximum.
 
 IMPORTANT JSON RULES:
 1. Use ONLY straight ASCII quotes (") for JSON structure
 2. When quoting text WITHIN a string value, use SINGLE quotes (') not double quotes
-3. Example: "issue": "The KPI lacks a 'specific target' and 'measurement method'"
+3. Example: "issue": "The deliverable lacks a 'due date' and 'format'"
 4. NEVER use nested double quotes like "issue": "lacks "target"" - this breaks JSON
 
 Return ONLY valid JSON with no additional text. Use this structure:
 
 {
-  "weak_kpis": [
-    {
-      "text": "string",
-      "location": "string",
-      "severity": "HIGH/MEDIUM/LOW",
-      "missing": ["baseline/target/timeframe/method"],
-      "issue": "1-2 sentence summary"
-    }
-  ],
   "scope_creep": [
     {
       "text": "string",
@@ -128,17 +107,175 @@ Return ONLY valid JSON with no additional text. Use this structure:
       "severity": "HIGH/MEDIUM/LOW",
       "issue": "1-2 sentence summary"
     }
-  ],
-  "red_flags": [
-    {
-      "flag": "string",
-      "severity": "HIGH/MEDIUM/LOW"
-    }
   ]
 }"""
 
+# Variable part of the analysis request (ANALYSIS_PROMPT is sent as a
+# prompt-cached system prefix)
+ANALYSIS_INPUT = """Review the extracted SOW data below:
+
+<sow_data>
+{sow_data}
+</sow_data>"""
+
+
+_SEVERITY = {"type": "string", "enum": ["HIGH", "MEDIUM", "LOW"]}
+
+
+def _findings(fields: dict, required: list) -> dict:
+    """Schema for a list of findings with the given string fields plus severity"""
+    properties = {name: {"type": ["string", "null"]} for name in fields}
+    properties["severity"] = _SEVERITY
+    return {
+        "type": "array",
+        "items": {"type": "object", "properties": properties, "required": required + ["severity"]}
+    }
+
+
+# Schema of the risk analysis answer (structured output via tool use)
+ANALYSIS_TOOL = make_tool(
+    "record_risk_findings",
+    "Record the risk findings for the SOW, using the structure described in the instructions.",
+    {
+        "type": "object",
+        "properties": {
+            "scope_creep": _findings(["text", "location", "issue"], ["text"]),
+            "missing_elements": _findings(["element"], ["element"]),
+            "inconsistencies": _findings(["type", "issue"], ["issue"]),
+            "deliverable_issues": _findings(["name", "location", "issue"], ["issue"])
+        },
+        "required": ["scope_creep", "missing_elements", "inconsistencies", "deliverable_issues"]
+    }
+)
+
+
+def _prune(value):
+    """Recursively drop empty values and excluded fields"""
+    if isinstance(value, dict):
+        pruned = {}
+        for key, item in value.items():
+            if key in EXCLUDED_FIELDS:
+                continue
+            item = _prune(item)
+            if item not in EMPTY_VALUES:
+                pruned[key] = item
+        return pruned
+    if isinstance(value, list):
+        return [item for item in (_prune(item) for item in value) if item not in EMPTY_VALUES]
+    return value
+
+
+def _drop_field(value, field: str):
+    """Remove a field from every dict nested in value"""
+    if isinstance(value, dict):
+        return {key: _drop_field(item, field) for key, item in value.items() if key != field}
+    if isinstance(value, list):
+        return [_drop_field(item, field) for item in value]
+    return value
+
+
+def _cap_strings(value, limit: int):
+    """Truncate every string nested in value to limit characters"""
+    if isinstance(value, dict):
+        return {key: _cap_strings(item, limit) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_cap_strings(item, limit) for item in value]
+    if isinstance(value, str) and len(value) > limit:
+        return value[:limit] + "..."
+    return value
+
+
+def _minify(data) -> str:
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+
+def compact_sow_data(extracted_data: dict, token_budget: int = ANALYSIS_DATA_TOKEN_BUDGET) -> Tuple[str, dict]:
+    """
+    Serialize extracted SOW data for the risk analysis prompt
+
+    Drops raw_text and empty/NOT_FOUND fields and minifies the JSON. If the
+    result is still over token_budget, low-value fields are removed, then
+    long strings are shortened, then trailing items of the longest lists
+    are dropped, until it fits.
+
+    Args:
+        extracted_data: Dictionary from Pass 1 (sow_extractor.py)
+        token_budget: Maximum estimated tokens for the serialized data
+
+    Returns:
+        (compact JSON string, stats) where stats has the estimated token
+        counts before and after compaction and the trimming steps applied
+    """
+    tokens_before = estimate_tokens(json.dumps(extracted_data, indent=2))
+    trimmed = []
+
+    data = _prune(extracted_data)
+    sow_data_str = _minify(data)
+
+    for field in LOW_VALUE_FIELDS:
+        if estimate_tokens(sow_data_str) <= token_budget:
+            break
+        data = _drop_field(data, field)
+        shorter = _minify(data)
+        if shorter != sow_data_str:
+            trimmed.append(f"dropped {field}")
+        sow_data_str = shorter
+
+    for limit in STRING_LIMITS:
+        if estimate_tokens(sow_data_str) <= token_budget:
+            break
+        data = _cap_strings(data, limit)
+        shorter = _minify(data)
+        if shorter != sow_data_str:
+            trimmed.append(f"strings capped at {limit} chars")
+        sow_data_str = shorter
+
+    # Last resort: shorten the longest top-level lists from the end
+    dropped_items = 0
+    while estimate_tokens(sow_data_str) > token_budget:
+        lists = [key for key, item in data.items() if isinstance(item, list) and len(item) > 1]
+        if not lists:
+            break
+        longest = max(lists, key=lambda key: len(data[key]))
+        data[longest] = data[longest][:-1]
+        sow_data_str = _minify(data)
+        dropped_items += 1
+    if dropped_items:
+        trimmed.append(f"dropped {dropped_items} list items")
+
+    stats = {
+        "tokens_before": tokens_before,
+        "tokens_after": estimate_tokens(sow_data_str),
+        "token_budget": token_budget,
+        "trimmed": trimmed
+    }
+    return sow_data_str, stats
+
+
+def merge_rule_findings(analysis: dict, rule_findings: dict) -> dict:
+    """
+    Combine Claude's findings with the rule-based ones (sow_rules.py)
+
+    Rule findings come first; Claude's missing_elements are kept unless a
+    rule already reported the same element.
+
+    Args:
+        analysis: Parsed risk analysis response
+        rule_findings: Result of run_rule_checks
+
+    Returns:
+        The analysis dict, with every finding category filled in
+    """
+    for category, findings in rule_findings.items():
+        extra = analysis.get(category) or []
+        if category == 'missing_elements':
+            reported = {f['element'].lower() for f in findings}
+            extra = [f for f in extra if str(f.get('element', '')).lower() not in reported]
+        analysis[category] = findings + extra
+    return analysis
+
 
-def analyze_sow(extracted_data: dict, model: str = "claude-3-haiku-20240307") -> dict:
+def analyze_sow(extracted_data: dict, model: str = DEFAULT_MODEL) -> dict:
     """
     Analyze extracted SOW data for risks and weaknesses
 
@@ -147,29 +284,83 @@ def analyze_sow(extracted_data: dict, model: str = "claude-3-haiku-20240307") ->
         model: Claude model to use
 
     Returns:
-        Dictionary with risk findings
+        Dictionary with risk findings (weak_kpis, missing_elements and
+        red_flags from sow_rules), plus prompt_compaction token counts
+    """
+    # Weak KPIs, missing sections and structural red flags need no Claude call
+    rule_findings = run_rule_checks(extracted_data)
+
+    # Compact JSON of the extracted data (no raw_text, no empty fields)
+    sow_data_str, compaction = compact_sow_data(extracted_data)
+    prompt = ANALYSIS_INPUT.replace("{sow_data}", sow_data_str)
+
+    print(f"Analyzing SOW for risks...")
+    print(f"Contract: {extracted_data.get('metadata', {}).get('contract_id', 'Unknown')}")
+    print(f"SOW data: ~{compaction['tokens_before']} -> ~{compaction['tokens_after']} tokens after compaction")
+
+    analysis = complete(
+        prompt,
+        model=model,
+        max_tokens=4096,
+        temperature=0,
+        purpose="risk_analysis",
+        parse=parse_analysis_response,
+        system=ANALYSIS_PROMPT,
+        tool=ANALYSIS_TOOL
+    )
+    analysis = merge_rule_findings(analysis, rule_findings)
+    analysis['prompt_compaction'] = compaction
+    return analysis
+
+
+async def analyze_sow_async(extracted_data: dict, model: str = DEFAULT_MODEL) -> dict:
     """
-    # Convert extracted data to JSON string for prompt
-    sow_data_str = json.dumps(extracted_data, indent=2)
-    prompt = ANALYSIS_PROMPT.replace("{sow_data}", sow_data_str)
+    Async version of analyze_sow (does not block the event loop)
+
+    Args:
+        extracted_data: Dictionary from Pass 1 (sow_extractor.py)
+        model: Claude model to use
+
+    Returns:
+        Dictionary with risk findings (weak_kpis, missing_elements and
+        red_flags from sow_rules), plus prompt_compaction token counts
+    """
+    # Weak KPIs, missing sections and structural red flags need no Claude call
+    rule_findings = run_rule_checks(extracted_data)
+
+    # Compact JSON of the extracted data (no raw_text, no empty fields)
+    sow_data_str, compaction = compact_sow_data(extracted_data)
+    prompt = ANALYSIS_INPUT.replace("{sow_data}", sow_data_str)
 
     print(f"Analyzing SOW for risks...")
     print(f"Contract: {extracted_data.get('metadata', {}).get('contract_id', 'Unknown')}")
+    print(f"SOW data: ~{compaction['tokens_before']} -> ~{compaction['tokens_after']} tokens after compaction")
 
-    message = client.messages.create(
+    analysis = await complete_async(
+        prompt,
         model=model,
         max_tokens=4096,
         temperature=0,
-        messages=[
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
+        purpose="risk_analysis",
+        parse=parse_analysis_response,
+        system=ANALYSIS_PROMPT,
+        tool=ANALYSIS_TOOL
     )
+    analysis = merge_rule_findings(analysis, rule_findings)
+    analysis['prompt_compaction'] = compaction
+    return analysis
 
-    response_text = message.content[0].text
 
+def parse_analysis_response(response_text: str) -> dict:
+    """
+    Parse Claude's risk analysis response into a dictionary
+
+    Args:
+        response_text: Raw text returned by Claude
+
+    Returns:
+        Dictionary with risk findings
+    """
     # Fix curly quotes (convert to straight quotes for JSON compatibility)
     response_bytes = response_text.encode('utf-8')
     response_bytes = response_bytes.replace(b'\xe2\x80\x9c', b'"')  # "
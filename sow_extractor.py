@@ -2,14 +2,21 @@
 Pass 1: SOW Extraction - Convert unstructured SOW to structured JSON
 """
 import os
+import re
 import json
-from anthropic import Anthropic
+import asyncio
+from typing import List
 from dotenv import load_dotenv
+from llm_gateway import complete, complete_async, estimate_tokens, DEFAULT_MODEL
+from cpu_pool import run_in_pool
+from chunker import PAGE_MARKER_RE, HEADING_RE
+from structured_output import make_tool
 
 load_dotenv()
 
-# Initialize Anthropic client
-client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# Documents longer than this (estimated tokens) are extracted segment by
+# segment in parallel and merged, instead of in one call
+EXTRACTION_SEGMENT_TOKENS = int(os.getenv("EXTRACTION_SEGMENT_TOKENS", 12000))
 
 EXTRACTION_PROMPT = """You are analyzing a government contract Statement of Work (SOW).
 
@@ -157,15 +164,107 @@ Return ONLY valid JSON with no additional text. Use this structure:
   }
 }
 
-<document>
+The SOW document is provided in the user message inside <document> tags."""
+
+# Variable part of the extraction request (EXTRACTION_PROMPT is sent as a
+# prompt-cached system prefix)
+EXTRACTION_INPUT = """<document>
 {document_text}
 </document>"""
 
+_STRING = {"type": ["string", "null"]}
+_STRINGS_OR_NOT_FOUND = {"type": ["array", "string", "null"], "items": {"type": "string"}}
+_ITEMS = {"type": "array", "items": {"type": "object"}}
+
+# Schema of the extraction answer (structured output via tool use)
+EXTRACTION_TOOL = make_tool(
+    "record_sow_extraction",
+    "Record the structured data extracted from the SOW, using the structure described in the instructions.",
+    {
+        "type": "object",
+        "properties": {
+            "metadata": {
+                "type": "object",
+                "properties": {
+                    "contract_id": _STRING,
+                    "contractor": _STRING,
+                    "project_title": _STRING,
+                    "value": _STRING,
+                    "duration": _STRING
+                }
+            },
+            "background": {"type": ["object", "string", "null"]},
+            "objectives": _ITEMS,
+            "tasks": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "task_id": _STRING,
+                        "title": _STRING,
+                        "description": _STRING,
+                        "deliverables": _STRINGS_OR_NOT_FOUND,
+                        "schedule": _STRING,
+                        "reference": _STRING
+                    }
+                }
+            },
+            "kpis": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "text": _STRING,
+                        "measures": _STRING,
+                        "target": _STRING,
+                        "baseline": _STRING,
+                        "timeframe": _STRING,
+                        "measurement_method": _STRING,
+                        "reference": _STRING
+                    }
+                }
+            },
+            "deliverables": _ITEMS,
+            "scope": {
+                "type": ["object", "string", "null"],
+                "properties": {
+                    "in_scope": _STRINGS_OR_NOT_FOUND,
+                    "out_of_scope": _STRINGS_OR_NOT_FOUND
+                }
+            },
+            "personnel_requirements": {
+                "type": ["object", "string", "null"],
+                "properties": {
+                    "qualifications": _STRINGS_OR_NOT_FOUND,
+                    "key_personnel": _STRINGS_OR_NOT_FOUND,
+                    "project_manager_required": {"type": ["boolean", "null"]},
+                    "clearance_level": _STRING
+                }
+            },
+            "other_requirements": {
+                "type": ["object", "string", "null"],
+                "properties": {
+                    "security": _STRING,
+                    "travel": _STRING,
+                    "progress_reporting": _STRING,
+                    "government_furnished": _STRINGS_OR_NOT_FOUND,
+                    "section_508": _STRING,
+                    "acceptance_criteria": _STRING
+                }
+            }
+        },
+        "required": ["metadata", "tasks", "kpis", "deliverables"]
+    }
+)
+
 
-def extract_sow_data(document_text: str, model: str = "claude-3-haiku-20240307") -> dict:
+def extract_sow_data(document_text: str, model: str = DEFAULT_MODEL) -> dict:
     """
     Extract structured data from SOW document text using Claude
 
+    Documents over EXTRACTION_SEGMENT_TOKENS are split into segments that
+    are extracted separately and merged (see extract_segmented_async).
+
     Args:
         document_text: Full text of the SOW document
         model: Claude model to use
@@ -173,25 +272,256 @@ def extract_sow_data(document_text: str, model: str = "claude-3-haiku-20240307")
     Returns:
         Dictionary with extracted structured data
     """
-    prompt = EXTRACTION_PROMPT.replace("{document_text}", document_text)
+    if estimate_tokens(document_text) > EXTRACTION_SEGMENT_TOKENS:
+        return extract_segmented(split_into_segments(document_text), model)
+
+    prompt = EXTRACTION_INPUT.replace("{document_text}", document_text)
 
     print(f"Calling Claude API for extraction...")
     print(f"Document length: {len(document_text)} characters")
 
-    message = client.messages.create(
+    return complete(
+        prompt,
         model=model,
         max_tokens=4096,
         temperature=0,
-        messages=[
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
+        purpose="extraction",
+        parse=parse_extraction_response,
+        system=EXTRACTION_PROMPT,
+        tool=EXTRACTION_TOOL
+    )
+
+
+async def extract_sow_data_async(document_text: str, model: str = DEFAULT_MODEL) -> dict:
+    """
+    Async version of extract_sow_data (does not block the event loop)
+
+    Args:
+        document_text: Full text of the SOW document
+        model: Claude model to use
+
+    Returns:
+        Dictionary with extracted structured data
+    """
+    if estimate_tokens(document_text) > EXTRACTION_SEGMENT_TOKENS:
+        segments = await run_in_pool(split_into_segments, document_text)
+        return await extract_segmented_async(segments, model)
+
+    prompt = EXTRACTION_INPUT.replace("{document_text}", document_text)
+
+    print(f"Calling Claude API for extraction...")
+    print(f"Document length: {len(document_text)} characters")
+
+    return await complete_async(
+        prompt,
+        model=model,
+        max_tokens=4096,
+        temperature=0,
+        purpose="extraction",
+        parse=parse_extraction_response,
+        system=EXTRACTION_PROMPT,
+        tool=EXTRACTION_TOOL
     )
 
-    response_text = message.content[0].text
 
+def split_into_segments(document_text: str, max_tokens: int = EXTRACTION_SEGMENT_TOKENS) -> List[str]:
+    """
+    Split a long document into extraction segments of at most max_tokens
+
+    The text is cut at [Page N] markers (PDFs) or section headings, and
+    consecutive pieces are packed together up to the size limit. Pieces
+    that are still too long are split on blank lines, then by length.
+
+    Args:
+        document_text: Full text of the SOW document
+        max_tokens: Maximum estimated tokens per segment
+
+    Returns:
+        List of segment texts in document order
+    """
+    max_chars = max_tokens * 4
+
+    boundary_re = PAGE_MARKER_RE if PAGE_MARKER_RE.search(document_text) else HEADING_RE
+    starts = sorted({0} | {match.start() for match in boundary_re.finditer(document_text)})
+    pieces = [document_text[start:end] for start, end in zip(starts, starts[1:] + [len(document_text)])]
+
+    # Break up oversized pieces
+    sized = []
+    for piece in pieces:
+        if len(piece) <= max_chars:
+            sized.append(piece)
+            continue
+        for paragraph in re.split(r'(?<=\n)\s*\n', piece):
+            for i in range(0, len(paragraph), max_chars):
+                sized.append(paragraph[i:i + max_chars])
+
+    # Pack pieces into segments
+    segments = []
+    current = ""
+    for piece in sized:
+        if current and len(current) + len(piece) > max_chars:
+            segments.append(current)
+            current = ""
+        current += piece
+    if current.strip():
+        segments.append(current)
+
+    return [segment for segment in segments if segment.strip()]
+
+
+def _is_empty(value) -> bool:
+    return value in (None, "", "NOT_FOUND", "null", [], {})
+
+
+def _dedupe_key(value) -> str:
+    return re.sub(r'\s+', ' ', str(value)).strip().lower()
+
+
+def _merge_values(first, second):
+    """Combine two extracted values: keep the first informative one, union lists"""
+    if _is_empty(first):
+        return second
+    if _is_empty(second):
+        return first
+    if isinstance(first, list) and isinstance(second, list):
+        merged = list(first)
+        seen = {_dedupe_key(item) for item in first}
+        for item in second:
+            if _dedupe_key(item) not in seen:
+                seen.add(_dedupe_key(item))
+                merged.append(item)
+        return merged
+    if isinstance(first, dict) and isinstance(second, dict):
+        merged = dict(first)
+        for key, value in second.items():
+            merged[key] = _merge_values(first.get(key), value)
+        return merged
+    if isinstance(first, bool) and isinstance(second, bool):
+        return first or second
+    return first
+
+
+def _merge_items(items: List[dict], key_field: str) -> List[dict]:
+    """Deduplicate list entries by key_field, merging the fields of duplicates"""
+    merged = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        key = _dedupe_key(item.get(key_field) or item)
+        merged[key] = _merge_values(merged[key], item) if key in merged else item
+    return list(merged.values())
+
+
+# List sections of the extraction schema and the field that identifies an entry
+LIST_SECTION_KEYS = {
+    "objectives": "text",
+    "tasks": "task_id",
+    "kpis": "text",
+    "deliverables": "name"
+}
+
+
+def merge_extractions(parts: List[dict]) -> dict:
+    """
+    Merge per-segment extractions into one result with the usual schema
+
+    Segments are merged in document order, so the result is deterministic:
+    scalar fields keep the first informative value, list fields are unioned,
+    and tasks/KPIs/deliverables/objectives are deduplicated by task_id,
+    text or name (duplicates found in several segments are combined).
+
+    Args:
+        parts: Extraction results, one per segment, in document order
+
+    Returns:
+        Dictionary with extracted structured data
+    """
+    merged = {}
+    for part in parts:
+        for key, value in part.items():
+            if key in LIST_SECTION_KEYS and isinstance(value, list):
+                merged[key] = merged.get(key, []) + value
+            else:
+                merged[key] = _merge_values(merged.get(key), value)
+
+    for key, key_field in LIST_SECTION_KEYS.items():
+        if key in merged:
+            merged[key] = _merge_items(merged[key], key_field)
+
+    return merged
+
+
+def extract_segmented(segments: List[str], model: str = DEFAULT_MODEL) -> dict:
+    """
+    Extract each segment of a long document and merge the results
+
+    Synchronous entry point for CLI use; runs extract_segmented_async.
+    """
+    return asyncio.run(extract_segmented_async(segments, model))
+
+
+async def extract_segmented_async(segments: List[str], model: str = DEFAULT_MODEL) -> dict:
+    """
+    Extract all segments of a long document in parallel and merge the results
+
+    Segments share the cached extraction prompt prefix, and the gateway
+    bounds how many run at once, so latency follows the longest segment
+    rather than the whole document.
+
+    Args:
+        segments: Segment texts from split_into_segments
+        model: Claude model to use
+
+    Returns:
+        Merged dictionary with extracted structured data
+
+    Raises:
+        The first segment error, if every segment failed
+    """
+    print(f"Extracting {len(segments)} segments in parallel...")
+
+    results = await asyncio.gather(
+        *(
+            complete_async(
+                EXTRACTION_INPUT.replace("{document_text}", segment),
+                model=model,
+                max_tokens=4096,
+                temperature=0,
+                purpose="extraction",
+                parse=parse_extraction_response,
+                system=EXTRACTION_PROMPT,
+                tool=EXTRACTION_TOOL
+            )
+            for segment in segments
+        ),
+        return_exceptions=True
+    )
+
+    parts = []
+    for i, result in enumerate(results, 1):
+        if isinstance(result, Exception):
+            print(f"[WARNING] Segment {i}/{len(segments)} extraction failed: {result}")
+        else:
+            parts.append(result)
+
+    if not parts:
+        raise results[0]
+
+    merged = merge_extractions(parts)
+    merged['extraction_segments'] = {"total": len(segments), "failed": len(segments) - len(parts)}
+    return merged
+
+
+def parse_extraction_response(response_text: str) -> dict:
+    """
+    Parse Claude's extraction response into a dictionary
+
+    Args:
+        response_text: Raw text returned by Claude
+
+    Returns:
+        Dictionary with extracted structured data
+    """
     # Parse JSON response - handle cases where Claude adds explanatory text before/after JSON
     try:
         # Try direct parsing first
@@ -239,37 +569,74 @@ def extract_sow_data(document_text: str, model: str = "claude-3-haiku-20240307")
             raise
 
 
-def extract_from_file(file_path: str) -> dict:
+SUPPORTED_EXTENSIONS = ['.pdf', '.docx', '.txt']
+
+
+def read_document_bytes(content: bytes, file_ext: str) -> str:
     """
-    Extract structured data from SOW file (PDF or DOCX)
+    Parse SOW document text straight from an in-memory buffer
 
     Args:
-        file_path: Path to SOW document
+        content: Raw file bytes
+        file_ext: Lower-cased file extension ('.pdf', '.docx' or '.txt')
 
     Returns:
-        Dictionary with extracted structured data
+        Document text (PDF pages are prefixed with [Page N] markers)
     """
     # Import document parsing utilities
-    if file_path.lower().endswith('.pdf'):
+    if file_ext == '.pdf':
         import fitz  # PyMuPDF
-        doc = fitz.open(file_path)
+        doc = fitz.open(stream=content, filetype="pdf")
         text_parts = []
         for page_num, page in enumerate(doc, start=1):
             text = page.get_text()
             text_parts.append(f"[Page {page_num}]\n{text}")
         doc.close()
         document_text = "\n\n".join(text_parts)
-    elif file_path.lower().endswith('.docx'):
+    elif file_ext == '.docx':
+        from io import BytesIO
         from docx import Document
-        doc = Document(file_path)
+        doc = Document(BytesIO(content))
         paragraphs = [para.text for para in doc.paragraphs if para.text.strip()]
         document_text = "\n\n".join(paragraphs)
-    elif file_path.lower().endswith('.txt'):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            document_text = f.read()
+    elif file_ext == '.txt':
+        document_text = content.decode('utf-8', errors='ignore')
     else:
+        raise ValueError(f"Unsupported file type: {file_ext}")
+
+    return document_text
+
+
+def read_document_text(file_path: str) -> str:
+    """
+    Read the text content of a SOW file (PDF, DOCX or TXT)
+
+    Args:
+        file_path: Path to SOW document
+
+    Returns:
+        Document text (PDF pages are prefixed with [Page N] markers)
+    """
+    file_ext = os.path.splitext(file_path)[1].lower()
+    if file_ext not in SUPPORTED_EXTENSIONS:
         raise ValueError(f"Unsupported file type: {file_path}")
 
+    with open(file_path, 'rb') as f:
+        return read_document_bytes(f.read(), file_ext)
+
+
+def extract_from_file(file_path: str) -> dict:
+    """
+    Extract structured data from SOW file (PDF or DOCX)
+
+    Args:
+        file_path: Path to SOW document
+
+    Returns:
+        Dictionary with extracted structured data
+    """
+    document_text = read_document_text(file_path)
+
     print(f"\nProcessing: {file_path}")
 
     # Extract structured data
@@ -281,6 +648,34 @@ def extract_from_file(file_path: str) -> dict:
     return extracted_data
 
 
+async def extract_from_bytes_async(content: bytes, filename: str) -> dict:
+    """
+    Extract structured data from an uploaded SOW held in memory
+
+    Document parsing runs on the bounded CPU pool and the Claude call uses
+    the async client, so the event loop stays free.
+
+    Args:
+        content: Raw file bytes
+        filename: Original filename (its extension selects the parser)
+
+    Returns:
+        Dictionary with extracted structured data
+    """
+    file_ext = os.path.splitext(filename)[1].lower()
+    document_text = await run_in_pool(read_document_bytes, content, file_ext)
+
+    print(f"\nProcessing: {filename}")
+
+    # Extract structured data
+    extracted_data = await extract_sow_data_async(document_text)
+
+    # Add raw text for RAG analysis
+    extracted_data['raw_text'] = document_text
+
+    return extracted_data
+
+
 if __name__ == "__main__":
     # Test with a sample SOW file
     import sys
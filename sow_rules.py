@@ -0,0 +1,205 @@
+"""
+Rule-based checks on extracted SOW data (no API calls)
+
+Weak KPIs, missing critical elements and the structural red flags (no
+Task 0, no final report, no kick-off meeting, no key personnel, ...) can
+be read straight off the JSON that sow_extractor returns: a KPI without a
+target is a null field, a missing acceptance criteria section is a
+NOT_FOUND marker. These categories are computed here, so risk analysis
+only asks Claude for the ones that need judgement.
+"""
+import re
+from typing import List, Dict
+
+# Strings sow_extractor uses for "not in the document" (compared lower-cased)
+NOT_FOUND_STRINGS = ("", "not_found", "null", "none", "n/a")
+
+# KPI fields checked for weak_kpis, with how they are reported in "missing"
+KPI_FIELDS = [
+    ("target", "target"),
+    ("baseline", "baseline"),
+    ("timeframe", "timeframe"),
+    ("measurement_method", "method"),
+]
+
+# Vague verbs that make a KPI unmeasurable when it has no target
+VAGUE_KPI_RE = re.compile(
+    r'\b(?:improve|enhance|optimi[sz]e|increase|reduce|maximi[sz]e|minimi[sz]e|acceptable|reasonable|adequate)\w*',
+    re.IGNORECASE
+)
+
+# (path into extracted data, element name, severity)
+REQUIRED_ELEMENTS = [
+    (("other_requirements", "acceptance_criteria"), "Acceptance criteria", "HIGH"),
+    (("other_requirements", "progress_reporting"), "Progress reporting requirements", "HIGH"),
+    (("other_requirements", "government_furnished"), "Government furnished resources", "MEDIUM"),
+    (("scope", "out_of_scope"), "Out-of-scope statement", "MEDIUM"),
+]
+
+TASK_ZERO_RE = re.compile(r'^\s*(?:task\s*)?0(?:\.0)?\s*$|project\s+management', re.IGNORECASE)
+FINAL_REPORT_RE = re.compile(r'\bfinal\s+(?:technical\s+|project\s+)?report\b', re.IGNORECASE)
+KICKOFF_RE = re.compile(r'\bkick[\s-]?off\b', re.IGNORECASE)
+REPORT_FREQUENCY_RE = re.compile(
+    r'\b(?:daily|weekly|bi-?weekly|monthly|bi-?monthly|quarterly|semi-?annual(?:ly)?|annual(?:ly)?|'
+    r'every\s+\w+\s+(?:days?|weeks?|months?))\b',
+    re.IGNORECASE
+)
+
+
+def _missing(value) -> bool:
+    """True for null, empty and NOT_FOUND values"""
+    if isinstance(value, str):
+        return value.strip().lower() in NOT_FOUND_STRINGS
+    return value is None or value == [] or value == {}
+
+
+def _get(data: dict, path: tuple):
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def _as_list(value) -> list:
+    if _missing(value):
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _task_text(extracted_data: dict) -> List[str]:
+    """Every task id/title/description/deliverable and deliverable name, for keyword checks"""
+    texts = []
+    for task in _as_list(extracted_data.get("tasks")):
+        if isinstance(task, dict):
+            texts.extend(str(task.get(field) or "") for field in ("task_id", "title", "description"))
+            texts.extend(str(item) for item in _as_list(task.get("deliverables")))
+    for deliverable in _as_list(extracted_data.get("deliverables")):
+        if isinstance(deliverable, dict):
+            texts.append(str(deliverable.get("name") or ""))
+    return texts
+
+
+def check_kpis(kpis: list) -> List[Dict]:
+    """
+    Find KPIs missing a target, baseline, timeframe or measurement method
+
+    Severity is HIGH when the KPI cannot be measured at all (no target and
+    no method), MEDIUM when two or more fields are missing, LOW otherwise.
+
+    Args:
+        kpis: "kpis" list from extracted data
+
+    Returns:
+        weak_kpis findings (text, location, severity, missing, issue)
+    """
+    findings = []
+    for kpi in _as_list(kpis):
+        if not isinstance(kpi, dict):
+            continue
+
+        missing = [label for field, label in KPI_FIELDS if _missing(kpi.get(field))]
+        if not missing:
+            continue
+
+        text = kpi.get("text") or ""
+        if "target" in missing and "method" in missing:
+            severity = "HIGH"
+        elif len(missing) >= 2:
+            severity = "MEDIUM"
+        else:
+            severity = "LOW"
+
+        issue = f"KPI has no {', '.join(missing)}."
+        vague = VAGUE_KPI_RE.search(text)
+        if vague and "target" in missing:
+            issue += f" '{vague.group(0)}' is not measurable without a target."
+
+        findings.append({
+            "text": text,
+            "location": kpi.get("reference") or "Unknown",
+            "severity": severity,
+            "missing": missing,
+            "issue": issue
+        })
+    return findings
+
+
+def check_missing_elements(extracted_data: dict) -> List[Dict]:
+    """
+    Find critical SOW sections that extraction marked NOT_FOUND
+
+    Args:
+        extracted_data: Dictionary from Pass 1 (sow_extractor.py)
+
+    Returns:
+        missing_elements findings (element, severity)
+    """
+    findings = [
+        {"element": element, "severity": severity}
+        for path, element, severity in REQUIRED_ELEMENTS
+        if _missing(_get(extracted_data, path))
+    ]
+
+    personnel = extracted_data.get("personnel_requirements") or {}
+    if isinstance(personnel, dict) and personnel.get("project_manager_required") is not True:
+        findings.append({"element": "Contractor project manager designation", "severity": "MEDIUM"})
+
+    return findings
+
+
+def check_red_flags(extracted_data: dict) -> List[Dict]:
+    """
+    Structural red flags common in government contracts
+
+    Args:
+        extracted_data: Dictionary from Pass 1 (sow_extractor.py)
+
+    Returns:
+        red_flags findings (flag, severity)
+    """
+    findings = []
+    tasks = [task for task in _as_list(extracted_data.get("tasks")) if isinstance(task, dict)]
+    task_text = "\n".join(_task_text(extracted_data))
+
+    if not any(TASK_ZERO_RE.search(str(task.get("task_id") or "")) or
+               TASK_ZERO_RE.search(str(task.get("title") or "")) for task in tasks):
+        findings.append({"flag": "Task 0 (Project Management) missing", "severity": "HIGH"})
+
+    if not FINAL_REPORT_RE.search(task_text):
+        findings.append({"flag": "No final report requirement", "severity": "HIGH"})
+
+    if not KICKOFF_RE.search(task_text):
+        findings.append({"flag": "No kick-off meeting requirement", "severity": "MEDIUM"})
+
+    reporting = _get(extracted_data, ("other_requirements", "progress_reporting"))
+    if not _missing(reporting) and not REPORT_FREQUENCY_RE.search(str(reporting)):
+        findings.append({"flag": "Progress report frequency not specified (should be quarterly minimum)",
+                         "severity": "MEDIUM"})
+
+    if _missing(_get(extracted_data, ("personnel_requirements", "key_personnel"))):
+        findings.append({"flag": "No key personnel identified", "severity": "MEDIUM"})
+
+    security = _get(extracted_data, ("other_requirements", "security"))
+    clearance = _get(extracted_data, ("personnel_requirements", "clearance_level"))
+    if _missing(security) and _missing(clearance):
+        findings.append({"flag": "Security/clearance requirements unclear", "severity": "LOW"})
+
+    return findings
+
+
+def run_rule_checks(extracted_data: dict) -> Dict[str, List[Dict]]:
+    """
+    Run every rule-based check on extracted SOW data
+
+    Args:
+        extracted_data: Dictionary from Pass 1 (sow_extractor.py)
+
+    Returns:
+        Dictionary with weak_kpis, missing_elements and red_flags findings
+    """
+    return {
+        "weak_kpis": check_kpis(extracted_data.get("kpis")),
+        "missing_elements": check_missing_elements(extracted_data),
+        "red_flags": check_red_flags(extracted_data)
+    }
@@ -0,0 +1,90 @@
+"""
+Schema-constrained Claude responses
+
+Each analyzer module describes its answer as a JSON schema and passes it to
+llm_gateway.complete as a tool. Claude is forced to call that tool, so the
+answer arrives as already-parsed JSON instead of free text that needs brace
+counting and quote repair. The tool input is checked against the schema
+before it is accepted; a response that fails is retried on its own.
+
+Only the subset of JSON schema used by the analyzers is validated: type
+(including lists of types), properties, required, items and enum.
+"""
+from typing import List
+
+JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+    "null": type(None),
+}
+
+
+class SchemaError(ValueError):
+    """A structured response does not match its schema"""
+
+
+def make_tool(name: str, description: str, input_schema: dict) -> dict:
+    """Tool definition for messages.create (Claude is forced to call it)"""
+    return {"name": name, "description": description, "input_schema": input_schema}
+
+
+def _type_matches(value, type_name: str) -> bool:
+    # bool is a subclass of int, but JSON keeps them apart
+    if type_name in ("number", "integer") and isinstance(value, bool):
+        return False
+    return isinstance(value, JSON_TYPES[type_name])
+
+
+def validate_schema(value, schema: dict, path: str = "$") -> List[str]:
+    """
+    Check a value against a JSON schema
+
+    Args:
+        value: Parsed JSON value
+        schema: JSON schema (subset: type, properties, required, items, enum)
+        path: Location of value, used in error messages
+
+    Returns:
+        List of problems (empty if the value matches)
+    """
+    errors = []
+
+    types = schema.get("type")
+    if types is not None:
+        types = types if isinstance(types, list) else [types]
+        if not any(_type_matches(value, type_name) for type_name in types):
+            return [f"{path}: expected {'/'.join(types)}, got {type(value).__name__}"]
+
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {value!r} is not one of {schema['enum']}")
+
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{path}: missing '{key}'")
+        for key, subschema in schema.get("properties", {}).items():
+            if key in value:
+                errors.extend(validate_schema(value[key], subschema, f"{path}.{key}"))
+
+    if isinstance(value, list) and "items" in schema:
+        for i, item in enumerate(value):
+            errors.extend(validate_schema(item, schema["items"], f"{path}[{i}]"))
+
+    return errors
+
+
+def check_schema(value, schema: dict):
+    """
+    Raise SchemaError if value does not match schema
+
+    Raises:
+        SchemaError: With the first few problems found
+    """
+    errors = validate_schema(value, schema)
+    if errors:
+        more = f" (+{len(errors) - 3} more)" if len(errors) > 3 else ""
+        raise SchemaError("; ".join(errors[:3]) + more)
@@ -0,0 +1,94 @@
+"""
+Degraded per-file results (one-off failures) must never reach the result cache
+"""
+import asyncio
+
+import pytest
+
+import main
+
+
+SOW = {"metadata": {"contract_id": "C-1"}, "tasks": [], "raw_text": "Task 1: Build the thing."}
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Stub out Claude and record result cache writes"""
+    stored = []
+    state = {"extracted": dict(SOW), "analysis": {"scope_creep": []}, "overlap": {"overlap_percentage": 10}}
+
+    async def extract(content, filename):
+        return dict(state["extracted"])
+
+    async def analyze(extracted_data, progress_callback=None):
+        return dict(state["analysis"])
+
+    async def overlap(sow_data_list):
+        return state["overlap"]
+
+    monkeypatch.setattr(main, "RESULT_CACHE_ENABLED", True)
+    monkeypatch.setattr(main, "RAG_AVAILABLE", True)
+    monkeypatch.setattr(main, "OVERLAP_AVAILABLE", True)
+    monkeypatch.setattr(main, "get_cached_result", lambda content_hash, version: None)
+    monkeypatch.setattr(main, "store_result", lambda content_hash, version, result: stored.append(result))
+    monkeypatch.setattr(main, "extract_from_bytes_async", extract)
+    monkeypatch.setattr(main, "analyze_sow_with_rag_async", analyze, raising=False)
+    monkeypatch.setattr(main, "analyze_overlap_async", overlap, raising=False)
+    state["stored"] = stored
+    return state
+
+
+def test_clean_result_is_cached(pipeline):
+    result = asyncio.run(main.process_single_file("a.txt", b"a"))
+
+    assert result["degraded"] == []
+    assert len(pipeline["stored"]) == 1
+
+
+def test_errored_validation_is_not_cached(pipeline):
+    pipeline["analysis"] = {"scope_creep": [], "validation_errors": 2}
+
+    result = asyncio.run(main.process_single_file("a.txt", b"a"))
+
+    assert result["degraded"] == ["validation_errors"]
+    assert pipeline["stored"] == []
+
+
+def test_partial_segmented_extraction_is_not_cached(pipeline):
+    pipeline["extracted"] = dict(SOW, extraction_segments={"total": 3, "failed": 1})
+
+    result = asyncio.run(main.process_single_file("a.txt", b"a"))
+
+    assert result["degraded"] == ["extraction_segments_failed"]
+    assert pipeline["stored"] == []
+
+
+def test_rag_fallback_is_not_cached(pipeline, monkeypatch):
+    async def failing_rag(extracted_data, progress_callback=None):
+        raise RuntimeError("vector DB unavailable")
+
+    async def basic(extracted_data):
+        return {"scope_creep": []}
+
+    monkeypatch.setattr(main, "analyze_sow_with_rag_async", failing_rag)
+    monkeypatch.setattr(main, "analyze_sow_async", basic)
+
+    result = asyncio.run(main.process_single_file("a.txt", b"a"))
+
+    assert result["degraded"] == ["rag_fallback"]
+    assert pipeline["stored"] == []
+
+
+def test_multi_file_results_cached_after_overlap(pipeline):
+    asyncio.run(main.run_analysis([("a.txt", b"a"), ("b.txt", b"b")]))
+
+    assert len(pipeline["stored"]) == 2
+
+
+def test_overlap_error_skips_caching(pipeline):
+    pipeline["overlap"] = {"overlap_percentage": 0, "error": "overloaded"}
+
+    response = asyncio.run(main.run_analysis([("a.txt", b"a"), ("b.txt", b"b")]))
+
+    assert response["overlap_analysis"]["error"] == "overloaded"
+    assert pipeline["stored"] == []
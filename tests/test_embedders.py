@@ -0,0 +1,26 @@
+"""
+Embedding backends
+"""
+import numpy as np
+import pytest
+
+from embedders import Embedder, create_embedder, normalize_rows
+
+
+def test_embedder_without_encode_cannot_be_created():
+    class NoEncode(Embedder):
+        pass
+
+    with pytest.raises(TypeError):
+        NoEncode("all-MiniLM-L6-v2")
+
+
+def test_normalize_rows_keeps_zero_rows():
+    rows = normalize_rows(np.array([[3.0, 4.0], [0.0, 0.0]]))
+
+    assert rows.tolist() == [[0.6, 0.8], [0.0, 0.0]]
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        create_embedder("all-MiniLM-L6-v2", "tensorflow")
@@ -0,0 +1,79 @@
+"""
+Job queue leases: processes sharing jobs.db never run the same job twice
+"""
+import pytest
+
+import job_queue
+
+
+@pytest.fixture(autouse=True)
+def job_db(monkeypatch, tmp_path):
+    monkeypatch.setattr(job_queue, "JOB_DB_PATH", str(tmp_path / "jobs.db"))
+    job_queue.init_job_db()
+
+
+def expire_leases():
+    conn = job_queue._connect()
+    try:
+        conn.execute("UPDATE jobs SET lease_expires_at = 0 WHERE status = 'running'")
+    finally:
+        conn.close()
+
+
+def test_running_job_with_live_lease_is_not_requeued():
+    job_id = job_queue.create_job([("a.txt", b"a")])
+    assert job_queue.claim_next_job("worker-a") == job_id
+
+    # Another process starting up (or polling) must not take it over
+    assert job_queue.requeue_interrupted_jobs() == 0
+    assert job_queue.claim_next_job("worker-b") is None
+    assert job_queue.get_job(job_id)["status"] == "running"
+    assert job_queue.renew_lease(job_id, "worker-a")
+
+
+def test_expired_lease_is_reclaimed_and_old_owner_cannot_finish():
+    job_id = job_queue.create_job([("a.txt", b"a")])
+    job_queue.claim_next_job("worker-a")
+    expire_leases()
+
+    assert job_queue.claim_next_job("worker-b") == job_id
+    assert not job_queue.renew_lease(job_id, "worker-a")
+    assert not job_queue.complete_job(job_id, {"stale": True}, "worker-a")
+
+    assert job_queue.complete_job(job_id, {"ok": True}, "worker-b")
+    job = job_queue.get_job(job_id)
+    assert job["status"] == "completed"
+    assert job["result"] == {"ok": True}
+    assert job["attempts"] == 2
+
+
+def test_job_failed_after_max_attempts():
+    job_id = job_queue.create_job([("a.txt", b"a")])
+    for _ in range(job_queue.MAX_JOB_ATTEMPTS):
+        assert job_queue.claim_next_job("worker-a") == job_id
+        expire_leases()
+
+    assert job_queue.requeue_interrupted_jobs() == 0
+    assert job_queue.get_job(job_id)["status"] == "failed"
+
+
+def test_released_job_is_queued_again():
+    job_id = job_queue.create_job([("a.txt", b"a")])
+    job_queue.claim_next_job("worker-a")
+    job_queue.release_job(job_id, "worker-a")
+
+    assert job_queue.claim_next_job("worker-b") == job_id
+
+
+def test_older_database_gets_lease_columns(monkeypatch, tmp_path):
+    import sqlite3
+    path = tmp_path / "old_jobs.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(job_queue.SCHEMA.replace("    owner TEXT,\n    lease_expires_at REAL,\n", ""))
+    conn.close()
+    monkeypatch.setattr(job_queue, "JOB_DB_PATH", str(path))
+
+    job_queue.init_job_db()
+
+    job_id = job_queue.create_job([("a.txt", b"a")])
+    assert job_queue.claim_next_job("worker-a") == job_id
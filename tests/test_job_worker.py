@@ -0,0 +1,37 @@
+"""
+Background job worker: queue errors must not stop it
+"""
+import asyncio
+import sqlite3
+
+import main
+
+
+def test_worker_survives_database_errors(monkeypatch):
+    claims = []
+
+    def claim(owner):
+        claims.append(1)
+        if len(claims) <= 2:
+            raise sqlite3.OperationalError("database is locked")
+        return "job-1" if len(claims) == 3 else None
+
+    ran = []
+
+    async def run_job(job_id):
+        ran.append(job_id)
+
+    monkeypatch.setattr(main, "claim_next_job", claim)
+    monkeypatch.setattr(main, "run_job", run_job)
+    monkeypatch.setattr(main, "JOB_POLL_INTERVAL", 0.001)
+
+    async def run():
+        worker = asyncio.create_task(main.job_worker(1))
+        while not ran:
+            await asyncio.sleep(0.01)
+        assert not worker.done()
+        worker.cancel()
+
+    asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+    assert ran == ["job-1"]
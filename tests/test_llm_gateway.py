@@ -0,0 +1,107 @@
+"""
+LLM gateway: prompt caching eligibility and the shared concurrency cap
+"""
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import llm_gateway
+from risk_analyzer import ANALYSIS_PROMPT, ANALYSIS_TOOL
+
+
+def test_short_prefix_is_not_prompt_cached():
+    assert not llm_gateway._use_prompt_cache(llm_gateway.DEFAULT_MODEL, "Short instructions.", None)
+
+
+def test_analysis_prefix_is_prompt_cached_with_default_model():
+    assert llm_gateway._use_prompt_cache(llm_gateway.DEFAULT_MODEL, ANALYSIS_PROMPT, ANALYSIS_TOOL)
+
+    kwargs = llm_gateway._request_kwargs("data", llm_gateway.DEFAULT_MODEL, 100, 0, ANALYSIS_PROMPT, ANALYSIS_TOOL)
+    assert kwargs["system"][0]["cache_control"] == {"type": "ephemeral"}
+
+
+class InFlightCounter:
+    """Fake messages API that records how many calls overlap"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+
+    def _enter(self):
+        with self.lock:
+            self.in_flight += 1
+            self.calls += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def _exit(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def sync_client(self):
+        def create(**kwargs):
+            self._enter()
+            time.sleep(self.delay)
+            self._exit()
+            return SimpleNamespace(usage=None)
+        return SimpleNamespace(messages=SimpleNamespace(create=create))
+
+    def async_client(self):
+        async def create(**kwargs):
+            self._enter()
+            await asyncio.sleep(self.delay)
+            self._exit()
+            return SimpleNamespace(usage=None)
+        return SimpleNamespace(messages=SimpleNamespace(create=create))
+
+
+@pytest.fixture
+def limited_gateway(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "_call_limiter", threading.BoundedSemaphore(2))
+    monkeypatch.setattr(llm_gateway, "_rate_limiter", llm_gateway.TokenBucket(0, 1))
+    counter = InFlightCounter(delay=0.05)
+    monkeypatch.setattr(llm_gateway, "get_client", counter.sync_client)
+    monkeypatch.setattr(llm_gateway, "get_async_client", counter.async_client)
+    return counter
+
+
+def test_sync_and_async_calls_share_one_concurrency_cap(limited_gateway):
+    threads = [threading.Thread(target=llm_gateway.create_message, args=("p",)) for _ in range(4)]
+
+    async def run_async_calls():
+        await asyncio.gather(*(llm_gateway.create_message_async("p") for _ in range(4)))
+
+    for thread in threads:
+        thread.start()
+    asyncio.run(run_async_calls())
+    for thread in threads:
+        thread.join()
+
+    assert limited_gateway.calls == 8
+    assert limited_gateway.peak == 2
+
+
+def test_cancelled_async_waiter_returns_its_slot(limited_gateway):
+    limiter = llm_gateway._call_limiter
+
+    async def cancel_waiting_call():
+        limiter.acquire()
+        limiter.acquire()
+        task = asyncio.create_task(llm_gateway.create_message_async("p"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        limiter.release()  # The waiting thread may take this slot after the cancel
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.05)
+        limiter.release()
+
+    asyncio.run(cancel_waiting_call())
+
+    assert limited_gateway.calls == 0
+    assert limiter.acquire(blocking=False) and limiter.acquire(blocking=False)
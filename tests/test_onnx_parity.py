@@ -0,0 +1,57 @@
+"""
+The int8 ONNX embedder must retrieve the same patterns as the torch embedder
+
+Same check as benchmark_embedders.py, on the sample SOW's chunks, run in
+process. Skipped unless onnxruntime, tokenizers and sentence-transformers
+are installed and the model has been exported (python export_onnx_embedder.py).
+"""
+import os
+
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+pytest.importorskip("sentence_transformers")
+
+import benchmark_embedders
+from embedders import ONNX_MODEL_DIR, ONNX_MODEL_FILE, create_embedder
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+TOP_K = 3
+MIN_OVERLAP = 0.9
+# 1 - cosine between the two backends' vectors of the same chunk
+MAX_MEAN_COSINE_GAP = 0.02
+MAX_COSINE_GAP = 0.05
+
+if not os.path.exists(os.path.join(ONNX_MODEL_DIR, ONNX_MODEL_FILE)):
+    pytest.skip(f"No exported model in {ONNX_MODEL_DIR} - run 'python export_onnx_embedder.py'",
+                allow_module_level=True)
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(benchmark_embedders, "EXAMPLES_FILE", os.path.join(ROOT, "annotated_examples.json"))
+        library, chunks = benchmark_embedders.load_texts(os.path.join(ROOT, "sample_nyserda_sow.txt"))
+
+    encoded = {}
+    for kind in ("torch", "onnx"):
+        embedder = create_embedder(MODEL, kind)
+        encoded[kind] = {'library': embedder.encode(library), 'chunks': embedder.encode(chunks)}
+    return encoded
+
+
+def test_top_k_patterns_match_torch(vectors):
+    parity = benchmark_embedders.compare(vectors["torch"], vectors["onnx"], TOP_K)
+
+    assert parity['top1'] == 1.0
+    assert parity['overlap'] >= MIN_OVERLAP
+
+
+def test_cosine_gap_within_tolerance(vectors):
+    parity = benchmark_embedders.compare(vectors["torch"], vectors["onnx"], TOP_K)
+
+    assert 1 - parity['mean_cosine'] <= MAX_MEAN_COSINE_GAP
+    assert 1 - parity['min_cosine'] <= MAX_COSINE_GAP
@@ -0,0 +1,136 @@
+"""
+RAG validation: failed validations and the verdict cache
+"""
+import asyncio
+
+import pytest
+
+try:
+    import rag_analyzer
+except ImportError as e:
+    pytest.skip(f"RAG dependencies not installed: {e}", allow_module_level=True)
+
+import llm_cache
+
+
+DOCUMENT = "\n\n".join(
+    f"Task {i}: The contractor shall provide the full range of support number {i} that may be required "
+    f"from time to time, including {i} additional services as directed by the agency."
+    for i in range(1, 7)
+)
+
+
+def pattern(score: float = 0.8) -> dict:
+    return {
+        "problematic_section": "full range of support that may be required from time to time",
+        "issue_type": "scope_creep",
+        "explanation": "Unbounded scope",
+        "actual_outcome": "Cost overrun",
+        "estimated_cost": "$1M",
+        "contract_source": "Example contract",
+        "correct_version": "Support limited to Tasks 1-3",
+        "similarity_score": score
+    }
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch, tmp_path):
+    """Temporary response cache and canned retrieval results"""
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_PATH", str(tmp_path / "llm_cache.db"))
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_cache, "_schema_ready", False)
+
+    async def retrieve(texts, n_results):
+        return [[pattern()] for _ in texts]
+
+    monkeypatch.setattr(rag_analyzer, "retrieve_similar_patterns", retrieve)
+
+
+def analyze(**kwargs):
+    kwargs.setdefault("dedup", False)
+    return asyncio.run(rag_analyzer.analyze_sow_with_rag_async({"raw_text": DOCUMENT}, chunk_size=40, **kwargs))
+
+
+def test_errored_validation_is_not_cached(monkeypatch):
+    calls = []
+
+    async def failing_complete(prompt, **kwargs):
+        calls.append(kwargs["purpose"])
+        raise RuntimeError("overloaded")
+
+    monkeypatch.setattr(rag_analyzer, "complete_async", failing_complete)
+
+    analysis = analyze()
+
+    assert analysis["validation_errors"] > 0
+    assert not any(analysis[category] for category in rag_analyzer.FINDING_CATEGORIES)
+
+    # A re-run asks Claude again instead of reusing "no issue"
+    first_run = len(calls)
+    analyze()
+    assert len(calls) == first_run * 2
+
+
+def test_store_verdicts_skips_errors():
+    items = [(1, "Section one text", [pattern()]), (2, "Section two text", [pattern()])]
+
+    rag_analyzer.store_verdicts(items, [{"has_issue": False, "error": "timeout"}, {"has_issue": False}])
+
+    assert rag_analyzer.get_cached_verdicts(items) == [None, {"has_issue": False}]
+
+
+def test_validation_prefixes_are_prompt_cached_with_default_model():
+    from llm_gateway import DEFAULT_MODEL, _use_prompt_cache
+
+    assert _use_prompt_cache(DEFAULT_MODEL, rag_analyzer.VALIDATION_PROMPT, rag_analyzer.VALIDATION_TOOL)
+    assert _use_prompt_cache(DEFAULT_MODEL, rag_analyzer.VALIDATION_BATCH_PROMPT, rag_analyzer.VALIDATION_BATCH_TOOL)
+
+
+def test_slow_batch_does_not_block_later_findings(monkeypatch):
+    first_chunk_done = None
+
+    async def validate(batch, model=None):
+        chunk_id = batch[0][0]
+        if chunk_id == first_id:
+            # Only finishes once a later chunk's finding has been streamed
+            await first_chunk_done.wait()
+        return [{"has_issue": True, "issue_type": "scope_creep", "severity": "HIGH"} for _ in batch]
+
+    monkeypatch.setattr(rag_analyzer, "validate_batch_with_claude_async", validate)
+    monkeypatch.setattr(rag_analyzer, "get_cached_verdicts", lambda items, model=None: [None] * len(items))
+
+    from chunker import chunk_document
+    first_id = chunk_document(DOCUMENT, 40)[0]['id']
+
+    async def run():
+        nonlocal first_chunk_done
+        first_chunk_done = asyncio.Event()
+        received = []
+        findings = rag_analyzer.iter_rag_findings_async(
+            {"raw_text": DOCUMENT}, chunk_size=40, batch_validation=False, dedup=False, max_concurrency=10
+        )
+        async for _, finding in findings:
+            received.append(finding['source']['chunk_id'])
+            first_chunk_done.set()
+        return received
+
+    received = asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+    assert len(received) > 1
+    assert received[0] != first_id
+    assert received[-1] == first_id
+
+
+def test_grouped_findings_keep_document_order(monkeypatch):
+    async def validate(batch, model=None):
+        # Later chunks finish first
+        await asyncio.sleep(0.01 * (10 - batch[0][0]))
+        return [{"has_issue": True, "issue_type": "scope_creep", "severity": "HIGH"} for _ in batch]
+
+    monkeypatch.setattr(rag_analyzer, "validate_batch_with_claude_async", validate)
+
+    analysis = analyze(batch_validation=False, max_concurrency=10)
+
+    chunk_ids = [finding['source']['chunk_id'] for finding in analysis['scope_creep']]
+    assert len(chunk_ids) > 1
+    assert chunk_ids == sorted(chunk_ids)
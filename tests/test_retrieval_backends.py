@@ -0,0 +1,38 @@
+"""
+Pattern library backends
+"""
+import numpy as np
+import pytest
+
+from retrieval_backends import RetrievalBackend, NumpyBackend
+
+
+def test_incomplete_backend_cannot_be_created():
+    class NoQuery(RetrievalBackend):
+        def get_hashes(self):
+            return {}
+
+        def upsert(self, ids, embeddings, documents, metadatas):
+            pass
+
+        def delete(self, ids):
+            pass
+
+        def count(self):
+            return 0
+
+    with pytest.raises(TypeError):
+        NoQuery()
+
+
+def test_numpy_backend_round_trip(tmp_path):
+    backend = NumpyBackend(str(tmp_path))
+    backend.upsert(["a", "b"], [[1, 0, 0], [0, 1, 0]], ["doc a", "doc b"],
+                   [{"content_hash": "ha"}, {"content_hash": "hb"}])
+    backend.delete(["b"])
+
+    assert backend.count() == 1
+    assert backend.get_hashes() == {"a": "ha"}
+    [matches] = backend.query(np.array([[1.0, 0, 0]]).tolist(), 1)
+    assert matches[0][0] == "a"
+    assert matches[0][3] == pytest.approx(1.0)
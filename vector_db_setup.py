@@ -1,132 +1,313 @@
-import chromadb
-from sentence_transformers import SentenceTransformer
-import json
+"""
+Pattern library vector DB (an embedder + a retrieval backend)
+
+The embedder is chosen by EMBEDDER_BACKEND: "torch" (sentence-transformers)
+or "onnx" (int8 ONNX Runtime); see embedders.py. The storage/search backend
+is chosen by VECTOR_BACKEND: "chroma" (ChromaDB collection) or "numpy"
+(exact search over a memory-mapped matrix); see retrieval_backends.py.
+
+Nothing heavy happens at import time: the embedding model and the backend
+are created on first use by get_embedder() and get_backend(), and
+warm_up() does all of it ahead of time (main.py runs it in the background
+at startup). get_readiness() reports the state for the /ready endpoint.
+"""
 import os
+import json
+import time
+import hashlib
+import threading
+import importlib.util
 
-# Initialize embedding model
-print("Loading embedding model...")
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
-print("[OK] Embedding model loaded")
+from retrieval_backends import ChromaBackend, NumpyBackend
+from embedding_cache import encode_with_cache
+from embedders import EMBEDDER_BACKEND, REQUIRED_MODULES, create_embedder, embedder_id
 
-# Initialize ChromaDB client (NEW API - no Settings needed)
-chroma_client = chromadb.PersistentClient(path="./chroma_db")
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
+NUMPY_INDEX_PATH = os.getenv("NUMPY_INDEX_PATH", "./pattern_index")
+
+# Model + embedder backend, used in the embedding cache key and content hashes
+EMBEDDER_ID = embedder_id(EMBEDDING_MODEL)
+
+# Fail fast (ImportError) when the RAG dependencies are missing, without
+# paying for the model import until it is actually needed
+_required = REQUIRED_MODULES.get(EMBEDDER_BACKEND, []) + (["chromadb"] if VECTOR_BACKEND == "chroma" else [])
+for _module in _required:
+    if importlib.util.find_spec(_module) is None:
+        raise ImportError(f"No module named '{_module}'")
 
-# Create or get collection
 collection_name = "government_contracts"
-try:
-    collection = chroma_client.get_collection(name=collection_name)
-    print(f"[OK] Using existing collection: {collection_name}")
-except:
-    collection = chroma_client.create_collection(name=collection_name)
-    print(f"[OK] Created new collection: {collection_name}")
-
-def initialize_vector_db():
-    """Load annotated examples into vector database"""
-    
-    # Load annotated examples
-    examples_file = "annotated_examples.json"
-    
+
+# Annotated pattern library loaded into the collection
+examples_file = "annotated_examples.json"
+
+_load_lock = threading.RLock()
+_embedder = None
+_backend = None
+_state = {
+    "model_loaded": False,
+    "warming_up": False,
+    "warm_up_seconds": None,
+    "error": None
+}
+
+
+def get_embedder():
+    """Shared embedder (EMBEDDER_BACKEND), loaded on first use"""
+    global _embedder
+    if _embedder is None:
+        with _load_lock:
+            if _embedder is None:
+                print(f"Loading embedding model ({EMBEDDING_MODEL}, {EMBEDDER_BACKEND})...")
+                _embedder = create_embedder(EMBEDDING_MODEL)
+                _state["model_loaded"] = True
+                print("[OK] Embedding model loaded")
+    return _embedder
+
+
+def embed_texts(texts):
+    """
+    Embeddings for texts, served from the embedding cache where possible
+
+    Returns:
+        float32 array with one row per text
+    """
+    return encode_with_cache(
+        EMBEDDER_ID, list(texts),
+        lambda missing: get_embedder().encode(missing, batch_size=EMBED_BATCH_SIZE)
+    )
+
+
+def create_backend(kind: str = None, path: str = None):
+    """
+    New retrieval backend of the given kind ("chroma" or "numpy")
+
+    Args:
+        kind: Backend kind (default VECTOR_BACKEND)
+        path: Storage directory (default CHROMA_PATH or NUMPY_INDEX_PATH)
+
+    Raises:
+        ValueError: If the kind is unknown
+    """
+    kind = (kind or VECTOR_BACKEND).lower()
+    if kind == "chroma":
+        return ChromaBackend(path or CHROMA_PATH, collection_name)
+    if kind == "numpy":
+        return NumpyBackend(path or NUMPY_INDEX_PATH)
+    raise ValueError(f"Unknown VECTOR_BACKEND '{kind}' (use 'chroma' or 'numpy')")
+
+
+def get_backend():
+    """Shared retrieval backend (VECTOR_BACKEND), opened on first use"""
+    global _backend
+    if _backend is None:
+        with _load_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+# Metadata stored with every example (besides its content hash)
+METADATA_FIELDS = ['id', 'issue_type', 'severity', 'explanation', 'actual_outcome',
+                   'estimated_cost', 'correct_version', 'contract_source']
+
+# Examples per backend.upsert call
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", 256))
+
+# Texts per forward pass when embedding many chunks at once
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+
+# Serializes ingestion within this process (queries are never blocked)
+_ingest_lock = threading.Lock()
+
+
+def load_examples():
+    """Annotated examples from examples_file ([] if missing or invalid)"""
     if not os.path.exists(examples_file):
         print(f"[ERROR] Error: {examples_file} not found!")
-        return False
+        return []
 
-    with open(examples_file, 'r') as f:
+    with open(examples_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
 
     examples = data.get('examples', [])
+    ids = [example['id'] for example in examples]
+    if len(ids) != len(set(ids)):
+        duplicates = sorted({i for i in ids if ids.count(i) > 1})
+        raise ValueError(f"Duplicate example ids in {examples_file}: {', '.join(duplicates)}")
+    return examples
+
+
+def example_hash(example):
+    """Content hash of one example plus the embedder (changes force a re-embed)"""
+    raw = EMBEDDER_ID + json.dumps(example, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
 
+def initialize_vector_db(force=False, backend=None):
+    """
+    Sync the annotated examples into the vector database
+
+    Examples are upserted by id: only new examples and ones whose content
+    (or the embedding model) changed are embedded, in batches, and written
+    in bulk; examples no longer in the library are deleted. The collection
+    itself is never dropped, so other workers can keep querying it while
+    this runs.
+
+    Args:
+        force: Re-embed every example even if it is unchanged
+        backend: Backend to sync (default: the shared VECTOR_BACKEND one)
+
+    Returns:
+        True if the collection matches the library
+    """
+    examples = load_examples()
     if not examples:
         print("[ERROR] No examples found in JSON!")
         return False
-    
-    print(f"Loading {len(examples)} annotated examples...")
-    
-    # Clear existing data (optional - comment out if you want to keep old data)
-    try:
-        chroma_client.delete_collection(name=collection_name)
-        collection = chroma_client.create_collection(name=collection_name)
-        print("[OK] Cleared old data")
-    except:
-        pass
-    
-    # Add each example to the collection
-    for idx, example in enumerate(examples):
-        # Generate embedding for the problematic section
-        text = example['problematic_section']
-        embedding = embedder.encode(text).tolist()
-        
-        # Prepare metadata
-        metadata = {
-            'id': example['id'],
-            'issue_type': example['issue_type'],
-            'severity': example['severity'],
-            'explanation': example['explanation'],
-            'actual_outcome': example['actual_outcome'],
-            'estimated_cost': example['estimated_cost'],
-            'correct_version': example['correct_version'],
-            'contract_source': example['contract_source']
-        }
-        
-        # Add to collection
-        collection.add(
-            embeddings=[embedding],
-            documents=[text],
-            metadatas=[metadata],
-            ids=[f"example_{idx}"]
-        )
-        
-        if (idx + 1) % 5 == 0:
-            print(f"  Loaded {idx + 1}/{len(examples)} examples...")
-    
-    print(f"[OK] Successfully loaded {len(examples)} examples into vector DB")
+
+    backend = backend or get_backend()
+
+    with _ingest_lock:
+        stored_hashes = backend.get_hashes()
+
+        hashes = [example_hash(example) for example in examples]
+        changed = [
+            (example, content_hash) for example, content_hash in zip(examples, hashes)
+            if force or stored_hashes.get(example['id']) != content_hash
+        ]
+        library_ids = {example['id'] for example in examples}
+        stale = [id_ for id_ in stored_hashes if id_ not in library_ids]
+
+        if changed:
+            print(f"Embedding {len(changed)} new or changed examples...")
+            for i in range(0, len(changed), UPSERT_BATCH_SIZE):
+                batch = changed[i:i + UPSERT_BATCH_SIZE]
+                texts = [example['problematic_section'] for example, _ in batch]
+                embeddings = embed_texts(texts).tolist()
+                backend.upsert(
+                    ids=[example['id'] for example, _ in batch],
+                    embeddings=embeddings,
+                    documents=texts,
+                    metadatas=[
+                        dict({field: example[field] for field in METADATA_FIELDS}, content_hash=content_hash)
+                        for example, content_hash in batch
+                    ]
+                )
+
+        if stale:
+            backend.delete(stale)
+
+    print(f"[OK] Vector DB in sync: {len(examples)} examples "
+          f"({len(changed)} embedded, {len(examples) - len(changed)} unchanged, {len(stale)} removed)")
     return True
 
-def search_similar_patterns(query_text, n_results=3):
-    """Search for similar patterns in the vector database"""
 
-    # Get or create collection
+def warm_up():
+    """
+    Load the embedding model, run one encode and make sure the collection exists
+
+    Safe to call more than once; errors are recorded for get_readiness()
+    instead of being raised.
+
+    Returns:
+        True if the vector DB is ready for queries
+    """
+    start = time.perf_counter()
+    _state["warming_up"] = True
     try:
-        coll = chroma_client.get_collection(name=collection_name)
+        get_embedder().encode(["warm-up"])
+        ready = initialize_vector_db()
+        _state["error"] = None if ready else "pattern library could not be loaded"
+        return ready
     except Exception as e:
-        print(f"[WARNING] Collection not found: {e}")
-        print(f"   Run 'python vector_db_setup.py' first to initialize")
+        _state["error"] = str(e)
+        print(f"[WARNING] Vector DB warm-up failed: {e}")
+        return False
+    finally:
+        _state["warming_up"] = False
+        _state["warm_up_seconds"] = round(time.perf_counter() - start, 2)
+
+
+def get_readiness():
+    """Model-loaded and collection state for the /ready endpoint"""
+    readiness = dict(_state)
+    readiness["collection_count"] = None
+    readiness["backend"] = VECTOR_BACKEND
+    readiness["embedder"] = EMBEDDER_ID
+    if _backend is not None:
+        try:
+            readiness["collection_count"] = _backend.count()
+        except Exception as e:
+            readiness["error"] = readiness["error"] or str(e)
+    readiness["ready"] = bool(readiness["model_loaded"] and readiness["collection_count"])
+    return readiness
+
+
+def _format_match(match):
+    """Pattern dict for one (id, document, metadata, similarity) backend match"""
+    id_, document, metadata, similarity = match
+    return {
+        'id': id_,
+        'problematic_section': document,
+        'similarity_score': similarity,
+        'issue_type': metadata['issue_type'],
+        'severity': metadata['severity'],
+        'explanation': metadata['explanation'],
+        'actual_outcome': metadata['actual_outcome'],
+        'estimated_cost': metadata['estimated_cost'],
+        'correct_version': metadata['correct_version'],
+        'contract_source': metadata['contract_source']
+    }
+
+def search_similar_patterns_batch(query_texts, n_results=3):
+    """
+    Search for similar patterns for many texts at once
+
+    Texts not in the embedding cache are embedded in one batched encode
+    call, and all of them are sent to the backend as a single multi-vector
+    query.
+
+    Returns:
+        One list of matches per query text, in the same order
+    """
+    if not query_texts:
         return []
 
-    # Generate embedding for query
-    query_embedding = embedder.encode(query_text).tolist()
+    # Generate all query embeddings in one batch (cached chunks are not re-encoded)
+    query_embeddings = embed_texts(query_texts).tolist()
 
-    # Search in collection
-    results = coll.query(
-        query_embeddings=[query_embedding],
-        n_results=n_results
-    )
+    results = get_backend().query(query_embeddings, n_results)
+    return [[_format_match(match) for match in matches] for matches in results]
 
-    # Format results to match expected structure
-    formatted_results = []
-    if results and results['ids'] and len(results['ids'][0]) > 0:
-        for i in range(len(results['ids'][0])):
-            formatted_results.append({
-                'id': results['ids'][0][i],
-                'problematic_section': results['documents'][0][i],
-                'similarity_score': 1 - results['distances'][0][i],  # Convert distance to similarity
-                'issue_type': results['metadatas'][0][i]['issue_type'],
-                'severity': results['metadatas'][0][i]['severity'],
-                'explanation': results['metadatas'][0][i]['explanation'],
-                'actual_outcome': results['metadatas'][0][i]['actual_outcome'],
-                'estimated_cost': results['metadatas'][0][i]['estimated_cost'],
-                'correct_version': results['metadatas'][0][i]['correct_version'],
-                'contract_source': results['metadatas'][0][i]['contract_source']
-            })
-
-    return formatted_results
+def search_similar_patterns(query_text, n_results=3):
+    """Search for similar patterns in the vector database"""
+    return search_similar_patterns_batch([query_text], n_results=n_results)[0]
 
 def get_collection_stats():
     """Get statistics about the collection"""
     try:
-        count = collection.count()
+        count = get_backend().count()
         return {
             'total_examples': count,
-            'collection_name': collection_name
+            'collection_name': collection_name,
+            'backend': VECTOR_BACKEND
         }
     except Exception as e:
-        return {'error': str(e)}
\ No newline at end of file
+        return {'error': str(e)}
+
+def get_library_version():
+    """Short content hash of the pattern library (changes when examples change)"""
+    try:
+        with open(examples_file, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:12]
+    except OSError:
+        return "missing"
+
+
+if __name__ == "__main__":
+    import sys
+
+    initialize_vector_db(force="--force-rebuild" in sys.argv)
+    print(get_collection_stats())